@@ -5,17 +5,21 @@ Advanced Telegram File Sharing Bot with Free & Premium Tiers
 
 import logging
 import asyncio
+import multiprocessing
+import secrets
+import signal
+import sys
 from datetime import datetime
 from threading import Thread
 from flask import Flask, jsonify, redirect, render_template, request
-from telegram import Update, BotCommand
+from telegram import Bot, Update, BotCommand
 from telegram.ext import (
     Application, CommandHandler, MessageHandler,
     CallbackQueryHandler, filters, ContextTypes
 )
 
 import config
-from database import db
+from database import db, adb
 
 # Import handlers
 from handlers.user import (
@@ -30,14 +34,24 @@ from handlers.admin import (
     cancel_command, mylinks_command, delete_link_command,
     linkinfo_command, add_files_command, qrcode_command,
     ban_command, unban_command, admin_stats_command,
-    grant_premium_command, broadcast_command, handle_dynamic_qr
+    grant_premium_command, broadcast_command, handle_dynamic_qr,
+    channel_health_command
 )
 from handlers.premium import (
     setpassword_command, setname_command, protect_command, search_command
 )
 from handlers.callbacks import handle_callback_query
 from handlers.edit_panel import edit_panel_command, edit_panel_callback
-from handlers.importer import import_command
+from handlers.importer import import_command, import_status_command
+from utils.auto_delete import deletion_scheduler
+from utils.replication import replication_queue
+from utils.import_jobs import import_jobs
+from utils.broadcast import broadcaster
+from utils.link_lifecycle import link_lifecycle
+from utils.index_advisor import run_advisor
+from utils.channel_import import share_import_budget
+from utils.rate_limiter import flood_control
+from utils.persistence import MongoPersistence
 
 # Configure logging
 logging.basicConfig(
@@ -180,9 +194,8 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ==================== BOT MENU SETUP ====================
 
-async def setup_bot_commands(application):
-    """Setup bot command menu"""
-    # Auto-detect username for accurate links
+async def detect_bot_username(application):
+    """Auto-detect username for accurate links"""
     try:
         bot_info = await application.bot.get_me()
         config.BOT_USERNAME = f"@{bot_info.username}"
@@ -190,6 +203,10 @@ async def setup_bot_commands(application):
     except Exception as e:
         logger.warning(f"⚠️ Could not detect bot username: {e}")
 
+async def setup_bot_commands(application):
+    """Setup bot command menu"""
+    await detect_bot_username(application)
+
     logger.info("⚙️  Setting up bot commands...")
     
     # User commands (shown to everyone)
@@ -215,32 +232,62 @@ async def setup_bot_commands(application):
     
     logger.info("✅ Bot commands configured!")
 
-# ==================== MAIN FUNCTION ====================
+# ==================== LIFECYCLE ====================
 
-def main():
-    """Main function to run the bot"""
-    
-    logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-    logger.info(f"🚀 Starting {config.BOT_NAME}...")
-    logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-    
-    # Validate configuration
-    try:
-        config.validate_config()
-        logger.info("✅ Configuration validated")
-    except ValueError as e:
-        logger.error(f"❌ Configuration error: {e}")
-        return
-    
-    # Start Flask web server
-    logger.info(f"🌐 Starting web server on port {config.PORT}...")
-    flask_thread = Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-    logger.info("✅ Web server started")
+async def start_services(application, background_jobs: bool = True, shard: tuple = None):
+    """
+    Start this process's workers.
     
-    # Create bot application
-    logger.info("🤖 Initializing bot application...")
-    application = Application.builder().token(config.BOT_TOKEN).build()
+    background_jobs (auto-delete, replication, stats reconciliation, broadcast
+    resumption, link expiry, bot menu) run in exactly one process; import jobs
+    resume in the process that owns their user's shard.
+    """
+    await adb.start(background_jobs=background_jobs)
+    import_jobs.start(application, shard)
+    broadcaster.start(application.bot, resume=background_jobs)
+    if background_jobs:
+        deletion_scheduler.start(application.bot)
+        replication_queue.start(application.bot)
+        link_lifecycle.start()
+        if config.INDEX_ADVISOR_ON_STARTUP:
+            # Blocking pymongo explains: keep them off the event loop
+            application.create_task(asyncio.to_thread(run_advisor))
+        await setup_bot_commands(application)
+    else:
+        await detect_bot_username(application)
+
+async def stop_services(application):
+    """Stop background workers and flush buffered database writes"""
+    await import_jobs.stop()
+    await broadcaster.stop()
+    await deletion_scheduler.stop()
+    await replication_queue.stop()
+    await link_lifecycle.stop()
+    await adb.stop()
+
+async def on_startup(application):
+    """Start background workers, then configure the bot menu"""
+    await start_services(application)
+
+async def on_shutdown(application):
+    """Stop background workers and flush buffered database writes before exit"""
+    await stop_services(application)
+
+# ==================== APPLICATION ====================
+
+def build_application(with_updater: bool = True, shard: tuple = None) -> Application:
+    """Create the bot application with every handler registered"""
+    builder = (
+        Application.builder()
+        .token(config.BOT_TOKEN)
+        .base_url(config.TELEGRAM_API_URL)
+        .base_file_url(config.TELEGRAM_FILE_URL)
+        .persistence(MongoPersistence(config.USER_STATE_FLUSH_INTERVAL_SECONDS, shard))
+    )
+    if not with_updater:
+        # Webhook workers receive updates from the ingress process instead
+        builder = builder.updater(None)
+    application = builder.build()
     
     # ==================== REGISTER HANDLERS ====================
     
@@ -258,6 +305,7 @@ def main():
     application.add_handler(CommandHandler("stop", stop_command))
     application.add_handler(CommandHandler("checklink", checklink_command))
     application.add_handler(CommandHandler("import", import_command))
+    application.add_handler(CommandHandler("importstatus", import_status_command))
     
     # Upload/Link management commands
     application.add_handler(CommandHandler("upload", upload_command))
@@ -276,6 +324,7 @@ def main():
     application.add_handler(CommandHandler("grantpremium", grant_premium_command))
     application.add_handler(CommandHandler("grantpremium", grant_premium_command))
     application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("channelhealth", channel_health_command))
     
     # Premium Commands
     application.add_handler(CommandHandler("setpassword", setpassword_command))
@@ -319,8 +368,181 @@ def main():
     
     logger.info("✅ All handlers registered")
     
-    # Setup bot commands menu
-    application.post_init = setup_bot_commands
+    return application
+
+# ==================== WEBHOOK MODE ====================
+
+def shard_key(update_data: dict) -> int:
+    """User (or chat) an update belongs to, so one user always lands on one worker"""
+    for key, payload in update_data.items():
+        if not isinstance(payload, dict):
+            continue
+        sender = payload.get("from") or payload.get("user")
+        if sender and "id" in sender:
+            return sender["id"]
+        chat = payload.get("chat") or (payload.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return chat["id"]
+    return update_data.get("update_id", 0)
+
+class WebhookDispatcher:
+    """Fans incoming webhook updates out to worker processes by shard"""
+    
+    def __init__(self, workers: int):
+        # spawn: workers must not inherit the Flask thread or Mongo sockets
+        self._ctx = multiprocessing.get_context("spawn")
+        self._queues = [self._ctx.Queue() for _ in range(workers)]
+        self._processes = []
+    
+    def start(self):
+        for index, queue in enumerate(self._queues):
+            process = self._ctx.Process(
+                target=run_webhook_worker,
+                args=(index, queue),
+                name=f"sharebox-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            self._processes.append(process)
+    
+    def dispatch(self, update_data: dict):
+        """Queue an update on the worker that owns its user"""
+        index = shard_key(update_data) % len(self._queues)
+        self._queues[index].put(update_data)
+    
+    def stop(self, timeout: float = 30):
+        """Let workers drain their queues, flush and exit"""
+        for queue in self._queues:
+            queue.put(None)
+        for process in self._processes:
+            process.join(timeout)
+
+webhook_dispatcher = None
+
+@app.route('/webhook/<secret>', methods=['POST'])
+def telegram_webhook(secret):
+    """Telegram webhook ingress"""
+    if webhook_dispatcher is None or secret != config.WEBHOOK_SECRET:
+        return jsonify({"error": "Not found"}), 404
+    if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != config.WEBHOOK_SECRET:
+        return jsonify({"error": "Forbidden"}), 403
+    
+    update_data = request.get_json(silent=True)
+    if not isinstance(update_data, dict):
+        return jsonify({"error": "Bad request"}), 400
+    
+    webhook_dispatcher.dispatch(update_data)
+    return jsonify({"ok": True})
+
+def run_webhook_worker(index: int, queue):
+    """Worker process entry point"""
+    # Ctrl+C reaches the whole process group; workers stop via the queue sentinel
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logger.info(f"👷 Worker {index} starting")
+    asyncio.run(_webhook_worker(index, queue))
+
+async def _webhook_worker(index: int, queue):
+    application = build_application(with_updater=False, shard=(index, config.WEBHOOK_WORKERS))
+    
+    # The Bot API's global limit is shared by all workers
+    flood_control.share_global_rate(config.WEBHOOK_WORKERS)
+    share_import_budget(config.WEBHOOK_WORKERS)
+    
+    await application.initialize()
+    await start_services(application, background_jobs=index == 0, shard=(index, config.WEBHOOK_WORKERS))
+    await application.start()
+    
+    # Updates are processed one at a time, in arrival order
+    while True:
+        update_data = await asyncio.to_thread(queue.get)
+        if update_data is None:
+            break
+        try:
+            await application.update_queue.put(Update.de_json(update_data, application.bot))
+        except Exception as e:
+            logger.error(f"Worker {index} could not queue update: {e}")
+    
+    await application.stop()
+    await stop_services(application)
+    await application.shutdown()
+    logger.info(f"👷 Worker {index} stopped")
+
+async def register_webhook():
+    """Point Telegram at our ingress route"""
+    bot = Bot(config.BOT_TOKEN, base_url=config.TELEGRAM_API_URL, base_file_url=config.TELEGRAM_FILE_URL)
+    async with bot:
+        await bot.set_webhook(
+            url=f"{config.WEBHOOK_URL.rstrip('/')}/webhook/{config.WEBHOOK_SECRET}",
+            secret_token=config.WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=True
+        )
+
+def run_webhook():
+    """Webhook mode: this process serves HTTP, workers handle updates"""
+    global webhook_dispatcher
+    
+    if not config.WEBHOOK_URL:
+        logger.error("❌ Configuration error: WEBHOOK_URL is required when BOT_MODE=webhook")
+        return
+    
+    config.WEBHOOK_SECRET = config.WEBHOOK_SECRET or secrets.token_urlsafe(24)
+    
+    webhook_dispatcher = WebhookDispatcher(config.WEBHOOK_WORKERS)
+    webhook_dispatcher.start()
+    logger.info(f"✅ {config.WEBHOOK_WORKERS} workers started")
+    
+    asyncio.run(register_webhook())
+    logger.info("✅ Webhook registered")
+    
+    logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    logger.info(f"✅ {config.BOT_NAME} is now ONLINE (webhook)!")
+    logger.info(f"🌐 Web server: http://localhost:{config.PORT}")
+    logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    
+    # Platforms stop services with SIGTERM; turn it into a clean exit
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    
+    try:
+        run_flask()
+    finally:
+        logger.info("🛑 Stopping workers...")
+        webhook_dispatcher.stop()
+
+# ==================== MAIN FUNCTION ====================
+
+def main():
+    """Main function to run the bot"""
+    
+    logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    logger.info(f"🚀 Starting {config.BOT_NAME}...")
+    logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    
+    # Validate configuration
+    try:
+        config.validate_config()
+        logger.info("✅ Configuration validated")
+    except ValueError as e:
+        logger.error(f"❌ Configuration error: {e}")
+        return
+    
+    if config.BOT_MODE == "webhook":
+        run_webhook()
+        return
+    
+    # Start Flask web server
+    logger.info(f"🌐 Starting web server on port {config.PORT}...")
+    flask_thread = Thread(target=run_flask, daemon=True)
+    flask_thread.start()
+    logger.info("✅ Web server started")
+    
+    # Create bot application
+    logger.info("🤖 Initializing bot application...")
+    application = build_application()
+    
+    # Setup bot commands menu and database background workers
+    application.post_init = on_startup
+    application.post_shutdown = on_shutdown
     
     # Start bot
     logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
@@ -37,6 +37,14 @@ STORAGE_CHANNELS = [
 # ===== SERVER =====
 PORT = int(os.getenv("PORT", "10000"))
 WEBHOOK_URL = os.getenv("WEBHOOK_URL") or os.getenv("RENDER_EXTERNAL_URL", "")
+# "polling" (single process) or "webhook" (updates fanned out to worker processes)
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+# Webhook path/header secret; a random one is generated at startup when unset
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", str(os.cpu_count() or 2)))
+# Point at a fake Bot API server for local testing (see fake_telegram.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org/bot")
+TELEGRAM_FILE_URL = os.getenv("TELEGRAM_FILE_URL", "https://api.telegram.org/file/bot")
 
 # ===== FEATURE FLAGS =====
 ENABLE_PREMIUM_FEATURES = os.getenv("ENABLE_PREMIUM_FEATURES", "true").lower() == "true"
@@ -125,8 +133,119 @@ for plan in PLANS.values():
 # ===== FILE SETTINGS =====
 FILE_AUTO_DELETE_MINUTES = int(os.getenv("FILE_AUTO_DELETE_MINUTES", "20"))
 FILE_AUTO_DELETE_SECONDS = FILE_AUTO_DELETE_MINUTES * 60
+# How often due auto-deletions are processed, and how many entries per batch
+AUTO_DELETE_TICK_SECONDS = int(os.getenv("AUTO_DELETE_TICK_SECONDS", "10"))
+AUTO_DELETE_BATCH_SIZE = int(os.getenv("AUTO_DELETE_BATCH_SIZE", "500"))
+# Deletions that fail transiently are retried with exponential backoff, then dropped
+AUTO_DELETE_MAX_ATTEMPTS = int(os.getenv("AUTO_DELETE_MAX_ATTEMPTS", "8"))
+AUTO_DELETE_RETRY_BASE_SECONDS = float(os.getenv("AUTO_DELETE_RETRY_BASE_SECONDS", "30"))
 MAX_FILE_SIZE_BYTES = int(os.getenv("MAX_FILE_SIZE_BYTES", str(4 * 1024 * 1024 * 1024)))
 
+# ===== PERFORMANCE =====
+# In-process user cache (documents + resolved plan IDs)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+# In-process cache of hot link documents, bounded by their encoded size
+LINK_CACHE_MAX_BYTES = int(os.getenv("LINK_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+LINK_CACHE_TTL_SECONDS = int(os.getenv("LINK_CACHE_TTL_SECONDS", "30"))
+# Write last_seen at most once per interval per user
+USER_TOUCH_INTERVAL_SECONDS = int(os.getenv("USER_TOUCH_INTERVAL_SECONDS", "300"))
+# Admin global stats are recomputed at most this often
+STATS_CACHE_TTL_SECONDS = int(os.getenv("STATS_CACHE_TTL_SECONDS", "30"))
+# Rebuild the materialized stats collection from links to correct drift
+STATS_RECONCILE_INTERVAL_SECONDS = int(os.getenv("STATS_RECONCILE_INTERVAL_SECONDS", "21600"))
+# Buffered view/download counters are written to MongoDB this often
+COUNTER_FLUSH_INTERVAL_SECONDS = float(os.getenv("COUNTER_FLUSH_INTERVAL_SECONDS", "5"))
+# Analytics events are queued and written with insert_many
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "10000"))
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "500"))
+EVENT_FLUSH_INTERVAL_SECONDS = float(os.getenv("EVENT_FLUSH_INTERVAL_SECONDS", "2"))
+# Above this fill ratio only EVENT_SAMPLE_RATE of new events are kept
+EVENT_HIGH_WATER_RATIO = float(os.getenv("EVENT_HIGH_WATER_RATIO", "0.8"))
+EVENT_SAMPLE_RATE = float(os.getenv("EVENT_SAMPLE_RATE", "0.1"))
+
+# Telegram flood limits (messages per second) shared by all senders
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", "20"))
+TELEGRAM_MAX_INFLIGHT = int(os.getenv("TELEGRAM_MAX_INFLIGHT", "16"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+# Writes into our own storage channels (replication, imports)
+TELEGRAM_STORAGE_RATE = float(os.getenv("TELEGRAM_STORAGE_RATE", "10"))
+TELEGRAM_STORAGE_BURST = float(os.getenv("TELEGRAM_STORAGE_BURST", "20"))
+# Channel imports inspect source posts in windows of this many message IDs (max 100)
+IMPORT_BATCH_SIZE = min(int(os.getenv("IMPORT_BATCH_SIZE", "100")), 100)
+# Import jobs save their progress every IMPORT_CHECKPOINT_MESSAGES scanned IDs.
+# A job whose process stops renewing its lease is resumed by another run.
+IMPORT_CHECKPOINT_MESSAGES = int(os.getenv("IMPORT_CHECKPOINT_MESSAGES", "200"))
+IMPORT_LEASE_SECONDS = float(os.getenv("IMPORT_LEASE_SECONDS", "300"))
+IMPORT_RESUME_POLL_SECONDS = float(os.getenv("IMPORT_RESUME_POLL_SECONDS", "60"))
+IMPORT_JOB_RETENTION_SECONDS = int(os.getenv("IMPORT_JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+# Import scheduler: jobs progressing at once, their shared API budget (requests
+# per second), the premium share of turns and per-job inspection concurrency,
+# which grows by one per clean window and halves on a flood wait
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "3"))
+IMPORT_GLOBAL_RATE = float(os.getenv("IMPORT_GLOBAL_RATE", "10"))
+IMPORT_PREMIUM_WEIGHT = int(os.getenv("IMPORT_PREMIUM_WEIGHT", "3"))
+IMPORT_INITIAL_CONCURRENCY = int(os.getenv("IMPORT_INITIAL_CONCURRENCY", "4"))
+IMPORT_MAX_CONCURRENCY = int(os.getenv("IMPORT_MAX_CONCURRENCY", "20"))
+# A window that fails is rescanned up to IMPORT_WINDOW_RETRIES times with
+# exponential backoff, then skipped and reported when the import completes
+IMPORT_WINDOW_RETRIES = int(os.getenv("IMPORT_WINDOW_RETRIES", "3"))
+IMPORT_WINDOW_RETRY_BASE_SECONDS = float(os.getenv("IMPORT_WINDOW_RETRY_BASE_SECONDS", "5"))
+# Broadcasts: messages per second (below the global limit so users still get
+# their files), sends in flight, users per checkpointed page
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "20"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", "500"))
+BROADCAST_LEASE_SECONDS = float(os.getenv("BROADCAST_LEASE_SECONDS", "300"))
+BROADCAST_RESUME_POLL_SECONDS = float(os.getenv("BROADCAST_RESUME_POLL_SECONDS", "60"))
+BROADCAST_PROGRESS_INTERVAL_SECONDS = float(os.getenv("BROADCAST_PROGRESS_INTERVAL_SECONDS", "5"))
+# Link lifecycle sweeper: how often expired and scheduled links are switched,
+# links per batch (a sweep repeats batches until one comes back short)
+LINK_SWEEP_INTERVAL_SECONDS = float(os.getenv("LINK_SWEEP_INTERVAL_SECONDS", "60"))
+LINK_SWEEP_BATCH_SIZE = int(os.getenv("LINK_SWEEP_BATCH_SIZE", "500"))
+# Explain the hot query shapes against the index manifest once at startup
+# (also: python -m utils.index_advisor)
+INDEX_ADVISOR_ON_STARTUP = os.getenv("INDEX_ADVISOR_ON_STARTUP", "false").lower() == "true"
+# Multi-file links: "album" uses send_media_group with per-file captions,
+# "single" sends one by one, "copy" uses copy_messages, which cannot set
+# captions, so it only applies when FILE_SENT_MESSAGE is empty
+DELIVERY_MODE = os.getenv("DELIVERY_MODE", "album").lower()
+BULK_DELIVERY_MIN_FILES = int(os.getenv("BULK_DELIVERY_MIN_FILES", "3"))
+# Storage channel health: EWMA weight, failures before a channel is skipped,
+# and how long it is skipped before a probe request is let through
+CHANNEL_HEALTH_ALPHA = float(os.getenv("CHANNEL_HEALTH_ALPHA", "0.2"))
+CHANNEL_FAILURE_THRESHOLD = int(os.getenv("CHANNEL_FAILURE_THRESHOLD", "3"))
+CHANNEL_COOLDOWN_SECONDS = float(os.getenv("CHANNEL_COOLDOWN_SECONDS", "60"))
+# Background copies of uploads to the backup storage channels
+REPLICATION_WORKERS = int(os.getenv("REPLICATION_WORKERS", "3"))
+REPLICATION_MAX_ATTEMPTS = int(os.getenv("REPLICATION_MAX_ATTEMPTS", "5"))
+REPLICATION_RETRY_BASE_SECONDS = float(os.getenv("REPLICATION_RETRY_BASE_SECONDS", "2"))
+# A job out of attempts waits this long, then starts over
+REPLICATION_PARK_SECONDS = float(os.getenv("REPLICATION_PARK_SECONDS", "86400"))
+# A claimed job is hidden from other workers this long
+REPLICATION_LEASE_SECONDS = float(os.getenv("REPLICATION_LEASE_SECONDS", "120"))
+REPLICATION_POLL_SECONDS = float(os.getenv("REPLICATION_POLL_SECONDS", "30"))
+# Scan links for files missing from a storage channel (also covers newly added channels),
+# REPLICATION_SCAN_BATCH links per window, a pause between windows and the interval between passes
+REPLICATION_SCAN_INTERVAL_SECONDS = int(os.getenv("REPLICATION_SCAN_INTERVAL_SECONDS", "3600"))
+REPLICATION_SCAN_BATCH = int(os.getenv("REPLICATION_SCAN_BATCH", "500"))
+REPLICATION_SCAN_PAUSE_SECONDS = float(os.getenv("REPLICATION_SCAN_PAUSE_SECONDS", "5"))
+# Upload sessions (/upload, /add): "mongo" is shared by every bot process and
+# survives restarts, "memory" is a per-process LRU
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "mongo").lower()
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "21600"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+# Minimum gap between edits of a delivery progress message
+DELIVERY_PROGRESS_INTERVAL_SECONDS = float(os.getenv("DELIVERY_PROGRESS_INTERVAL_SECONDS", "3"))
+# Conversation state (context.user_data) is saved to MongoDB this often and
+# dropped after USER_STATE_TTL_SECONDS without activity
+USER_STATE_FLUSH_INTERVAL_SECONDS = float(os.getenv("USER_STATE_FLUSH_INTERVAL_SECONDS", "5"))
+USER_STATE_TTL_SECONDS = int(os.getenv("USER_STATE_TTL_SECONDS", str(30 * 24 * 3600)))
+# How long a correct link password keeps the link unlocked
+PASSWORD_VERIFIED_TTL_SECONDS = int(os.getenv("PASSWORD_VERIFIED_TTL_SECONDS", "86400"))
+
 # ===== SECURITY =====
 RATE_LIMIT_MESSAGES = int(os.getenv("RATE_LIMIT_MESSAGES", "20"))
 RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "60"))
@@ -1,15 +1,544 @@
 """
 Share-box by Univora - Advanced Database Module
 MongoDB operations with async support and advanced features
+
+`Database` is the blocking pymongo manager used by the Flask dashboard thread.
+`AsyncDatabase` is its Motor twin with the same method surface; every bot
+handler awaits it so a slow query never stalls the PTB event loop.
 """
 
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument, UpdateOne, ReplaceOne, DeleteOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from bson import decode as bson_decode
+from bson.raw_bson import RawBSONDocument
+from motor.motor_asyncio import AsyncIOMotorClient
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Awaitable, Callable, Tuple
+import asyncio
+import copy
+import random
+import re
 import secrets
+import time
 import pytz
 import config
 
+# ==================== CACHING ====================
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a TTL"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+    
+    def get(self, key, default=None):
+        """Return a live entry and mark it as recently used"""
+        item = self._data.get(key)
+        if item is None:
+            return default
+        
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        
+        self._data.move_to_end(key)
+        return value
+    
+    def set(self, key, value, ttl: float = None):
+        """Insert or replace an entry, evicting the least recently used"""
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def pop(self, key, default=None):
+        """Remove an entry"""
+        item = self._data.pop(key, None)
+        return item[1] if item else default
+    
+    def clear(self):
+        self._data.clear()
+    
+    def values(self):
+        """Live values, without changing recency"""
+        now = time.monotonic()
+        return [value for expires_at, value in list(self._data.values()) if expires_at > now]
+    
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+class LinkCache:
+    """
+    LRU cache of raw BSON link documents, bounded by their total size in
+    bytes. Callers decode a private copy per hit, and concurrent misses for
+    the same link share a single load.
+    """
+    
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._data = OrderedDict()  # key -> (expires_at, raw bytes)
+        self._loads = {}            # key -> in-flight load task
+    
+    def get(self, key) -> Optional[bytes]:
+        """Return a live entry and mark it as recently used"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        
+        expires_at, raw = item
+        if expires_at <= time.monotonic():
+            self.pop(key)
+            return None
+        
+        self._data.move_to_end(key)
+        return raw
+    
+    def set(self, key, raw: bytes):
+        """Insert or replace an entry, evicting the least recently used"""
+        self.pop(key)
+        # A handful of huge links must not push everything else out
+        if len(raw) > self.max_bytes // 16:
+            return
+        
+        self._data[key] = (time.monotonic() + self.ttl, raw)
+        self.size += len(raw)
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self._data.popitem(last=False)
+            self.size -= len(evicted)
+    
+    def pop(self, key):
+        """Drop an entry; a load already in flight will not be stored either"""
+        self._loads.pop(key, None)
+        item = self._data.pop(key, None)
+        if item:
+            self.size -= len(item[1])
+    
+    def clear(self):
+        self._loads.clear()
+        self._data.clear()
+        self.size = 0
+    
+    async def get_or_load(self, key, load: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        """Cached entry, or the result of load(), which runs once however many callers wait"""
+        raw = self.get(key)
+        if raw is not None:
+            return raw
+        
+        task = self._loads.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self._loads[key] = task
+            task.add_done_callback(lambda done: self._store_load(key, done))
+        
+        # A cancelled caller must not cancel the load the others wait on
+        return await asyncio.shield(task)
+    
+    def _store_load(self, key, task: asyncio.Future):
+        # Invalidated while loading: the result may predate the write
+        if self._loads.get(key) is not task:
+            return
+        del self._loads[key]
+        if not task.cancelled() and task.exception() is None and task.result() is not None:
+            self.set(key, task.result())
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+# ==================== WRITE-BEHIND COUNTERS ====================
+
+class CounterBuffer:
+    """Accumulates link and owner counter deltas between bulk flushes"""
+    
+    def __init__(self):
+        self.links = {}     # link_id -> {"views": n, "downloads": n, "last_accessed": dt}
+        self.users = {}     # user_id -> {"total_views": n, "total_downloads": n}
+        self.unowned = {}   # link_id -> owner deltas whose admin_id is not known yet
+    
+    def add(self, link_id: str, admin_id: Optional[int], field: str, accessed_at: datetime = None):
+        """Record one view or download"""
+        entry = self.links.setdefault(link_id, {"views": 0, "downloads": 0, "last_accessed": None})
+        entry[field] += 1
+        if accessed_at and (entry["last_accessed"] is None or accessed_at > entry["last_accessed"]):
+            entry["last_accessed"] = accessed_at
+        
+        owner = self.users if admin_id is not None else self.unowned
+        key = admin_id if admin_id is not None else link_id
+        totals = owner.setdefault(key, {"total_views": 0, "total_downloads": 0})
+        totals[f"total_{field}"] += 1
+    
+    def merge(self, other: "CounterBuffer"):
+        """Fold a batch that failed to flush back in for the next attempt"""
+        for link_id, delta in other.links.items():
+            entry = self.links.setdefault(link_id, {"views": 0, "downloads": 0, "last_accessed": None})
+            entry["views"] += delta["views"]
+            entry["downloads"] += delta["downloads"]
+            if delta["last_accessed"] and (entry["last_accessed"] is None or delta["last_accessed"] > entry["last_accessed"]):
+                entry["last_accessed"] = delta["last_accessed"]
+        
+        for source, target in ((other.users, self.users), (other.unowned, self.unowned)):
+            for key, delta in source.items():
+                totals = target.setdefault(key, {"total_views": 0, "total_downloads": 0})
+                totals["total_views"] += delta["total_views"]
+                totals["total_downloads"] += delta["total_downloads"]
+    
+    def __bool__(self) -> bool:
+        return bool(self.links or self.users or self.unowned)
+
+# ==================== AGGREGATION PIPELINES ====================
+
+# One pass over active links for every global total
+GLOBAL_LINK_STATS_PIPELINE = [
+    {"$match": {"is_active": True}},
+    {
+        "$group": {
+            "_id": None,
+            "total_links": {"$sum": 1},
+            "total_files": {"$sum": {"$size": {"$ifNull": ["$files", []]}}},
+            "total_storage": {"$sum": "$total_size"},
+            "total_downloads": {"$sum": "$downloads"},
+            "total_views": {"$sum": "$views"}
+        }
+    }
+]
+
+# All user counts in one round-trip
+GLOBAL_USER_STATS_PIPELINE = [
+    {
+        "$facet": {
+            "total_users": [{"$count": "count"}],
+            "free_users": [{"$match": {"is_premium": False}}, {"$count": "count"}],
+            "premium_users": [{"$match": {"is_premium": True}}, {"$count": "count"}]
+        }
+    }
+]
+
+def build_global_stats(link_rows: List[Dict], user_rows: List[Dict]) -> Dict:
+    """Merge the link $group and user $facet results into the stats dict"""
+    link_totals = link_rows[0] if link_rows else {}
+    user_facets = user_rows[0] if user_rows else {}
+    
+    stats = {}
+    for key in ("total_users", "free_users", "premium_users"):
+        bucket = user_facets.get(key) or [{}]
+        stats[key] = bucket[0].get("count", 0)
+    
+    for key in ("total_links", "total_files", "total_storage", "total_downloads", "total_views"):
+        stats[key] = link_totals.get(key, 0)
+    
+    return stats
+
+# ==================== LINK LIFECYCLE ====================
+
+def active_link_query(link_id: str) -> Dict:
+    """Query for a link that is active and not past its expiry"""
+    return {
+        "link_id": link_id,
+        "is_active": True,
+        "$or": [{"expires_at": None}, {"expires_at": {"$gt": datetime.now(pytz.UTC)}}]
+    }
+
+# Fields the storage and stats adjustments of a (de)activated link need
+LINK_ACCOUNTING_PROJECTION = {
+    "link_id": 1, "admin_id": 1, "total_size": 1, "category": 1,
+    "views": 1, "downloads": 1, "files.file_id": 1
+}
+
+# ==================== LINK LISTING ====================
+
+# A link list entry: everything but the files, which are only counted
+LINK_SUMMARY_PROJECTION = {
+    "_id": 0, "link_id": 1, "link_name": 1, "category": 1, "created_at": 1,
+    "is_premium_link": 1, "total_size": 1, "views": 1, "downloads": 1,
+    "file_count": {"$size": {"$ifNull": ["$files", []]}}
+}
+
+def link_page_pipeline(
+    admin_id: int, category: str, limit: int, after: tuple = None, before: tuple = None, skip: int = 0
+) -> List[Dict]:
+    """
+    Newest-first page of link summaries. after/before are (created_at, link_id)
+    cursors of the last/first link shown on the neighbouring page; pages
+    fetched with before come back oldest first and must be reversed.
+    """
+    query = {"admin_id": admin_id, "is_active": True}
+    if category:
+        query["category"] = category
+    
+    cursor, op, order = (after, "$lt", DESCENDING) if not before else (before, "$gt", ASCENDING)
+    if cursor:
+        created_at, link_id = cursor
+        query["$or"] = [
+            {"created_at": {op: created_at}},
+            {"created_at": created_at, "link_id": {op: link_id}}
+        ]
+    
+    pipeline = [{"$match": query}, {"$sort": {"created_at": order, "link_id": order}}]
+    if skip:
+        pipeline.append({"$skip": skip})
+    pipeline += [{"$limit": limit}, {"$project": LINK_SUMMARY_PROJECTION}]
+    return pipeline
+
+# ==================== LINK SEARCH ====================
+
+# Words are indexed by every prefix up to this length; longer query words
+# are cut to it. Changing it needs a new SEARCH_TOKENS_VERSION.
+SEARCH_PREFIX_MAX = 15
+SEARCH_TOKENS_VERSION = 1
+
+def search_words(text: str) -> List[str]:
+    """Normalized words of a name, category, link ID or query"""
+    return re.findall(r"\w+", (text or "").casefold())
+
+def link_search_tokens(link_name: str, category: str, link_id: str) -> List[str]:
+    """Prefix tokens stored on a link for /search"""
+    tokens = set()
+    for word in search_words(" ".join(filter(None, (link_name, category, link_id)))):
+        for end in range(1, min(len(word), SEARCH_PREFIX_MAX) + 1):
+            tokens.add(word[:end])
+    return sorted(tokens)
+
+def link_search_pipeline(admin_id: int, query: str, limit: int, skip: int = 0) -> List[Dict]:
+    """
+    Links of admin_id holding a prefix of every query word, best match first:
+    the exact link ID, then the exact name, names starting with and
+    containing the query, newest first within each rank.
+    """
+    terms = sorted({word[:SEARCH_PREFIX_MAX] for word in search_words(query)})
+    phrase = query.strip().lower()
+    name = {"$toLower": {"$ifNull": ["$link_name", ""]}}
+    position = {"$indexOfCP": [name, phrase]}
+    
+    return [
+        {"$match": {"admin_id": admin_id, "is_active": True, "search_tokens": {"$all": terms}}},
+        {
+            "$project": {
+                "_id": 0, "link_id": 1, "link_name": 1, "category": 1,
+                "is_premium_link": 1, "created_at": 1,
+                "score": {
+                    "$add": [
+                        {"$cond": [{"$eq": ["$link_id", query.strip()]}, 8, 0]},
+                        {"$cond": [{"$eq": [name, phrase]}, 4, 0]},
+                        {"$cond": [{"$eq": [position, 0]}, 2, 0]},
+                        {"$cond": [{"$gte": [position, 0]}, 1, 0]}
+                    ]
+                }
+            }
+        },
+        {
+            "$facet": {
+                "results": [
+                    {"$sort": {"score": DESCENDING, "created_at": DESCENDING}},
+                    {"$skip": skip},
+                    {"$limit": limit}
+                ],
+                "total": [{"$count": "count"}]
+            }
+        }
+    ]
+
+# ==================== MATERIALIZED STATS ====================
+
+# Per-owner, per-category totals used to rebuild the stats collection
+STATS_RECONCILE_PIPELINE = [
+    {"$match": {"is_active": True}},
+    {
+        "$group": {
+            "_id": {"admin_id": "$admin_id", "category": "$category"},
+            "total_links": {"$sum": 1},
+            "total_files": {"$sum": {"$size": {"$ifNull": ["$files", []]}}},
+            "total_storage": {"$sum": "$total_size"},
+            "total_views": {"$sum": "$views"},
+            "total_downloads": {"$sum": "$downloads"}
+        }
+    }
+]
+
+STATS_FIELDS = ("total_links", "total_files", "total_storage", "total_views", "total_downloads")
+GLOBAL_STATS_ID = "global"
+
+def user_stats_id(user_id: int) -> str:
+    """_id of a user's document in the stats collection"""
+    return f"user:{user_id}"
+
+def encode_stats_category(category: str) -> str:
+    """Make a category name safe to use as a field name"""
+    key = (category or "Others").replace(".", "\uff0e")
+    if key.startswith("$"):
+        key = "\uff04" + key[1:]
+    return key
+
+def decode_stats_category(key: str) -> str:
+    """Reverse encode_stats_category"""
+    if key.startswith("\uff04"):
+        key = "$" + key[1:]
+    return key.replace("\uff0e", ".")
+
+def empty_stats_doc(doc_id: str, user_id: int = None) -> Dict:
+    """Zeroed stats document"""
+    doc = {"_id": doc_id, "scope": "user" if user_id is not None else "global", "categories": {}}
+    if user_id is not None:
+        doc["user_id"] = user_id
+    doc.update({field: 0 for field in STATS_FIELDS})
+    return doc
+
+# ==================== STORAGE REPLICATION ====================
+
+def under_replicated_files_pipeline(channels: List[int], after, limit: int) -> List[Dict]:
+    """
+    Next window of up to limit active links (in _id order, after the link _id
+    `after`): the window's last _id, and its distinct stored files that are
+    missing from any of channels
+    """
+    match = {"is_active": True}
+    if after is not None:
+        match["_id"] = {"$gt": after}
+    return [
+        {"$match": match},
+        {"$sort": {"_id": ASCENDING}},
+        {"$limit": limit},
+        {
+            "$facet": {
+                "last": [{"$group": {"_id": None, "last": {"$max": "$_id"}, "count": {"$sum": 1}}}],
+                "files": [
+                    {"$unwind": "$files"},
+                    {
+                        "$project": {
+                            "_id": 0,
+                            # Files saved before backups were tracked live only in the primary channel
+                            "copies": {
+                                "$cond": [
+                                    {"$gt": [{"$size": {"$ifNull": ["$files.backup_messages", []]}}, 0]},
+                                    "$files.backup_messages",
+                                    [{"channel_id": config.PRIMARY_CHANNEL, "message_id": "$files.message_id"}]
+                                ]
+                            }
+                        }
+                    },
+                    {"$match": {"copies.channel_id": {"$not": {"$all": channels}}}},
+                    {"$group": {"_id": "$copies"}}
+                ]
+            }
+        }
+    ]
+
+def primary_copy(copies: List[Dict]) -> Optional[Dict]:
+    """The copy of a file held in PRIMARY_CHANNEL, if there is one"""
+    for stored in copies:
+        if stored["channel_id"] == config.PRIMARY_CHANNEL:
+            return stored
+    return None
+
+def replication_source(copies: List[Dict]) -> Dict:
+    """
+    The copy replication jobs of a file are keyed on: its primary channel copy,
+    else the first one, so every enqueue of the same file lands on one job
+    """
+    return primary_copy(copies) or copies[0]
+
+# ==================== INDEX MANIFEST ====================
+
+# Bump INDEX_MANIFEST_VERSION whenever the manifest changes; indexes are
+# only (re)built when the version stored in settings differs. Each entry is
+# (collection, keys, create_index options), grouped by the queries it serves
+# (utils/index_advisor.py explains those query shapes against it).
+INDEX_MANIFEST_VERSION = 2
+
+INDEX_MANIFEST = [
+    # Users: by ID (also the broadcast keyset), username, referral code
+    ("users", [("user_id", ASCENDING)], {"unique": True}),
+    ("users", [("username", ASCENDING)], {}),
+    ("users", [("is_premium", ASCENDING)], {}),
+    ("users", [("referral_code", ASCENDING)], {"unique": True, "sparse": True}),
+    
+    # Links: {link_id, is_active} reads hit at most one document via the unique index
+    ("links", [("link_id", ASCENDING)], {"unique": True}),
+    # {admin_id, is_active[, category]} sorted by created_at (lists, counts, keyset pages)
+    ("links", [("admin_id", ASCENDING), ("is_active", ASCENDING), ("created_at", DESCENDING), ("link_id", DESCENDING)], {}),
+    ("links", [("admin_id", ASCENDING), ("is_active", ASCENDING), ("category", ASCENDING), ("created_at", DESCENDING), ("link_id", DESCENDING)], {}),
+    # Dashboard: $or of {admin_id} and legacy {user_id}, sorted by created_at
+    ("links", [("admin_id", ASCENDING), ("created_at", DESCENDING)], {}),
+    ("links", [("user_id", ASCENDING), ("created_at", DESCENDING)], {"sparse": True}),
+    ("links", [("category", ASCENDING)], {}),
+    ("links", [("created_at", DESCENDING)], {}),
+    # Per-owner prefix search
+    ("links", [("admin_id", ASCENDING), ("search_tokens", ASCENDING)], {}),
+    # Lifecycle sweeps: active links past expiry, pending schedule changes
+    ("links", [("is_active", ASCENDING), ("expires_at", ASCENDING)], {}),
+    ("links", [("is_active", ASCENDING), ("scheduled_deactivation", ASCENDING)], {}),
+    ("links", [("is_active", ASCENDING), ("scheduled_activation", ASCENDING)], {}),
+    # Replication: link files holding a given stored copy
+    ("links", [("files.backup_messages.channel_id", ASCENDING), ("files.backup_messages.message_id", ASCENDING)], {}),
+    ("links", [("files.message_id", ASCENDING)], {}),
+    
+    # Analytics
+    ("analytics", [("link_id", ASCENDING)], {}),
+    ("analytics", [("user_id", ASCENDING)], {}),
+    ("analytics", [("timestamp", DESCENDING)], {}),
+    ("analytics", [("event_type", ASCENDING)], {}),
+    
+    # Referrals: {referrer_id[, status]} counts
+    ("referrals", [("referrer_id", ASCENDING), ("status", ASCENDING)], {}),
+    ("referrals", [("referred_id", ASCENDING)], {}),
+    
+    # Stats
+    ("stats", [("scope", ASCENDING), ("reconciled_at", ASCENDING)], {}),
+    
+    # Scheduled message deletions
+    ("deletions", [("due_at", ASCENDING)], {}),
+    
+    # Storage replication jobs
+    ("replication_jobs", [("source.channel_id", ASCENDING), ("source.message_id", ASCENDING), ("target", ASCENDING)], {"unique": True}),
+    ("replication_jobs", [("next_attempt_at", ASCENDING)], {}),
+    
+    # Upload sessions (SESSION_BACKEND=mongo) expire on their own
+    ("upload_sessions", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    
+    # Conversation state of users idle for USER_STATE_TTL_SECONDS is evicted
+    ("user_state", [("updated_at", ASCENDING)], {"expireAfterSeconds": config.USER_STATE_TTL_SECONDS}),
+    
+    # Import jobs: resumable ones by lease, per-user listing; finished jobs expire
+    ("import_jobs", [("status", ASCENDING), ("lease_until", ASCENDING)], {}),
+    ("import_jobs", [("user_id", ASCENDING), ("created_at", DESCENDING)], {}),
+    ("import_jobs", [("finished_at", ASCENDING)], {"expireAfterSeconds": config.IMPORT_JOB_RETENTION_SECONDS}),
+    
+    # Stored copies by file_unique_id (the _id); replicas are found by copy
+    ("file_index", [("copies.channel_id", ASCENDING), ("copies.message_id", ASCENDING)], {}),
+    
+    # Broadcasts to resume
+    ("broadcasts", [("status", ASCENDING), ("lease_until", ASCENDING)], {}),
+]
+
+# Indexes of earlier manifests that are prefixes of (or useless next to) the ones above
+RETIRED_INDEXES = [
+    ("links", "admin_id_1"),
+    ("links", "is_active_1"),
+    ("links", "expires_at_1"),
+    ("referrals", "referrer_id_1"),
+]
+
+# ==================== IMPORT JOBS ====================
+
+# Import job states
+IMPORT_RUNNING = "running"
+IMPORT_COMPLETED = "completed"
+IMPORT_FAILED = "failed"
+
+# ==================== BROADCASTS ====================
+
+# Broadcast states
+BROADCAST_RUNNING = "running"
+BROADCAST_COMPLETED = "completed"
+
 class Database:
     """Advanced database manager with singleton pattern"""
     
@@ -43,6 +572,13 @@ class Database:
         self.analytics = self.db.analytics
         self.referrals = self.db.referrals
         self.settings = self.db.settings
+        self.stats = self.db.stats
+        self.deletions = self.db.deletions
+        self.replication_jobs = self.db.replication_jobs
+        self.user_state = self.db.user_state
+        self.import_jobs = self.db.import_jobs
+        self.file_index = self.db.file_index
+        self.broadcasts = self.db.broadcasts
         
         # Create indexes
         self._create_indexes()
@@ -50,31 +586,25 @@ class Database:
         self._initialized = True
     
     def _create_indexes(self):
-        """Create database indexes for performance"""
+        """Build INDEX_MANIFEST once per manifest version and drop retired indexes"""
         try:
-            # Users indexes
-            self.users.create_index([("user_id", ASCENDING)], unique=True)
-            self.users.create_index([("username", ASCENDING)])
-            self.users.create_index([("is_premium", ASCENDING)])
-            self.users.create_index([("referral_code", ASCENDING)], unique=True, sparse=True)
+            applied = self.settings.find_one({"_id": "index_manifest"})
+            if applied and applied.get("version") == INDEX_MANIFEST_VERSION:
+                return
             
-            # Links indexes
-            self.links.create_index([("link_id", ASCENDING)], unique=True)
-            self.links.create_index([("admin_id", ASCENDING)])
-            self.links.create_index([("is_active", ASCENDING)])
-            self.links.create_index([("category", ASCENDING)])
-            self.links.create_index([("created_at", DESCENDING)])
-            self.links.create_index([("expires_at", ASCENDING)])
+            for collection, keys, options in INDEX_MANIFEST:
+                self.db[collection].create_index(keys, **options)
             
-            # Analytics indexes
-            self.analytics.create_index([("link_id", ASCENDING)])
-            self.analytics.create_index([("user_id", ASCENDING)])
-            self.analytics.create_index([("timestamp", DESCENDING)])
-            self.analytics.create_index([("event_type", ASCENDING)])
+            for collection, name in RETIRED_INDEXES:
+                if name in self.db[collection].index_information():
+                    self.db[collection].drop_index(name)
             
-            # Referrals indexes
-            self.referrals.create_index([("referrer_id", ASCENDING)])
-            self.referrals.create_index([("referred_id", ASCENDING)])
+            self.settings.update_one(
+                {"_id": "index_manifest"},
+                {"$set": {"version": INDEX_MANIFEST_VERSION, "applied_at": datetime.now(pytz.UTC)}},
+                upsert=True
+            )
+            print(f"✅ Index manifest v{INDEX_MANIFEST_VERSION} applied")
             
         except Exception as e:
             print(f"⚠️  Index creation warning: {e}")
@@ -417,7 +947,8 @@ class Database:
             "max_downloads": None,
             "forward_protection": False,
             "scheduled_activation": None,
-            "scheduled_deactivation": None
+            "scheduled_deactivation": None,
+            "search_tokens": link_search_tokens(link_name or f"Link {link_id}", category, link_id)
         }
         
         self.links.insert_one(link_doc)
@@ -441,19 +972,9 @@ class Database:
     
     def get_link(self, link_id: str) -> Optional[Dict]:
         """Get link by ID"""
-        link = self.links.find_one({"link_id": link_id, "is_active": True})
-        
-        # Check if expired
-        if link and link.get("expires_at"):
-            expires_at = link["expires_at"]
-            if expires_at.tzinfo is None:
-                expires_at = expires_at.replace(tzinfo=pytz.UTC)
-                
-            if datetime.now(pytz.UTC) > expires_at:
-                self.delete_link(link_id)
-                return None
-        
-        return link
+        # Expired links are deactivated by the lifecycle sweeper; until it
+        # gets to them they are just filtered out here
+        return self.links.find_one(active_link_query(link_id))
     
     def get_user_links(
         self,
@@ -479,6 +1000,28 @@ class Database:
         """Count user's active links"""
         return self.links.count_documents({"admin_id": admin_id, "is_active": True})
     
+    def list_user_links(
+        self,
+        admin_id: int,
+        category: str = None,
+        limit: int = 5,
+        after: tuple = None,
+        before: tuple = None,
+        skip: int = 0
+    ) -> List[Dict]:
+        """One page of link summaries, newest first (see link_page_pipeline)"""
+        links = list(self.links.aggregate(link_page_pipeline(admin_id, category, limit, after, before, skip)))
+        if before:
+            links.reverse()
+        return links
+    
+    def count_user_links(self, admin_id: int, category: str = None) -> int:
+        """Count user's active links, optionally in one category"""
+        query = {"admin_id": admin_id, "is_active": True}
+        if category:
+            query["category"] = category
+        return self.links.count_documents(query)
+    
     def add_files_to_link(self, link_id: str, files_data: List[Dict]) -> bool:
         """Add files to existing link"""
         link = self.get_link(link_id)
@@ -536,6 +1079,15 @@ class Database:
             {"link_id": link_id},
             {"$set": updates}
         )
+        
+        # Renamed or recategorized: re-index for /search
+        if "link_name" in updates or "category" in updates:
+            link = self.links.find_one({"link_id": link_id}, {"link_name": 1, "category": 1})
+            if link:
+                self.links.update_one({"link_id": link_id}, {"$set": {
+                    "search_tokens": link_search_tokens(link.get("link_name"), link.get("category"), link_id)
+                }})
+        
         return result.modified_count > 0
     
     def delete_link(self, link_id: str) -> bool:
@@ -544,9 +1096,10 @@ class Database:
         if not link:
             return False
         
+        # A pending scheduled activation must not bring a deleted link back
         result = self.links.update_one(
             {"link_id": link_id},
-            {"$set": {"is_active": False}}
+            {"$set": {"is_active": False, "scheduled_activation": None}}
         )
         
         # Free up storage
@@ -720,43 +1273,9 @@ class Database:
     
     def get_global_stats(self) -> Dict:
         """Get global bot statistics"""
-        total_users = self.users.count_documents({})
-        free_users = self.users.count_documents({"is_premium": False})
-        premium_users = self.users.count_documents({"is_premium": True})
-        
-        total_links = self.links.count_documents({"is_active": True})
-        total_files = sum(
-            len(link.get("files", []))
-            for link in self.links.find({"is_active": True})
-        )
-        
-        # Calculate total storage
-        total_storage = sum(
-            link.get("total_size", 0)
-            for link in self.links.find({"is_active": True})
-        )
-        
-        # Calculate total downloads/views
-        total_downloads = sum(
-            link.get("downloads", 0)
-            for link in self.links.find({"is_active": True})
-        )
-        
-        total_views = sum(
-            link.get("views", 0)
-            for link in self.links.find({"is_active": True})
-        )
-        
-        return {
-            "total_users": total_users,
-            "free_users": free_users,
-            "premium_users": premium_users,
-            "total_links": total_links,
-            "total_files": total_files,
-            "total_storage": total_storage,
-            "total_downloads": total_downloads,
-            "total_views": total_views
-        }
+        link_rows = list(self.links.aggregate(GLOBAL_LINK_STATS_PIPELINE))
+        user_rows = list(self.users.aggregate(GLOBAL_USER_STATS_PIPELINE))
+        return build_global_stats(link_rows, user_rows)
     
     def get_user_stats(self, user_id: int) -> dict:
         """Get comprehensive user statistics"""
@@ -815,5 +1334,1666 @@ class Database:
         if self.client:
             self.client.close()
 
-# Initialize database singleton
+# ==================== ASYNC DATABASE ====================
+
+class AsyncDatabase:
+    """Motor-backed twin of Database for use inside the bot event loop"""
+    
+    _instance = None
+    
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AsyncDatabase, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+    
+    def __init__(self):
+        if self._initialized:
+            return
+        
+        # Motor binds to the running loop lazily, so creating it at import is safe
+        self.client = AsyncIOMotorClient(
+            config.MONGO_URI,
+            maxPoolSize=50,
+            minPoolSize=10,
+            serverSelectionTimeoutMS=5000,
+            connectTimeoutMS=10000,
+            retryWrites=True
+        )
+        
+        self.db = self.client[config.DATABASE_NAME]
+        
+        # Collections
+        self.users = self.db.users
+        self.links = self.db.links
+        self.analytics = self.db.analytics
+        self.referrals = self.db.referrals
+        self.settings = self.db.settings
+        self.stats = self.db.stats
+        self.deletions = self.db.deletions
+        self.replication_jobs = self.db.replication_jobs
+        self.user_state = self.db.user_state
+        self.import_jobs = self.db.import_jobs
+        self.file_index = self.db.file_index
+        self.broadcasts = self.db.broadcasts
+        
+        # Indexes are created once by the sync Database at import time
+        
+        # User-state cache: documents, resolved plan IDs and last_seen touches.
+        # Entries are patched by our own writes; the TTL bounds staleness from
+        # writes made by other processes.
+        self._user_cache = TTLCache(config.USER_CACHE_SIZE, config.USER_CACHE_TTL_SECONDS)
+        self._plan_cache = TTLCache(config.USER_CACHE_SIZE, config.USER_CACHE_TTL_SECONDS)
+        self._touched = TTLCache(config.USER_CACHE_SIZE, config.USER_TOUCH_INTERVAL_SECONDS)
+        
+        self._stats_cache = TTLCache(1, config.STATS_CACHE_TTL_SECONDS)
+        
+        # Hot links as raw BSON: our own link writes invalidate them, the TTL
+        # bounds staleness from other processes and buffered view counters
+        self._link_cache = LinkCache(config.LINK_CACHE_MAX_BYTES, config.LINK_CACHE_TTL_SECONDS)
+        # Per-owner link counts ({category or None: count}) for paginated lists
+        self._link_counts = TTLCache(config.USER_CACHE_SIZE, config.USER_CACHE_TTL_SECONDS)
+        self._raw_links = self.links.with_options(
+            codec_options=self.links.codec_options.with_options(document_class=RawBSONDocument)
+        )
+        
+        # Write-behind view/download counters
+        self._counters = CounterBuffer()
+        self._flush_lock = asyncio.Lock()
+        
+        # Buffered analytics events, drained by the event worker
+        self._events = asyncio.Queue(maxsize=config.EVENT_QUEUE_SIZE)
+        self._event_write = None
+        self.events_dropped = 0
+        
+        # Background workers started by start()
+        self._tasks = []
+        
+        self._initialized = True
+    
+    # ==================== LIFECYCLE ====================
+    
+    async def start(self, background_jobs: bool = True):
+        """
+        Start background flush workers (call once the event loop runs).
+        Every process flushes its own buffers; background_jobs (stats
+        reconciliation, search backfill) should run in only one process.
+        """
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._counter_flush_loop()))
+        self._tasks.append(asyncio.create_task(self._event_flush_loop()))
+        if background_jobs:
+            self._tasks.append(asyncio.create_task(self._stats_reconcile_loop()))
+            self._tasks.append(asyncio.create_task(self._search_backfill()))
+    
+    async def stop(self):
+        """Stop background workers and flush everything still buffered"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        
+        await self.flush_counters()
+        await self.flush_events()
+        
+        if self.events_dropped:
+            print(f"⚠️  {self.events_dropped} analytics events were dropped under load")
+    
+    # ==================== USER CACHE ====================
+    
+    def _invalidate_user(self, user_id: int):
+        """Drop every cached view of a user"""
+        self._user_cache.pop(user_id)
+        self._plan_cache.pop(user_id)
+    
+    def _patch_cached_user(self, user_id: int, set_fields: Dict = None, inc_fields: Dict = None):
+        """Apply a write we just made to the cached document, if any"""
+        user = self._user_cache.get(user_id)
+        if user is None:
+            return
+        
+        for key, value in (set_fields or {}).items():
+            # Support dotted paths like "settings.language"
+            target = user
+            *parents, leaf = key.split(".")
+            for part in parents:
+                target = target.setdefault(part, {})
+            target[leaf] = value
+        
+        for key, delta in (inc_fields or {}).items():
+            user[key] = user.get(key, 0) + delta
+    
+    # ==================== USER OPERATIONS ====================
+    
+    async def create_user(self, user_id: int, username: str = None, first_name: str = None) -> Dict:
+        """Create or update user (at most one round-trip, usually none)"""
+        
+        # Fast path: cached, recently touched and profile unchanged
+        cached = self._user_cache.get(user_id)
+        if (
+            cached is not None
+            and user_id in self._touched
+            and cached.get("username") == username
+            and cached.get("first_name") == first_name
+            and not cached.get("bot_blocked")
+        ):
+            return copy.deepcopy(cached)
+        
+        # Touched recently by this process - a plain (cached) read is enough
+        if cached is None and user_id in self._touched:
+            user = await self.get_user(user_id)
+            if (
+                user and user.get("username") == username and user.get("first_name") == first_name
+                and not user.get("bot_blocked")
+            ):
+                return user
+        
+        # The unique referral_code index catches the rare collision, so retry
+        # instead of paying a lookup per update
+        for _ in range(3):
+            try:
+                user = await self._upsert_user(user_id, username, first_name)
+                break
+            except DuplicateKeyError:
+                continue
+        else:
+            user = await self.users.find_one({"user_id": user_id})
+        
+        if user:
+            self._user_cache.set(user_id, user)
+            self._touched.set(user_id, True)
+            # Callers get their own copy: changing it must not alter the cache
+            return copy.deepcopy(user)
+        return user
+    
+    async def _upsert_user(self, user_id: int, username: str, first_name: str) -> Dict:
+        """Insert or refresh a user and return the stored document"""
+        user_data = {
+            "user_id": user_id,
+            "is_premium": False,
+            "premium_expiry": None,
+            "subscription_tier": "free",
+            "storage_used": 0,
+            "referral_code": self._new_referral_code(),
+            "referred_by": None,
+            "joined_at": datetime.now(pytz.UTC),
+            "is_blocked": False,
+            "total_links": 0,
+            "total_downloads": 0,
+            "total_views": 0,
+            "settings": {
+                "language": "en",
+                "notifications": True,
+                "default_category": "🗂️ Others",
+                "auto_delete_files": True
+            }
+        }
+        
+        return await self.users.find_one_and_update(
+            {"user_id": user_id},
+            {
+                "$setOnInsert": user_data,
+                "$set": {
+                    "username": username,
+                    "first_name": first_name,
+                    "last_seen": datetime.now(pytz.UTC)
+                },
+                # Talking to us again means the bot is no longer blocked
+                "$unset": {"bot_blocked": ""}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    
+    async def get_user(self, user_id: int) -> Optional[Dict]:
+        """Get user by ID (cached)"""
+        user = self._user_cache.get(user_id)
+        if user is not None:
+            return copy.deepcopy(user)
+        
+        user = await self.users.find_one({"user_id": user_id})
+        if user:
+            self._user_cache.set(user_id, user)
+            # Callers get their own copy: changing it must not alter the cache
+            return copy.deepcopy(user)
+        return user
+
+    async def get_user_storage_used(self, user_id: int) -> int:
+        """Get user storage used in bytes"""
+        user = await self.get_user(user_id)
+        return user.get("storage_used", 0) if user else 0
+    
+    async def update_user_storage(self, user_id: int, storage_delta: int) -> bool:
+        """Update user storage (can be negative)"""
+        result = await self.users.update_one(
+            {"user_id": user_id},
+            {"$inc": {"storage_used": storage_delta}}
+        )
+        self._patch_cached_user(user_id, inc_fields={"storage_used": storage_delta})
+        return result.modified_count > 0
+    
+    async def set_user_plan(self, user_id: int, plan_type: str) -> bool:
+        """Set user plan"""
+        plan_config = config.PLANS.get(plan_type)
+        if not plan_config: return False
+        
+        duration = plan_config.get("duration_days", 30)
+        expiry = datetime.now(pytz.UTC) + timedelta(days=duration)
+        
+        # Reset monthly count if upgrading
+        update_data = {
+            "plan_type": plan_type,
+            "premium_expiry": expiry,
+            "is_premium": plan_type != config.PlanTypes.FREE,
+            "last_link_reset": datetime.now(pytz.UTC),
+            "monthly_link_count": 0
+        }
+        
+        result = await self.users.update_one(
+            {"user_id": user_id},
+            {"$set": update_data},
+            upsert=True
+        )
+        self._invalidate_user(user_id)
+        return result.modified_count > 0 or result.upserted_id is not None
+
+    async def get_user_plan_id(self, user_id: int) -> str:
+        """Get user plan ID (handles expiry)"""
+        # Admins are always lifetime
+        if user_id in config.ADMIN_IDS:
+            return config.PlanTypes.LIFETIME
+        
+        plan_type = self._plan_cache.get(user_id)
+        if plan_type is not None:
+            return plan_type
+            
+        user = await self.get_user(user_id)
+        if not user:
+            return config.PlanTypes.FREE
+            
+        plan_type = user.get("plan_type", config.PlanTypes.FREE)
+        expiry = user.get("premium_expiry")
+        ttl = config.USER_CACHE_TTL_SECONDS
+        
+        # Check expiry if not FREE and not LIFETIME
+        if plan_type != config.PlanTypes.FREE and plan_type != config.PlanTypes.LIFETIME:
+            if expiry:
+                if expiry.tzinfo is None:
+                    expiry = expiry.replace(tzinfo=pytz.UTC)
+                remaining = (expiry - datetime.now(pytz.UTC)).total_seconds()
+                if remaining < 0:
+                    # Downgrade to free if expired
+                    downgrade = {"plan_type": config.PlanTypes.FREE, "is_premium": False}
+                    await self.users.update_one({"user_id": user_id}, {"$set": downgrade})
+                    self._patch_cached_user(user_id, set_fields=downgrade)
+                    plan_type = config.PlanTypes.FREE
+                else:
+                    # Never serve a cached plan past its expiry
+                    ttl = min(ttl, remaining)
+        
+        self._plan_cache.set(user_id, plan_type, ttl=ttl)
+        return plan_type
+
+    async def get_plan_details(self, user_id: int) -> dict:
+        """Get full plan configuration dict"""
+        plan_id = await self.get_user_plan_id(user_id)
+        return config.PLANS.get(plan_id, config.PLANS[config.PlanTypes.FREE])
+
+    async def increment_monthly_link_count(self, user_id: int) -> int:
+        """Increment link count, resetting if month changed"""
+        user = await self.get_user(user_id)
+        if not user: return 0
+        
+        now = datetime.now(pytz.UTC)
+        
+        last_reset = user.get("last_link_reset")
+        if last_reset and last_reset.tzinfo is None:
+            last_reset = last_reset.replace(tzinfo=pytz.UTC)
+             
+        # First time, or the month changed
+        if not last_reset or now.month != last_reset.month or now.year != last_reset.year:
+            reset = {"last_link_reset": now, "monthly_link_count": 1}
+            await self.users.update_one({"user_id": user_id}, {"$set": reset})
+            self._patch_cached_user(user_id, set_fields=reset)
+            return 1
+        
+        # Increment
+        count = user.get("monthly_link_count", 0) + 1
+        await self.users.update_one(
+            {"user_id": user_id},
+            {"$inc": {"monthly_link_count": 1}}
+        )
+        self._patch_cached_user(user_id, inc_fields={"monthly_link_count": 1})
+        return count
+
+    async def check_monthly_limit(self, user_id: int) -> bool:
+        """Check if user can create more links this month"""
+        plan = await self.get_plan_details(user_id)
+        limit = plan.get("max_active_links", 10)
+        
+        # Unlimited check
+        if limit > 99999: return True
+        
+        user = await self.get_user(user_id)
+        if not user: return True
+        
+        # Check reset logic first (readonly check)
+        now = datetime.now(pytz.UTC)
+        last_reset = user.get("last_link_reset")
+        current_count = user.get("monthly_link_count", 0)
+        
+        if last_reset:
+            if last_reset.tzinfo is None: last_reset = last_reset.replace(tzinfo=pytz.UTC)
+            if now.month != last_reset.month or now.year != last_reset.year:
+                current_count = 0 # Will be reset on next increment
+        
+        return current_count < limit
+
+    async def is_user_premium(self, user_id: int) -> bool:
+        """Check if user has active premium (Legacy Compatibility)"""
+        return await self.get_user_plan_id(user_id) != config.PlanTypes.FREE
+
+    async def grant_premium(self, user_id: int, duration_days: int = None) -> bool:
+        """Grant premium (Legacy - Maps to closest plan)"""
+        if duration_days:
+            if duration_days <= 1: 
+                return await self.set_user_plan(user_id, config.PlanTypes.DAILY)
+            elif duration_days <= 31: 
+                return await self.set_user_plan(user_id, config.PlanTypes.MONTHLY)
+            elif duration_days <= 62: 
+                return await self.set_user_plan(user_id, config.PlanTypes.BIMONTHLY)
+            else: 
+                return await self.set_user_plan(user_id, config.PlanTypes.LIFETIME)
+        else:
+            return await self.set_user_plan(user_id, config.PlanTypes.LIFETIME)
+    
+    async def revoke_premium(self, user_id: int) -> bool:
+        """Revoke premium from user"""
+        result = await self.users.update_one(
+            {"user_id": user_id},
+            {
+                "$set": {
+                    "is_premium": False,
+                    "subscription_tier": "free",
+                    "premium_expiry": None
+                }
+            }
+        )
+        self._invalidate_user(user_id)
+        return result.modified_count > 0
+    
+    async def block_user(self, user_id: int) -> bool:
+        """Block user"""
+        result = await self.users.update_one(
+            {"user_id": user_id},
+            {"$set": {"is_blocked": True}}
+        )
+        self._patch_cached_user(user_id, set_fields={"is_blocked": True})
+        return result.modified_count > 0
+    
+    async def unblock_user(self, user_id: int) -> bool:
+        """Unblock user"""
+        result = await self.users.update_one(
+            {"user_id": user_id},
+            {"$set": {"is_blocked": False}}
+        )
+        self._patch_cached_user(user_id, set_fields={"is_blocked": False})
+        return result.modified_count > 0
+    
+    async def get_all_users(self, include_blocked: bool = False) -> List[Dict]:
+        """Get all users"""
+        query = {} if include_blocked else {"is_blocked": False}
+        return await self.users.find(query).to_list(length=None)
+    
+    async def get_blocked_users(self) -> List[Dict]:
+        """Get blocked users"""
+        return await self.users.find({"is_blocked": True}).to_list(length=None)
+    
+    async def update_user_settings(self, user_id: int, settings: Dict) -> bool:
+        """Update user settings"""
+        updates = {f"settings.{k}": v for k, v in settings.items()}
+        result = await self.users.update_one(
+            {"user_id": user_id},
+            {"$set": updates}
+        )
+        self._patch_cached_user(user_id, set_fields=updates)
+        return result.modified_count > 0
+    
+    # ==================== LINK OPERATIONS ====================
+    
+    async def generate_link_id(self) -> str:
+        """Generate unique link ID"""
+        while True:
+            link_id = secrets.token_urlsafe(6)[:8]
+            if not await self.links.find_one({"link_id": link_id}, {"_id": 1}):
+                return link_id
+    
+    async def create_link(
+        self,
+        admin_id: int,
+        files_data: List[Dict],
+        link_name: str = "",
+        password: str = None,
+        category: str = "🗂️ Others",
+        expires_in_days: int = None
+    ) -> Optional[str]:
+        """Create new link based on user plan"""
+        
+        user = await self.get_user(admin_id)
+        if not user: return None
+        
+        plan_id = await self.get_user_plan_id(admin_id)
+        plan = config.PLANS.get(plan_id, config.PLANS[config.PlanTypes.FREE])
+        is_premium = plan_id != config.PlanTypes.FREE
+        
+        # 1. Monthly limit
+        if not await self.check_monthly_limit(admin_id) and admin_id not in config.ADMIN_IDS:
+            return None
+            
+        # 2. Files per link
+        max_files = plan.get("max_files_per_link", 20)
+        if max_files < 99999 and len(files_data) > max_files and admin_id not in config.ADMIN_IDS:
+            return None
+            
+        # 3. Password is a premium feature
+        if password and not is_premium and admin_id not in config.ADMIN_IDS:
+            return None
+             
+        # 4. Storage Check
+        total_size = sum(f.get("file_size", 0) for f in files_data)
+        storage_limit = plan.get("storage_bytes", 50 * 1024 * 1024 * 1024)
+        
+        if admin_id not in config.ADMIN_IDS:
+            if storage_limit < 999999999999 and (user.get("storage_used", 0) + total_size) > storage_limit:
+                return None
+
+        # Generate link
+        link_id = await self.generate_link_id()
+        
+        # Custom expiry wins over the plan default
+        if expires_in_days:
+            expiry_delta = expires_in_days
+        else:
+            expiry_delta = plan.get("link_expiry_days", 60)
+            
+        # Lifetime check
+        if expiry_delta > 30000: # Approx 80 years
+            expires_at = None
+        else:
+            expires_at = datetime.now(pytz.UTC) + timedelta(days=expiry_delta)
+        
+        link_doc = {
+            "link_id": link_id,
+            "admin_id": admin_id,
+            "files": files_data,
+            "link_name": link_name or f"Link {link_id}",
+            "password": password,
+            "category": category,
+            "created_at": datetime.now(pytz.UTC),
+            "expires_at": expires_at,
+            "downloads": 0,
+            "views": 0,
+            "last_accessed": None,
+            "is_active": True,
+            "is_premium_link": is_premium,
+            "total_size": total_size,
+            "whitelist_users": [],
+            "max_downloads": None,
+            "forward_protection": False,
+            "scheduled_activation": None,
+            "scheduled_deactivation": None,
+            "search_tokens": link_search_tokens(link_name or f"Link {link_id}", category, link_id)
+        }
+        
+        await self.links.insert_one(link_doc)
+        
+        # Increment Monthly Count
+        if admin_id not in config.ADMIN_IDS:
+            await self.increment_monthly_link_count(admin_id)
+        
+        # Update user stats
+        user_inc = {"storage_used": total_size, "total_links": 1}
+        await self.users.update_one({"user_id": admin_id}, {"$inc": user_inc})
+        self._patch_cached_user(admin_id, inc_fields=user_inc)
+        self._link_counts.pop(admin_id)
+        
+        await self._bump_stats(
+            admin_id,
+            {"total_links": 1, "total_files": len(files_data), "total_storage": total_size},
+            category=category, category_delta=1
+        )
+        
+        return link_id
+    
+    async def get_link(self, link_id: str) -> Optional[Dict]:
+        """Get link by ID (served from the link cache when hot)"""
+        raw = await self._link_cache.get_or_load(link_id, lambda: self._load_link(link_id))
+        if raw is None:
+            return None
+        
+        # Each caller gets its own copy to mutate
+        link = bson_decode(raw, codec_options=self.links.codec_options)
+        
+        # Cached before it expired
+        expires_at = link.get("expires_at")
+        if expires_at:
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=pytz.UTC)
+            if expires_at <= datetime.now(pytz.UTC):
+                self._link_cache.pop(link_id)
+                return None
+        
+        return link
+    
+    async def _load_link(self, link_id: str) -> Optional[bytes]:
+        # Expired links are deactivated by the lifecycle sweeper; until it
+        # gets to them they are just filtered out here
+        link = await self._raw_links.find_one(active_link_query(link_id))
+        return link.raw if link is not None else None
+    
+    async def get_user_links(
+        self,
+        admin_id: int,
+        category: str = None,
+        skip: int = 0,
+        limit: int = 10
+    ) -> List[Dict]:
+        """Get user's links with pagination"""
+        query = {"admin_id": admin_id, "is_active": True}
+        
+        if category:
+            query["category"] = category
+        
+        cursor = (
+            self.links.find(query)
+            .sort("created_at", DESCENDING)
+            .skip(skip)
+            .limit(limit)
+        )
+        return await cursor.to_list(length=limit)
+    
+    async def get_user_active_links_count(self, admin_id: int) -> int:
+        """Count user's active links"""
+        return await self.links.count_documents({"admin_id": admin_id, "is_active": True})
+    
+    async def list_user_links(
+        self,
+        admin_id: int,
+        category: str = None,
+        limit: int = 5,
+        after: tuple = None,
+        before: tuple = None,
+        skip: int = 0
+    ) -> List[Dict]:
+        """One page of link summaries, newest first (see link_page_pipeline)"""
+        cursor = self.links.aggregate(link_page_pipeline(admin_id, category, limit, after, before, skip))
+        links = await cursor.to_list(length=limit)
+        if before:
+            links.reverse()
+        return links
+    
+    async def count_user_links(self, admin_id: int, category: str = None) -> int:
+        """Count user's active links, optionally in one category (cached)"""
+        counts = self._link_counts.get(admin_id)
+        if counts is None:
+            counts = {}
+            self._link_counts.set(admin_id, counts)
+        
+        if category not in counts:
+            query = {"admin_id": admin_id, "is_active": True}
+            if category:
+                query["category"] = category
+            counts[category] = await self.links.count_documents(query)
+        return counts[category]
+    
+    async def search_links(self, admin_id: int, query: str, limit: int = 10, skip: int = 0) -> Dict:
+        """Ranked page of a user's links matching query: {"results": [...], "total": n}"""
+        if not search_words(query):
+            return {"results": [], "total": 0}
+        
+        cursor = self.links.aggregate(link_search_pipeline(admin_id, query, limit, skip))
+        page = (await cursor.to_list(length=1))[0]
+        total = page["total"][0]["count"] if page["total"] else 0
+        return {"results": page["results"], "total": total}
+    
+    async def backfill_search_tokens(self, batch_size: int = 500) -> int:
+        """Add search tokens to links created before /search was indexed (once per token version)"""
+        marker = await self.settings.find_one({"_id": "search_tokens"})
+        if marker and marker.get("version") == SEARCH_TOKENS_VERSION:
+            return 0
+        
+        # A version bump re-indexes every link, a first run only those without tokens
+        query = {} if marker else {"search_tokens": {"$exists": False}}
+        filled = 0
+        last_id = None
+        while True:
+            page_query = {**query, "_id": {"$gt": last_id}} if last_id else query
+            links = await (
+                self.links.find(page_query, {"link_id": 1, "link_name": 1, "category": 1})
+                .sort("_id", ASCENDING)
+                .limit(batch_size)
+                .to_list(length=batch_size)
+            )
+            if not links:
+                break
+            
+            await self.links.bulk_write([
+                UpdateOne({"_id": link["_id"]}, {"$set": {
+                    "search_tokens": link_search_tokens(link.get("link_name"), link.get("category"), link["link_id"])
+                }})
+                for link in links
+            ], ordered=False)
+            filled += len(links)
+            last_id = links[-1]["_id"]
+        
+        await self.settings.update_one(
+            {"_id": "search_tokens"},
+            {"$set": {"version": SEARCH_TOKENS_VERSION, "updated_at": datetime.now(pytz.UTC)}},
+            upsert=True
+        )
+        return filled
+    
+    async def add_files_to_link(self, link_id: str, files_data: List[Dict]) -> bool:
+        """Add files to existing link"""
+        link = await self.get_link(link_id)
+        if not link:
+            return False
+        
+        # Calculate new total size
+        additional_size = sum(f.get("file_size", 0) for f in files_data)
+        
+        result = await self.links.update_one(
+            {"link_id": link_id},
+            {
+                "$push": {"files": {"$each": files_data}},
+                "$inc": {"total_size": additional_size}
+            }
+        )
+        self._link_cache.pop(link_id)
+        
+        # Update user storage
+        if result.modified_count > 0:
+            await self.update_user_storage(link["admin_id"], additional_size)
+            await self._bump_stats(
+                link["admin_id"],
+                {"total_files": len(files_data), "total_storage": additional_size}
+            )
+        
+        return result.modified_count > 0
+    
+    async def remove_file_from_link(self, link_id: str, file_index: int) -> bool:
+        """Remove specific file from link"""
+        link = await self.get_link(link_id)
+        if not link or file_index >= len(link["files"]):
+            return False
+        
+        removed_file = link["files"][file_index]
+        removed_size = removed_file.get("file_size", 0)
+        
+        link["files"].pop(file_index)
+        
+        if len(link["files"]) == 0:
+            return await self.delete_link(link_id)
+        
+        result = await self.links.update_one(
+            {"link_id": link_id},
+            {
+                "$set": {"files": link["files"]},
+                "$inc": {"total_size": -removed_size}
+            }
+        )
+        self._link_cache.pop(link_id)
+        
+        # Update user storage
+        if result.modified_count > 0:
+            await self.update_user_storage(link["admin_id"], -removed_size)
+            await self._bump_stats(
+                link["admin_id"],
+                {"total_files": -1, "total_storage": -removed_size}
+            )
+        
+        return result.modified_count > 0
+        
+    async def update_link(self, link_id: str, updates: Dict) -> bool:
+        """Update link fields"""
+        if "category" in updates:
+            # The pre-image tells which category the stats documents count the link under
+            before = await self.links.find_one_and_update(
+                {"link_id": link_id},
+                {"$set": updates},
+                projection={"admin_id": 1, "is_active": 1, **{field: 1 for field in updates}}
+            )
+            modified = before is not None and any(before.get(field) != value for field, value in updates.items())
+        else:
+            result = await self.links.update_one(
+                {"link_id": link_id},
+                {"$set": updates}
+            )
+            before = None
+            modified = result.modified_count > 0
+        self._link_cache.pop(link_id)
+        
+        if before and before.get("category") != updates["category"]:
+            self._link_counts.pop(before["admin_id"])
+            # Only active links are counted (see STATS_RECONCILE_PIPELINE)
+            if before.get("is_active"):
+                await self._bump_stats(before["admin_id"], {}, category=before.get("category"), category_delta=-1)
+                await self._bump_stats(before["admin_id"], {}, category=updates["category"], category_delta=1)
+        
+        # Renamed or recategorized: re-index for /search
+        if "link_name" in updates or "category" in updates:
+            link = await self.links.find_one({"link_id": link_id}, {"link_name": 1, "category": 1})
+            if link:
+                await self.links.update_one({"link_id": link_id}, {"$set": {
+                    "search_tokens": link_search_tokens(link.get("link_name"), link.get("category"), link_id)
+                }})
+        return modified
+    
+    async def unset_link_fields(self, link_id: str, fields: List[str]) -> bool:
+        """Remove fields from a link document"""
+        result = await self.links.update_one(
+            {"link_id": link_id},
+            {"$unset": {field: "" for field in fields}}
+        )
+        self._link_cache.pop(link_id)
+        return result.modified_count > 0
+    
+    async def add_file_replica(self, source_channel: int, source_message_id: int, replica: Dict) -> int:
+        """Record a storage replica on every link file (and the file index) holding the source copy"""
+        # Cached links pick the replica up when their entry expires: it only
+        # matters once the copy they already list fails
+        source = {"channel_id": source_channel, "message_id": source_message_id}
+        await self.file_index.update_many({"copies": source}, {"$addToSet": {"copies": replica}})
+        
+        stored_as = {"backup_messages": {"$elemMatch": source}}
+        result = await self.links.update_many(
+            {"files": {"$elemMatch": stored_as}},
+            {"$addToSet": {"files.$[f].backup_messages": replica}},
+            array_filters=[{"f.backup_messages": {"$elemMatch": source}}]
+        )
+        modified = result.modified_count
+        
+        # Files without backup_messages were stored in the primary channel only
+        if source_channel == config.PRIMARY_CHANNEL:
+            legacy = {"message_id": source_message_id, "backup_messages": {"$exists": False}}
+            result = await self.links.update_many(
+                {"files": {"$elemMatch": legacy}},
+                {"$set": {"files.$[f].backup_messages": [source, replica]}},
+                array_filters=[{f"f.{key}": value for key, value in legacy.items()}]
+            )
+            modified += result.modified_count
+        
+        return modified
+    
+    async def delete_link(self, link_id: str) -> bool:
+        """Soft delete link and free storage"""
+        # A pending scheduled activation must not bring a deleted link back
+        link = await self.links.find_one_and_update(
+            {"link_id": link_id, "is_active": True},
+            {"$set": {"is_active": False, "scheduled_activation": None}},
+            projection=LINK_ACCOUNTING_PROJECTION
+        )
+        self._link_cache.pop(link_id)
+        if not link:
+            return False
+        self._link_counts.pop(link["admin_id"])
+        
+        # Free up storage
+        total_size = link.get("total_size", 0)
+        await self.update_user_storage(link["admin_id"], -total_size)
+        await self._bump_stats(
+            link["admin_id"],
+            {
+                "total_links": -1,
+                "total_files": -len(link.get("files", [])),
+                "total_storage": -total_size,
+                "total_views": -link.get("views", 0),
+                "total_downloads": -link.get("downloads", 0)
+            },
+            category=link.get("category"), category_delta=-1
+        )
+        
+        return True
+    
+    # ==================== LINK LIFECYCLE ====================
+    
+    async def _switch_links(self, query: Dict, active: bool, limit: int, clear: Dict = None) -> int:
+        """
+        Flip up to limit links matching query to active (or inactive), then
+        charge (or free) their owners' storage with one bulk_write. Returns
+        how many links this call actually switched (links switched elsewhere
+        in between are left out); clear is $set on them as well.
+        """
+        candidates = [
+            doc["_id"] async for doc in
+            self.links.find({**query, "is_active": not active}, {"_id": 1}).limit(limit)
+        ]
+        if not candidates:
+            return 0
+        
+        # Tag our writes so links switched concurrently elsewhere are not counted twice
+        token = secrets.token_hex(8)
+        await self.links.update_many(
+            {"_id": {"$in": candidates}, "is_active": not active},
+            {"$set": {"is_active": active, "lifecycle_token": token, **(clear or {})}}
+        )
+        switched = await self.links.find(
+            {"_id": {"$in": candidates}, "lifecycle_token": token},
+            LINK_ACCOUNTING_PROJECTION
+        ).to_list(None)
+        for link in switched:
+            self._link_cache.pop(link["link_id"])
+            self._link_counts.pop(link["admin_id"])
+        
+        await self._account_links(switched, 1 if active else -1)
+        return len(switched)
+    
+    async def _account_links(self, links: List[Dict], sign: int):
+        """Per-owner storage and stats adjustments for links that were switched"""
+        storage = {}
+        stats_ops = []
+        for link in links:
+            admin_id = link["admin_id"]
+            total_size = link.get("total_size", 0)
+            storage[admin_id] = storage.get(admin_id, 0) + total_size
+            stats_ops.extend(self._stats_ops(
+                admin_id,
+                {
+                    "total_links": sign,
+                    "total_files": sign * len(link.get("files", [])),
+                    "total_storage": sign * total_size,
+                    "total_views": sign * link.get("views", 0),
+                    "total_downloads": sign * link.get("downloads", 0)
+                },
+                category=link.get("category"), category_delta=sign
+            ))
+        
+        user_ops = [
+            UpdateOne({"user_id": admin_id}, {"$inc": {"storage_used": sign * size}})
+            for admin_id, size in storage.items() if size
+        ]
+        if user_ops:
+            await self.users.bulk_write(user_ops, ordered=False)
+            for admin_id, size in storage.items():
+                self._patch_cached_user(admin_id, inc_fields={"storage_used": sign * size})
+        
+        await self._write_stats(stats_ops)
+    
+    async def expire_links(self, now: datetime, limit: int) -> int:
+        """Deactivate up to limit active links past their expiry"""
+        return await self._switch_links(
+            {"expires_at": {"$lte": now}}, False, limit,
+            clear={"scheduled_activation": None}
+        )
+    
+    async def apply_scheduled_deactivations(self, now: datetime, limit: int) -> int:
+        """Deactivate up to limit active links whose scheduled_deactivation has passed"""
+        return await self._switch_links(
+            {"scheduled_deactivation": {"$lte": now}}, False, limit,
+            clear={"scheduled_deactivation": None}
+        )
+    
+    async def apply_scheduled_activations(self, now: datetime, limit: int) -> int:
+        """Activate up to limit unexpired links whose scheduled_activation has passed"""
+        return await self._switch_links(
+            {
+                "scheduled_activation": {"$lte": now},
+                "$or": [{"expires_at": None}, {"expires_at": {"$gt": now}}]
+            },
+            True, limit,
+            clear={"scheduled_activation": None}
+        )
+    
+    async def increment_link_downloads(self, link_id: str, admin_id: int = None) -> bool:
+        """Buffer a download; written by the next counter flush"""
+        self._counters.add(link_id, admin_id, "downloads", accessed_at=datetime.now(pytz.UTC))
+        if admin_id is not None:
+            self._patch_cached_user(admin_id, inc_fields={"total_downloads": 1})
+        return True
+    
+    async def increment_link_views(self, link_id: str, admin_id: int = None) -> bool:
+        """Buffer a view; written by the next counter flush"""
+        self._counters.add(link_id, admin_id, "views")
+        if admin_id is not None:
+            self._patch_cached_user(admin_id, inc_fields={"total_views": 1})
+        return True
+    
+    async def flush_counters(self):
+        """Write buffered counters as one bulk_write per collection"""
+        async with self._flush_lock:
+            if not self._counters:
+                return
+            
+            batch, self._counters = self._counters, CounterBuffer()
+            users = {}
+            
+            try:
+                # Resolve owners that callers did not pass in, in one query
+                if batch.unowned:
+                    cursor = self.links.find(
+                        {"link_id": {"$in": list(batch.unowned)}},
+                        {"link_id": 1, "admin_id": 1}
+                    )
+                    async for link in cursor:
+                        delta = batch.unowned.pop(link["link_id"])
+                        totals = batch.users.setdefault(link["admin_id"], {"total_views": 0, "total_downloads": 0})
+                        totals["total_views"] += delta["total_views"]
+                        totals["total_downloads"] += delta["total_downloads"]
+                    batch.unowned.clear()
+                
+                link_ops = []
+                for link_id, delta in batch.links.items():
+                    update = {"$inc": {"views": delta["views"], "downloads": delta["downloads"]}}
+                    if delta["last_accessed"]:
+                        update["$max"] = {"last_accessed": delta["last_accessed"]}
+                    link_ops.append(UpdateOne({"link_id": link_id}, update))
+                
+                users = dict(batch.users)
+                user_ops = [
+                    UpdateOne({"user_id": user_id}, {"$inc": totals})
+                    for user_id, totals in users.items()
+                ]
+                
+                if link_ops:
+                    await self._write_counters(self.links, link_ops, batch.links)
+                if user_ops:
+                    await self._write_counters(self.users, user_ops, batch.users)
+                    
+            except Exception as e:
+                print(f"⚠️  Counter flush failed, will retry: {e}")
+                self._counters.merge(batch)
+            
+            # Derived data for the owners written: a failure here is repaired by reconciliation
+            applied = {user_id: totals for user_id, totals in users.items() if user_id not in batch.users}
+            await self._write_stats(self._counter_stats_ops(applied))
+    
+    async def _write_counters(self, collection, ops: List[UpdateOne], entries: Dict):
+        """
+        bulk_write one op per entry (in entries order) and drop the entries that
+        were applied. With ordered=False the ops around a failed one still land,
+        so only the failed ones stay behind to be retried.
+        """
+        keys = list(entries)
+        try:
+            await collection.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            failed = {keys[error["index"]] for error in e.details.get("writeErrors", [])}
+            for key in keys:
+                if key not in failed:
+                    del entries[key]
+            raise
+        entries.clear()
+    
+    async def _counter_flush_loop(self):
+        """Periodically flush buffered counters"""
+        while True:
+            await asyncio.sleep(config.COUNTER_FLUSH_INTERVAL_SECONDS)
+            await self.flush_counters()
+    
+    # ==================== MATERIALIZED STATS ====================
+    
+    def _stats_ops(self, user_id: int, deltas: Dict, category: str = None, category_delta: int = 0) -> List[UpdateOne]:
+        """$inc ops for a user's stats document and the global one"""
+        inc = {field: value for field, value in deltas.items() if value}
+        if category_delta:
+            inc[f"categories.{encode_stats_category(category)}"] = category_delta
+        if not inc:
+            return []
+        
+        now = datetime.now(pytz.UTC)
+        return [
+            UpdateOne(
+                {"_id": user_stats_id(user_id)},
+                {"$inc": inc, "$set": {"scope": "user", "user_id": user_id, "updated_at": now}},
+                upsert=True
+            ),
+            UpdateOne(
+                {"_id": GLOBAL_STATS_ID},
+                {"$inc": inc, "$set": {"scope": "global", "updated_at": now}},
+                upsert=True
+            )
+        ]
+    
+    def _counter_stats_ops(self, user_totals: Dict) -> List[UpdateOne]:
+        """Stats ops for one counter flush: one per owner plus one global"""
+        now = datetime.now(pytz.UTC)
+        ops = []
+        global_inc = {"total_views": 0, "total_downloads": 0}
+        
+        for user_id, totals in user_totals.items():
+            ops.append(UpdateOne(
+                {"_id": user_stats_id(user_id)},
+                {"$inc": dict(totals), "$set": {"scope": "user", "user_id": user_id, "updated_at": now}},
+                upsert=True
+            ))
+            global_inc["total_views"] += totals["total_views"]
+            global_inc["total_downloads"] += totals["total_downloads"]
+        
+        if ops:
+            ops.append(UpdateOne(
+                {"_id": GLOBAL_STATS_ID},
+                {"$inc": global_inc, "$set": {"scope": "global", "updated_at": now}},
+                upsert=True
+            ))
+        return ops
+    
+    async def _write_stats(self, ops: List):
+        """Apply stats ops; drift from a failed write is fixed by reconciliation"""
+        if not ops:
+            return
+        try:
+            await self.stats.bulk_write(ops, ordered=False)
+        except Exception as e:
+            print(f"⚠️  Stats update failed: {e}")
+    
+    async def _bump_stats(self, user_id: int, deltas: Dict, category: str = None, category_delta: int = 0):
+        """Apply link-mutation deltas to the stats documents"""
+        await self._write_stats(self._stats_ops(user_id, deltas, category, category_delta))
+    
+    async def reconcile_stats(self):
+        """Rebuild every stats document from the links collection"""
+        started = datetime.now(pytz.UTC)
+        
+        # Pending counters would otherwise be lost by the rewrite below
+        await self.flush_counters()
+        
+        per_user = {}
+        global_doc = empty_stats_doc(GLOBAL_STATS_ID)
+        
+        cursor = self.links.aggregate(STATS_RECONCILE_PIPELINE, allowDiskUse=True)
+        async for row in cursor:
+            user_id = row["_id"].get("admin_id")
+            if user_id is None:
+                continue
+            doc = per_user.get(user_id)
+            if doc is None:
+                doc = per_user[user_id] = empty_stats_doc(user_stats_id(user_id), user_id)
+            
+            category = encode_stats_category(row["_id"].get("category"))
+            for target in (doc, global_doc):
+                for field in STATS_FIELDS:
+                    target[field] += row.get(field, 0)
+                target["categories"][category] = target["categories"].get(category, 0) + row["total_links"]
+        
+        ops = []
+        for doc in list(per_user.values()) + [global_doc]:
+            doc["updated_at"] = doc["reconciled_at"] = started
+            ops.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+        
+        for i in range(0, len(ops), 1000):
+            await self.stats.bulk_write(ops[i:i + 1000], ordered=False)
+        
+        # Owners with no active links left
+        await self.stats.delete_many({"scope": "user", "reconciled_at": {"$lt": started}})
+    
+    async def _stats_reconcile_loop(self):
+        """Rebuild stats on first run and then every STATS_RECONCILE_INTERVAL_SECONDS"""
+        try:
+            needs_build = await self.stats.find_one({"_id": GLOBAL_STATS_ID}, {"_id": 1}) is None
+        except Exception:
+            needs_build = True
+        
+        while True:
+            if needs_build:
+                try:
+                    await self.reconcile_stats()
+                except Exception as e:
+                    print(f"⚠️  Stats reconciliation failed: {e}")
+            needs_build = True
+            await asyncio.sleep(config.STATS_RECONCILE_INTERVAL_SECONDS)
+    
+    async def _search_backfill(self):
+        try:
+            filled = await self.backfill_search_tokens()
+            if filled:
+                print(f"🔍 Indexed {filled} existing links for search")
+        except Exception as e:
+            print(f"⚠️  Search index backfill failed: {e}")
+    
+    # ==================== SCHEDULED DELETIONS ====================
+    
+    async def schedule_deletion(self, chat_id: int, message_ids: List[int], delay_seconds: int) -> None:
+        """Persist messages to delete from a chat after delay_seconds"""
+        if not message_ids:
+            return
+        await self.deletions.insert_one({
+            "chat_id": chat_id,
+            "message_ids": list(message_ids),
+            "due_at": datetime.now(pytz.UTC) + timedelta(seconds=delay_seconds)
+        })
+    
+    async def get_due_deletions(self, limit: int) -> List[Dict]:
+        """Oldest deletions whose time has come"""
+        cursor = (
+            self.deletions.find({"due_at": {"$lte": datetime.now(pytz.UTC)}})
+            .sort("due_at", ASCENDING)
+            .limit(limit)
+        )
+        return await cursor.to_list(length=limit)
+    
+    async def remove_deletions(self, ids: List) -> None:
+        """Drop processed deletion entries"""
+        if ids:
+            await self.deletions.delete_many({"_id": {"$in": ids}})
+    
+    async def retry_deletion(self, entry_id, message_ids: List[int], attempt: int, delay_seconds: float) -> None:
+        """Narrow a deletion entry to the messages still to delete and push it back"""
+        await self.deletions.update_one(
+            {"_id": entry_id},
+            {"$set": {
+                "message_ids": list(message_ids),
+                "attempt": attempt,
+                "due_at": datetime.now(pytz.UTC) + timedelta(seconds=delay_seconds)
+            }}
+        )
+    
+    # ==================== REPLICATION JOBS ====================
+    
+    async def enqueue_replication_jobs(self, source: Dict, targets: List[int], copies: List[Dict] = None) -> None:
+        """
+        Persist one job per target channel; existing jobs for the same copy are
+        kept. copies are every stored copy of the file, to copy from at run time.
+        """
+        if not targets:
+            return
+        now = datetime.now(pytz.UTC)
+        source = {"channel_id": source["channel_id"], "message_id": source["message_id"]}
+        copies = [{"channel_id": c["channel_id"], "message_id": c["message_id"]} for c in copies or [source]]
+        await self.replication_jobs.bulk_write([
+            UpdateOne(
+                {"source.channel_id": source["channel_id"], "source.message_id": source["message_id"], "target": target},
+                {"$setOnInsert": {
+                    "source": source,
+                    "copies": copies,
+                    "target": target,
+                    "attempt": 0,
+                    "next_attempt_at": now,
+                    "created_at": now
+                }},
+                upsert=True
+            )
+            for target in targets
+        ], ordered=False)
+    
+    async def claim_replication_job(self, lease_seconds: float) -> Optional[Dict]:
+        """Take the oldest due job, hiding it from other workers for lease_seconds"""
+        now = datetime.now(pytz.UTC)
+        return await self.replication_jobs.find_one_and_update(
+            {"next_attempt_at": {"$lte": now}},
+            {"$set": {"next_attempt_at": now + timedelta(seconds=lease_seconds)}},
+            sort=[("next_attempt_at", ASCENDING)]
+        )
+    
+    async def save_replication_copy(self, job_id, replica: Dict) -> None:
+        """Keep a replica made for a job so a retry only records it"""
+        await self.replication_jobs.update_one({"_id": job_id}, {"$set": {"copied": replica}})
+    
+    async def complete_replication_job(self, job_id) -> None:
+        await self.replication_jobs.delete_one({"_id": job_id})
+    
+    async def retry_replication_job(self, job_id, attempt: int, delay_seconds: float, error: str) -> None:
+        await self.replication_jobs.update_one(
+            {"_id": job_id},
+            {"$set": {
+                "attempt": attempt,
+                "next_attempt_at": datetime.now(pytz.UTC) + timedelta(seconds=delay_seconds),
+                "last_error": error
+            }}
+        )
+    
+    async def find_under_replicated_files(self, channels: List[int], after, limit: int) -> Tuple[List[List[Dict]], Any]:
+        """
+        Stored copies ([{channel_id, message_id}, ...]) of files missing a channel
+        in the next window of links after the link _id `after`, and the _id to
+        continue from (None once the last window has been scanned)
+        """
+        cursor = self.links.aggregate(under_replicated_files_pipeline(channels, after, limit), allowDiskUse=True)
+        result = (await cursor.to_list(length=1))[0]
+        window = result["last"][0] if result["last"] else {"last": None, "count": 0}
+        last = window["last"] if window["count"] >= limit else None
+        return [row["_id"] for row in result["files"]], last
+    
+    # ==================== BROADCASTS ====================
+    
+    async def get_broadcast_recipients(self, after_user_id: int, limit: int) -> List[int]:
+        """Next page of reachable user IDs above after_user_id, in user_id order"""
+        cursor = (
+            self.users.find(
+                {"user_id": {"$gt": after_user_id}, "is_blocked": False, "bot_blocked": {"$ne": True}},
+                {"_id": 0, "user_id": 1}
+            )
+            .sort("user_id", ASCENDING)
+            .limit(limit)
+        )
+        return [user["user_id"] async for user in cursor]
+    
+    async def mark_users_bot_blocked(self, user_ids: List[int]) -> None:
+        """Skip users who blocked the bot in future broadcasts"""
+        if not user_ids:
+            return
+        await self.users.update_many(
+            {"user_id": {"$in": user_ids}},
+            {"$set": {"bot_blocked": True, "bot_blocked_at": datetime.now(pytz.UTC)}}
+        )
+        for user_id in user_ids:
+            self._invalidate_user(user_id)
+    
+    async def create_broadcast(self, broadcast: Dict, lease_seconds: float) -> Dict:
+        """Register a running broadcast leased to the calling process"""
+        now = datetime.now(pytz.UTC)
+        broadcast = {
+            **broadcast,
+            "_id": secrets.token_hex(4),
+            "status": BROADCAST_RUNNING,
+            "last_user_id": 0,
+            "sent": 0,
+            "failed": 0,
+            "blocked": 0,
+            "created_at": now,
+            "updated_at": now,
+            "lease_until": now + timedelta(seconds=lease_seconds),
+            "lease_owner": secrets.token_hex(8)
+        }
+        await self.broadcasts.insert_one(broadcast)
+        return broadcast
+    
+    async def claim_broadcast(self, lease_seconds: float) -> Optional[Dict]:
+        """Take over a running broadcast whose lease ran out (its process is gone)"""
+        now = datetime.now(pytz.UTC)
+        return await self.broadcasts.find_one_and_update(
+            {"status": BROADCAST_RUNNING, "lease_until": {"$lte": now}},
+            {"$set": {"lease_until": now + timedelta(seconds=lease_seconds), "lease_owner": secrets.token_hex(8)}},
+            sort=[("lease_until", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+    
+    async def renew_broadcast_lease(self, broadcast: Dict, lease_seconds: float) -> bool:
+        """Extend our lease on a broadcast; False once another process has claimed it"""
+        result = await self.broadcasts.update_one(
+            {"_id": broadcast["_id"], "status": BROADCAST_RUNNING, "lease_owner": broadcast["lease_owner"]},
+            {"$set": {"lease_until": datetime.now(pytz.UTC) + timedelta(seconds=lease_seconds)}}
+        )
+        return result.matched_count > 0
+    
+    async def checkpoint_broadcast(self, broadcast: Dict, last_user_id: int, counts: Dict, lease_seconds: float) -> bool:
+        """
+        Record a finished page: position and sent/failed/blocked counts, renewing
+        the lease. False (nothing recorded) once another process has claimed it.
+        """
+        now = datetime.now(pytz.UTC)
+        result = await self.broadcasts.update_one(
+            {"_id": broadcast["_id"], "lease_owner": broadcast["lease_owner"]},
+            {
+                "$set": {
+                    "last_user_id": last_user_id,
+                    "updated_at": now,
+                    "lease_until": now + timedelta(seconds=lease_seconds)
+                },
+                "$inc": counts
+            }
+        )
+        return result.matched_count > 0
+    
+    async def finish_broadcast(self, broadcast_id: str) -> Optional[Dict]:
+        now = datetime.now(pytz.UTC)
+        return await self.broadcasts.find_one_and_update(
+            {"_id": broadcast_id},
+            {"$set": {"status": BROADCAST_COMPLETED, "updated_at": now, "finished_at": now}},
+            return_document=ReturnDocument.AFTER
+        )
+    
+    async def release_broadcasts(self, broadcast_ids: List[str]) -> None:
+        """Expire the leases of broadcasts we stop so a restart resumes them at once"""
+        if broadcast_ids:
+            await self.broadcasts.update_many(
+                {"_id": {"$in": broadcast_ids}, "status": BROADCAST_RUNNING},
+                {"$set": {"lease_until": datetime.now(pytz.UTC)}}
+            )
+    
+    # ==================== FILE INDEX ====================
+    
+    async def find_stored_files(self, file_unique_ids: List[str]) -> Dict[str, Dict]:
+        """Index entries of files we already hold, by file_unique_id"""
+        ids = [uid for uid in set(file_unique_ids) if uid]
+        if not ids:
+            return {}
+        return {doc["_id"]: doc async for doc in self.file_index.find({"_id": {"$in": ids}})}
+    
+    async def index_stored_files(self, files: List[Dict]) -> None:
+        """Remember where files are stored; files carry file_unique_id and backup_messages"""
+        now = datetime.now(pytz.UTC)
+        ops = [
+            UpdateOne(
+                {"_id": f["file_unique_id"]},
+                {
+                    "$setOnInsert": {
+                        "file_id": f.get("file_id"),
+                        "file_size": f.get("file_size", 0),
+                        "file_type": f.get("file_type"),
+                        "created_at": now
+                    },
+                    "$addToSet": {"copies": {"$each": f["backup_messages"]}}
+                },
+                upsert=True
+            )
+            for f in files if f.get("file_unique_id") and f.get("backup_messages")
+        ]
+        if ops:
+            await self.file_index.bulk_write(ops, ordered=False)
+    
+    # ==================== IMPORT JOBS ====================
+    
+    async def create_import_job(self, job: Dict, lease_seconds: float) -> Dict:
+        """Register a running import job leased to the calling process"""
+        now = datetime.now(pytz.UTC)
+        job = {
+            **job,
+            "_id": secrets.token_hex(4),
+            "status": IMPORT_RUNNING,
+            "scanned": 0,
+            "found": 0,
+            "files": [],
+            "created_at": now,
+            "updated_at": now,
+            "lease_until": now + timedelta(seconds=lease_seconds)
+        }
+        await self.import_jobs.insert_one(job)
+        return job
+    
+    async def claim_import_job(self, lease_seconds: float, shard: tuple = None) -> Optional[Dict]:
+        """Take over a running job whose lease ran out (its process is gone)"""
+        now = datetime.now(pytz.UTC)
+        query = {"status": IMPORT_RUNNING, "lease_until": {"$lte": now}}
+        if shard:
+            query["user_id"] = {"$mod": [shard[1], shard[0]]}
+        return await self.import_jobs.find_one_and_update(
+            query,
+            {"$set": {"lease_until": now + timedelta(seconds=lease_seconds)}},
+            sort=[("lease_until", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+    
+    async def checkpoint_import_job(
+        self, job_id: str, current_id: int, scanned: int, files: List[Dict], lease_seconds: float,
+        skipped: List[List[int]] = None
+    ) -> None:
+        """
+        Record progress, the files found and the [first, last] message ID ranges
+        skipped since the last checkpoint, renewing the lease
+        """
+        now = datetime.now(pytz.UTC)
+        await self.import_jobs.update_one(
+            {"_id": job_id},
+            {
+                "$set": {
+                    "current_id": current_id,
+                    "scanned": scanned,
+                    "updated_at": now,
+                    "lease_until": now + timedelta(seconds=lease_seconds)
+                },
+                "$push": {"files": {"$each": files}, "skipped": {"$each": skipped or []}},
+                "$inc": {"found": len(files)}
+            }
+        )
+    
+    async def finish_import_job(self, job_id: str, status: str, error: str = None) -> None:
+        now = datetime.now(pytz.UTC)
+        await self.import_jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"status": status, "error": error, "updated_at": now, "finished_at": now}}
+        )
+    
+    async def release_import_jobs(self, job_ids: List[str]) -> None:
+        """Expire the leases of jobs we stop running so a restart resumes them at once"""
+        if job_ids:
+            await self.import_jobs.update_many(
+                {"_id": {"$in": job_ids}, "status": IMPORT_RUNNING},
+                {"$set": {"lease_until": datetime.now(pytz.UTC)}}
+            )
+    
+    async def get_import_job(self, job_id: str) -> Optional[Dict]:
+        return await self.import_jobs.find_one({"_id": job_id})
+    
+    async def get_import_jobs(self, user_id: int = None, status: str = None, limit: int = 10) -> List[Dict]:
+        """Newest jobs first, without their file lists"""
+        query = {}
+        if user_id is not None:
+            query["user_id"] = user_id
+        if status:
+            query["status"] = status
+        cursor = self.import_jobs.find(query, {"files": 0}).sort("created_at", DESCENDING).limit(limit)
+        return await cursor.to_list(length=limit)
+    
+    # ==================== CONVERSATION STATE ====================
+    
+    async def load_user_states(self, shard: tuple = None) -> Dict[int, Dict]:
+        """Saved user_data by user ID; shard=(index, count) loads only user_id % count == index"""
+        query = {"_id": {"$mod": [shard[1], shard[0]]}} if shard else {}
+        return {doc["_id"]: doc.get("data", {}) async for doc in self.user_state.find(query)}
+    
+    async def save_user_states(self, states: Dict[int, Optional[Dict]]) -> None:
+        """Write many users' state in one round trip; None drops a user's state"""
+        if not states:
+            return
+        now = datetime.now(pytz.UTC)
+        await self.user_state.bulk_write([
+            DeleteOne({"_id": user_id}) if data is None
+            else ReplaceOne({"_id": user_id}, {"data": data, "updated_at": now}, upsert=True)
+            for user_id, data in states.items()
+        ], ordered=False)
+    
+    # ==================== ANALYTICS ====================
+    
+    async def log_event(
+        self,
+        event_type: str,
+        user_id: int = None,
+        link_id: str = None,
+        metadata: Dict = None
+    ):
+        """Queue an analytics event; never waits on MongoDB"""
+        if not config.ENABLE_ANALYTICS:
+            return
+        
+        # Past the high-water mark only a sample of events is kept
+        queue = self._events
+        if queue.qsize() >= queue.maxsize * config.EVENT_HIGH_WATER_RATIO:
+            if random.random() >= config.EVENT_SAMPLE_RATE:
+                self.events_dropped += 1
+                return
+        
+        event = {
+            "event_type": event_type,
+            "user_id": user_id,
+            "link_id": link_id,
+            "metadata": metadata or {},
+            "timestamp": datetime.now(pytz.UTC)
+        }
+        
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.events_dropped += 1
+    
+    async def _write_events(self, batch: List[Dict]):
+        """Insert one batch of events"""
+        try:
+            await self.analytics.insert_many(batch, ordered=False)
+        except Exception as e:
+            self.events_dropped += len(batch)
+            print(f"⚠️  Failed to write {len(batch)} analytics events: {e}")
+    
+    def _take_events(self, limit: int) -> List[Dict]:
+        """Pop up to limit queued events without waiting"""
+        batch = []
+        while len(batch) < limit and not self._events.empty():
+            batch.append(self._events.get_nowait())
+        return batch
+    
+    async def flush_events(self):
+        """Write every queued event (used on shutdown)"""
+        if self._event_write:
+            await asyncio.gather(self._event_write, return_exceptions=True)
+        
+        while not self._events.empty():
+            await self._write_events(self._take_events(config.EVENT_BATCH_SIZE))
+    
+    async def _event_flush_loop(self):
+        """Drain the event queue in batches of EVENT_BATCH_SIZE or every EVENT_FLUSH_INTERVAL_SECONDS"""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            first = await self._events.get()
+            deadline = loop.time() + config.EVENT_FLUSH_INTERVAL_SECONDS
+            
+            batch = [first]
+            try:
+                while len(batch) < config.EVENT_BATCH_SIZE:
+                    batch.extend(self._take_events(config.EVENT_BATCH_SIZE - len(batch)))
+                    remaining = deadline - loop.time()
+                    if len(batch) >= config.EVENT_BATCH_SIZE or remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._events.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                self._event_write = asyncio.create_task(self._write_events(batch))
+                raise
+            
+            # Shielded so a shutdown mid-write does not lose the batch
+            self._event_write = asyncio.create_task(self._write_events(batch))
+            await asyncio.shield(self._event_write)
+    
+    # ==================== REFERRAL SYSTEM ====================
+    
+    def _new_referral_code(self) -> str:
+        """Generate a referral code; uniqueness is enforced by the index"""
+        return secrets.token_urlsafe(8)[:10].upper()
+    
+    async def get_user_by_referral_code(self, referral_code: str) -> Optional[Dict]:
+        """Find the owner of a referral code"""
+        return await self.users.find_one({"referral_code": referral_code})
+    
+    async def apply_referral(self, referred_id: int, referral_code: str) -> bool:
+        """Apply referral code to new user"""
+        if not config.ENABLE_REFERRALS:
+            return False
+        
+        # Find referrer
+        referrer = await self.get_user_by_referral_code(referral_code)
+        if not referrer:
+            return False
+        
+        # Don't allow self-referral
+        if referrer["user_id"] == referred_id:
+            return False
+        
+        # Update referred user
+        await self.users.update_one(
+            {"user_id": referred_id},
+            {"$set": {"referred_by": referrer["user_id"]}}
+        )
+        self._patch_cached_user(referred_id, set_fields={"referred_by": referrer["user_id"]})
+        
+        # Log referral
+        await self.referrals.insert_one({
+            "referrer_id": referrer["user_id"],
+            "referred_id": referred_id,
+            "status": "completed", # Auto-complete on join
+            "reward_given": False,
+            "created_at": datetime.now(pytz.UTC)
+        })
+        
+        return True
+    
+    async def get_referral_stats(self, user_id: int) -> Dict:
+        """Get referral statistics"""
+        total = await self.referrals.count_documents({"referrer_id": user_id})
+        completed = await self.referrals.count_documents({"referrer_id": user_id, "status": "completed"})
+        
+        return {
+            "total_referrals": total,
+            "completed_referrals": completed,
+            "pending_referrals": total - completed
+        }
+
+    async def check_referral_milestones(self, referrer_id: int) -> tuple[bool, str, int]:
+        """Check and grant referral milestones (10, 30, 100)"""
+        referrer = await self.get_user(referrer_id)
+        if not referrer: return False, "", 0
+        
+        total_refs = await self.referrals.count_documents({"referrer_id": referrer_id, "status": "completed"})
+        claimed = referrer.get("referral_milestones", [])
+        if not isinstance(claimed, list): claimed = []
+        
+        milestones = [
+            (10, config.PlanTypes.MONTHLY, "Monthly Starter", 30),
+            (30, config.PlanTypes.BIMONTHLY, "Bi-Monthly Pro", 60),
+            (100, config.PlanTypes.YEARLY, "Yearly Premium", 365) 
+        ]
+        
+        for count, plan_type, display_name, days in milestones:
+            if total_refs >= count and count not in claimed:
+                await self.set_user_plan(referrer_id, plan_type)
+                
+                await self.users.update_one(
+                    {"user_id": referrer_id},
+                    {"$push": {"referral_milestones": count}}
+                )
+                self._invalidate_user(referrer_id)
+                
+                return True, display_name, days
+                
+        return False, "", 0
+    
+    # ==================== ADMIN STATS ====================
+    
+    async def get_global_stats(self) -> Dict:
+        """Get global bot statistics (cached for STATS_CACHE_TTL_SECONDS)"""
+        cached = self._stats_cache.get("global")
+        if cached is not None:
+            return dict(cached)
+        
+        global_doc, user_rows = await asyncio.gather(
+            self.stats.find_one({"_id": GLOBAL_STATS_ID}),
+            self.users.aggregate(GLOBAL_USER_STATS_PIPELINE).to_list(length=1)
+        )
+        stats = build_global_stats([global_doc] if global_doc else [], user_rows)
+        
+        self._stats_cache.set("global", stats)
+        return dict(stats)
+    
+    async def get_user_stats(self, user_id: int) -> dict:
+        """Get comprehensive user statistics from the stats collection"""
+        try:
+            doc = await self.stats.find_one({"_id": user_stats_id(user_id)}) or {}
+        except Exception:
+            doc = {}
+        
+        return {
+            "total_links": doc.get("total_links", 0),
+            "total_files": doc.get("total_files", 0),
+            "storage_used": doc.get("total_storage", 0),
+            "total_views": doc.get("total_views", 0),
+            "total_downloads": doc.get("total_downloads", 0),
+            "category_breakdown": {
+                decode_stats_category(key): count
+                for key, count in doc.get("categories", {}).items()
+                if count > 0
+            }
+        }
+
+    async def get_user_analytics(self, user_id: int) -> dict:
+        """Alias for get_user_stats"""
+        return await self.get_user_stats(user_id)
+
+    def close(self):
+        """Close database connection"""
+        if self.client:
+            self.client.close()
+
+# Initialize database singletons
 db = Database()
+adb = AsyncDatabase()
@@ -0,0 +1,156 @@
+"""
+Share-box by Univora - Fake Telegram Bot API
+Local stand-in for api.telegram.org to exercise webhook mode without Telegram
+
+Usage:
+    # 1. Fake Bot API server
+    python fake_telegram.py serve --port 8081
+
+    # 2. Bot in webhook mode, pointed at it
+    BOT_MODE=webhook WEBHOOK_URL=http://localhost:10000 WEBHOOK_SECRET=local \\
+    TELEGRAM_API_URL=http://localhost:8081/bot \\
+    TELEGRAM_FILE_URL=http://localhost:8081/file/bot python bot.py
+
+    # 3. Post synthetic updates at the bot's webhook
+    python fake_telegram.py post --webhook http://localhost:10000/webhook/local \\
+        --secret local --users 50 --updates 1000
+
+Call counts per Bot API method are served at http://localhost:8081/stats
+"""
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import argparse
+import itertools
+import json
+import random
+import time
+from flask import Flask, jsonify, request
+import requests
+
+app = Flask(__name__)
+
+_calls = Counter()
+_lock = Lock()
+_message_ids = itertools.count(1000)
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Share Box", "username": "fake_sharebox_bot"}
+
+# ==================== FAKE BOT API ====================
+
+def _params() -> dict:
+    """Bot API parameters, whether sent as JSON or form fields"""
+    params = dict(request.get_json(silent=True) or {})
+    for key, value in request.values.items():
+        try:
+            params[key] = json.loads(value)
+        except (TypeError, ValueError):
+            params[key] = value
+    return params
+
+def _message(chat_id, text: str = None) -> dict:
+    message = {
+        "message_id": next(_message_ids),
+        "date": int(time.time()),
+        "chat": {"id": int(chat_id or 0), "type": "private"},
+        "from": BOT_USER
+    }
+    if text is not None:
+        message["text"] = text
+    return message
+
+@app.route('/bot<token>/<method>', methods=['GET', 'POST'])
+def bot_api(token, method):
+    """Answer any Bot API method with a plausible result"""
+    params = _params()
+    with _lock:
+        _calls[method] += 1
+
+    name = method.lower()
+    chat_id = params.get("chat_id")
+
+    if name == "getme":
+        result = BOT_USER
+    elif name in ("sendmessage", "editmessagetext"):
+        result = _message(chat_id, params.get("text"))
+    elif name.startswith("send") and name != "sendmediagroup" or name == "editmessagecaption":
+        result = _message(chat_id)
+    elif name == "sendmediagroup":
+        result = [_message(chat_id) for _ in params.get("media") or []]
+    elif name == "copymessage":
+        result = {"message_id": next(_message_ids)}
+    elif name in ("copymessages", "forwardmessages"):
+        result = [{"message_id": next(_message_ids)} for _ in params.get("message_ids") or []]
+    elif name == "forwardmessage":
+        result = _message(chat_id)
+    elif name == "getchat":
+        result = {"id": int(chat_id or 0), "type": "private"}
+    else:
+        result = True
+
+    return jsonify({"ok": True, "result": result})
+
+@app.route('/stats')
+def stats():
+    """Bot API calls received so far"""
+    with _lock:
+        return jsonify({"total": sum(_calls.values()), "methods": dict(_calls)})
+
+# ==================== UPDATE POSTER ====================
+
+def _update(update_id: int, user_id: int) -> dict:
+    """A private-chat /start from user_id"""
+    user = {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}]
+        }
+    }
+
+def post_updates(webhook: str, secret: str, users: int, updates: int, concurrency: int):
+    """Post synthetic updates and report ingress throughput"""
+    session = requests.Session()
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    user_ids = [100000 + i for i in range(users)]
+
+    def post(update_id):
+        response = session.post(webhook, json=_update(update_id, random.choice(user_ids)), headers=headers, timeout=10)
+        return response.status_code
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        statuses = Counter(pool.map(post, range(1, updates + 1)))
+    elapsed = time.monotonic() - started
+
+    print(f"Posted {updates} updates from {users} users in {elapsed:.2f}s ({updates / elapsed:.0f}/s)")
+    print(f"Responses: {dict(statuses)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API for local webhook testing")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Run the fake Bot API server")
+    serve.add_argument("--port", type=int, default=8081)
+
+    post = commands.add_parser("post", help="Post synthetic updates to a webhook")
+    post.add_argument("--webhook", required=True)
+    post.add_argument("--secret", default="")
+    post.add_argument("--users", type=int, default=20)
+    post.add_argument("--updates", type=int, default=200)
+    post.add_argument("--concurrency", type=int, default=10)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        app.run(host="0.0.0.0", port=args.port, threaded=True)
+    else:
+        post_updates(args.webhook, args.secret, args.users, args.updates, args.concurrency)
+
+if __name__ == '__main__':
+    main()
@@ -5,21 +5,24 @@ Advanced admin commands for file & link management
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
+from telegram.error import BadRequest
 from datetime import datetime
+import asyncio
 import config
-from database import db
+from database import adb, primary_copy
 from utils.helpers import (
     admin_only, user_check, format_file_size, format_datetime,
-    get_file_info, generate_bot_link, calculate_total_size,
-    get_file_emoji, create_pagination_data, truncate_text,
+    get_file_info, generate_bot_link,
+    get_file_emoji, category_key, link_page_callback, truncate_text,
     format_expiry_date, check_upload_limit, check_link_creation_limit,
     sanitize_filename, premium_only
 )
 from utils.qr_generator import generate_qr_code, generate_fancy_qr_code
-
-# Store pending files temporarily
-pending_files = {}
-pending_add_files = {}
+from utils.channel_health import channel_health
+from utils.replication import replication_queue
+from utils.broadcast import broadcaster
+from utils.sessions import upload_sessions, UPLOAD, ADD
+from handlers.premium import show_search_page
 
 # ==================== UPLOAD COMMAND ====================
 
@@ -30,7 +33,7 @@ async def upload_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # Check if user can create new link
-    limit_check = check_link_creation_limit(user_id)
+    limit_check = await check_link_creation_limit(user_id)
     if not limit_check["allowed"]:
         await update.message.reply_text(
             f"🚫 **Upload Not Allowed!**\n\n"
@@ -40,12 +43,12 @@ async def upload_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Initialize pending files
-    pending_files[user_id] = []
+    await upload_sessions.start(UPLOAD, user_id)
     
     # Dynamic Upload Start Message
-    plan = db.get_plan_details(user_id)
+    plan = await adb.get_plan_details(user_id)
     plan_name = plan.get("name", "Free Tier").upper()
-    is_premium = db.is_user_premium(user_id)
+    is_premium = await adb.is_user_premium(user_id)
     
     max_size = format_file_size(plan.get("max_file_size_bytes", 2*1024*1024*1024))
     max_files = plan.get("max_files_per_link", 20)
@@ -78,7 +81,7 @@ async def upload_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     await update.effective_message.reply_text(msg, parse_mode="Markdown")
     
-    db.log_event("upload_started", user_id=user_id)
+    await adb.log_event("upload_started", user_id=user_id)
 
 # ==================== FILE UPLOAD HANDLER ====================
 
@@ -90,8 +93,10 @@ async def handle_file_upload(update: Update, context: ContextTypes.DEFAULT_TYPE)
     message = update.message
     
     # Check if user is in upload or add mode
-    is_upload_mode = user_id in pending_files
-    is_add_mode = user_id in pending_add_files
+    upload_session = await upload_sessions.get(UPLOAD, user_id)
+    add_session = await upload_sessions.get(ADD, user_id) if not upload_session else None
+    is_upload_mode = upload_session is not None
+    is_add_mode = add_session is not None
     
     if not is_upload_mode and not is_add_mode:
         # Not in any upload mode
@@ -121,12 +126,10 @@ async def handle_file_upload(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     # Check file size limit
     # Check file size limit
-    is_premium = db.is_user_premium(user_id)
-    current_count = len(pending_files.get(user_id, [])) + 1
-    if is_add_mode:
-        current_count += len(pending_add_files.get(user_id, {}).get("files", []))
+    is_premium = await adb.is_user_premium(user_id)
+    current_count = (upload_session or add_session)["file_count"] + 1
         
-    limit_check = check_upload_limit(user_id, current_count, file_info["file_size"])
+    limit_check = await check_upload_limit(user_id, current_count, file_info["file_size"])
     
     if not limit_check["allowed"]:
         await message.reply_text(
@@ -138,33 +141,39 @@ async def handle_file_upload(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     # Upload to channel (TRIPLE REDUNDANCY for data persistence!)
     try:
-        # Send to all 3 storage channels
-        channel_messages = []
-        
-        for channel_id in config.STORAGE_CHANNELS:
-            if channel_id == 0:
-                continue
-            
-            try:
-                # Forward to channel
-                forwarded = await message.copy(chat_id=channel_id)
-                channel_messages.append({
-                    "channel_id": channel_id,
-                    "message_id": forwarded.message_id
-                })
-            except Exception as e:
-                print(f"Warning: Failed to upload to channel {channel_id}: {e}")
+        storage_channels = [c for c in config.STORAGE_CHANNELS if c != 0]
         
-        if not channel_messages:
-            raise Exception("Failed to upload to any storage channel")
+        # A file we already hold is reused instead of being copied again
+        stored = (await adb.find_stored_files([file_info["file_unique_id"]])).get(file_info["file_unique_id"])
         
-        # Use primary channel message ID
-        primary_message_id = channel_messages[0]["message_id"]
+        if stored:
+            # Primary copy first, like a fresh upload
+            channel_messages = sorted(stored["copies"], key=lambda c: c["channel_id"] != config.PRIMARY_CHANNEL)
+        else:
+            # Only the first successful copy is awaited; the other channels
+            # are filled in by the replication queue
+            channel_messages = []
+            
+            for channel_id in storage_channels:
+                try:
+                    # Copy to channel without the uploader's caption: stored
+                    # copies are reused for every later upload of the same file
+                    forwarded = await message.copy(chat_id=channel_id, caption="")
+                    channel_messages.append({
+                        "channel_id": channel_id,
+                        "message_id": forwarded.message_id
+                    })
+                    break
+                except Exception as e:
+                    print(f"Warning: Failed to upload to channel {channel_id}: {e}")
+            
+            if not channel_messages:
+                raise Exception("Failed to upload to any storage channel")
         
         # Store file data  
         file_data = {
-            "message_id": primary_message_id,
             "file_id": file_info["file_id"],
+            "file_unique_id": file_info["file_unique_id"],
             "file_name": file_info["file_name"],
             "file_size": file_info["file_size"],
             "file_type": file_info["file_type"],
@@ -172,35 +181,50 @@ async def handle_file_upload(update: Update, context: ContextTypes.DEFAULT_TYPE)
             "backup_messages": channel_messages  # Store all backups
         }
         
+        # message_id is only ever a PRIMARY_CHANNEL message
+        primary = primary_copy(channel_messages)
+        if primary:
+            file_data["message_id"] = primary["message_id"]
+        
         # Add to pending files
-        if is_upload_mode:
-            pending_files[user_id].append(file_data)
-            current_files = pending_files[user_id]
-        else:  # add mode
-            pending_add_files[user_id]["files"].append(file_data)
-            current_files = pending_add_files[user_id]["files"]
+        session = await upload_sessions.append_file(UPLOAD if is_upload_mode else ADD, user_id, file_data)
+        if session is None:
+            raise Exception("Upload session expired, start again with /upload")
+        
+        if not stored:
+            try:
+                await adb.index_stored_files([file_data])
+            except Exception as e:
+                print(f"⚠️  Could not index stored file: {e}")
+        
+        # Mirror to the remaining channels in the background
+        present = {c["channel_id"] for c in channel_messages}
+        await replication_queue.enqueue(
+            channel_messages,
+            [c for c in storage_channels if c not in present]
+        )
         
         # Check file count limit
-        plan = db.get_plan_details(user_id)
+        plan = await adb.get_plan_details(user_id)
         max_files = plan.get("max_files_per_link", 20)
         
         # Success message with progress
         emoji = get_file_emoji(file_info["file_type"])
-        total_size = calculate_total_size(current_files)
+        total_size = session["total_size"]
         
         status_message = f"""
 ✅ **File Added!**
 `{truncate_text(file_info['file_name'], 45)}`
 📦 **Size:** {format_file_size(file_info['file_size'])}
 
-📊 **Session:** {len(current_files)} Files • {format_file_size(total_size)} Total
+📊 **Session:** {session['file_count']} Files • {format_file_size(total_size)} Total
 
 📤 _Send next file or use /done_
 """
         
         await message.reply_text(status_message, parse_mode="Markdown")
         
-        db.log_event("file_uploaded", user_id=user_id, metadata={"file_type": file_info["file_type"], "file_size": file_info["file_size"]})
+        await adb.log_event("file_uploaded", user_id=user_id, metadata={"file_type": file_info["file_type"], "file_size": file_info["file_size"]})
         
     except Exception as e:
         print(f"Upload error: {e}")
@@ -220,9 +244,9 @@ async def done_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # Check upload mode
-    if user_id in pending_files:
+    if await upload_sessions.exists(UPLOAD, user_id):
         await finish_upload(update, context)
-    elif user_id in pending_add_files:
+    elif await upload_sessions.exists(ADD, user_id):
         await finish_add_files(update, context)
     else:
         await update.message.reply_text(
@@ -234,9 +258,9 @@ async def done_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def finish_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Finish upload mode and ask for name"""
     user_id = update.effective_user.id
-    files = pending_files.get(user_id, [])
+    session = await upload_sessions.get(UPLOAD, user_id)
     
-    if not files:
+    if not session or not session["file_count"]:
         await update.message.reply_text(
             "❌ **No Files Uploaded!**\n\n"
             "Upload files before using /done.",
@@ -258,7 +282,7 @@ async def finish_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def ask_link_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Ask for category generation"""
     user_id = update.effective_user.id
-    files = pending_files.get(user_id, [])
+    session = await upload_sessions.get(UPLOAD, user_id) or {"file_count": 0, "total_size": 0}
     
     # Keyboard for categories
     keyboard = []
@@ -274,11 +298,11 @@ async def ask_link_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard.append([InlineKeyboardButton("⏭️ Skip Category", callback_data="gen_cat_skip")])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
-    total_size = calculate_total_size(files)
+    total_size = session["total_size"]
     
     await update.message.reply_text(
         f"📁 **Select Category**\n\n"
-        f"You've uploaded **{len(files)} files** ({format_file_size(total_size)})\n\n"
+        f"You've uploaded **{session['file_count']} files** ({format_file_size(total_size)})\n\n"
         f"🗂️ **Choose a category for your link:**",
         reply_markup=reply_markup,
         parse_mode="Markdown"
@@ -291,7 +315,7 @@ async def finish_add_files(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Finish adding files to existing link"""
     
     user_id = update.effective_user.id
-    add_data = pending_add_files.get(user_id)
+    add_data = await upload_sessions.get(ADD, user_id)
     
     if not add_data:
         return
@@ -308,10 +332,10 @@ async def finish_add_files(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Add files to link
-    success = db.add_files_to_link(link_id, files)
+    success = await adb.add_files_to_link(link_id, files)
     
     if success:
-        link = db.get_link(link_id)
+        link = await adb.get_link(link_id)
         total_files = len(link['files'])
         total_size = link.get('total_size', 0)
         bot_link = generate_bot_link(link_id)
@@ -327,7 +351,7 @@ async def finish_add_files(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode="Markdown"
         )
         
-        db.log_event("files_added", user_id=user_id, link_id=link_id, metadata={"files_added": len(files)})
+        await adb.log_event("files_added", user_id=user_id, link_id=link_id, metadata={"files_added": len(files)})
     else:
         await update.message.reply_text(
             "❌ **Failed to Add Files!**\n\n"
@@ -336,7 +360,7 @@ async def finish_add_files(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
     
     # Clean up
-    del pending_add_files[user_id]
+    await upload_sessions.delete(ADD, user_id)
 
 # ==================== CANCEL COMMAND ====================
 
@@ -348,12 +372,10 @@ async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     was_active = False
     
-    if user_id in pending_files:
-        del pending_files[user_id]
+    if await upload_sessions.delete(UPLOAD, user_id):
         was_active = True
     
-    if user_id in pending_add_files:
-        del pending_add_files[user_id]
+    if await upload_sessions.delete(ADD, user_id):
         was_active = True
     
     if 'pending_generation' in context.user_data:
@@ -388,8 +410,6 @@ async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def mylinks_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show user's links with pagination"""
     
-    user_id = update.effective_user.id
-    
     # Parse arguments
     category = None
     page = 1
@@ -401,10 +421,31 @@ async def mylinks_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             elif arg.isdigit():
                 page = int(arg)
     
-    # Get links
-    all_links = db.get_user_links(user_id, category=category, skip=0, limit=1000)
+    await show_links_page(update, context, category=category, page=page)
+
+async def show_links_page(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    category: str = None,
+    page: int = 1,
+    after: tuple = None,
+    before: tuple = None
+):
+    """Render one page of the user's links, reached by page number or keyset cursor"""
     
-    if not all_links:
+    user_id = update.effective_user.id
+    items_per_page = 5
+    
+    # A category name may not fit in callback data (64 bytes): Prev/Next carry
+    # its key and look the name up here
+    page_key = None
+    if category:
+        page_key = category_key(category)
+        context.user_data.setdefault('links_categories', {})[page_key] = category
+    
+    total_items = await adb.count_user_links(user_id, category)
+    
+    if not total_items:
         message = "📭 **No Links Found!**\n\n"
         
         if category:
@@ -414,38 +455,39 @@ async def mylinks_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         message += "💡 Use /upload to create your first link!"
         
-        await update.message.reply_text(message, parse_mode="Markdown")
+        await update.effective_message.reply_text(message, parse_mode="Markdown")
         return
     
-    # Paginate
-    items_per_page = 5
-    pagination = create_pagination_data(all_links, page, items_per_page)
+    # Paginate: neighbouring pages by cursor, a typed page number by offset
+    total_pages = (total_items + items_per_page - 1) // items_per_page
+    page = max(1, min(page, total_pages))
     
-    # Build message
-    header = f"🔗 **Your Links**"
-    if category:
-        header += f" - {category}"
+    if after or before:
+        links = await adb.list_user_links(user_id, category, items_per_page, after=after, before=before)
+    else:
+        links = await adb.list_user_links(user_id, category, items_per_page, skip=(page - 1) * items_per_page)
     
-    header += f"\n\n📊 **Total:** {pagination['total_items']} links\n"
-    header += f"📄 **Page:** {pagination['page']}/{pagination['total_pages']}\n"
-    header += f"━━━━━━━━━━━━━━━━━━━━━\n\n"
+    # Links deleted since the count was cached: start over
+    if not links and page > 1:
+        page = 1
+        links = await adb.list_user_links(user_id, category, items_per_page)
     
     # Build message with inline buttons for each link
     header = f"🔗 **Your Links**"
     if category:
         header += f" - {category}"
     
-    header += f"\n\n📊 **Total:** {pagination['total_items']} links\n"
-    header += f"📄 **Page:** {pagination['page']}/{pagination['total_pages']}\n"
+    header += f"\n\n📊 **Total:** {total_items} links\n"
+    header += f"📄 **Page:** {page}/{total_pages}\n"
     header += f"━━━━━━━━━━━━━━━━━━━━━\n\n"
     
     message_text = header
     keyboard = []
     
-    for idx, link in enumerate(pagination['items'], start=pagination['start_idx'] + 1):
+    for idx, link in enumerate(links, start=(page - 1) * items_per_page + 1):
         emoji = "💎" if link.get('is_premium_link') else "🔗"
         link_name = truncate_text(link.get('link_name', 'Untitled'), 30)
-        file_count = len(link.get('files', []))
+        file_count = link.get('file_count', 0)
         total_size = format_file_size(link.get('total_size', 0))
         views = link.get('views', 0)
         
@@ -465,11 +507,17 @@ async def mylinks_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Navigation buttons
     nav_row = []
-    if pagination['has_prev']:
-        nav_row.append(InlineKeyboardButton("⬅️ Previous", callback_data=f"links_page_{page-1}_{category or 'all'}"))
-    
-    if pagination['has_next']:
-        nav_row.append(InlineKeyboardButton("Next ➡️", callback_data=f"links_page_{page+1}_{category or 'all'}"))
+    if page > 1 and links:
+        nav_row.append(InlineKeyboardButton(
+            "⬅️ Previous",
+            callback_data=link_page_callback("links_page_", page - 1, "p", links[0], page_key)
+        ))
+    
+    if page < total_pages and links:
+        nav_row.append(InlineKeyboardButton(
+            "Next ➡️",
+            callback_data=link_page_callback("links_page_", page + 1, "n", links[-1], page_key)
+        ))
     
     if nav_row:
         keyboard.append(nav_row)
@@ -531,7 +579,7 @@ async def delete_link_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     
     link_id = context.args[0]
-    link = db.get_link(link_id)
+    link = await adb.get_link(link_id)
     
     if not link:
         await update.message.reply_text(
@@ -551,7 +599,7 @@ async def delete_link_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     
     # Delete link
-    success = db.delete_link(link_id)
+    success = await adb.delete_link(link_id)
     
     if success:
         await update.message.reply_text(
@@ -563,7 +611,7 @@ async def delete_link_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             parse_mode="Markdown"
         )
         
-        db.log_event("link_deleted", user_id=user_id, link_id=link_id)
+        await adb.log_event("link_deleted", user_id=user_id, link_id=link_id)
     else:
         await update.message.reply_text(
             "❌ **Delete Failed!**\n\n"
@@ -587,7 +635,7 @@ async def linkinfo_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     link_id = context.args[0]
-    link = db.get_link(link_id)
+    link = await adb.get_link(link_id)
     
     if not link:
         await update.message.reply_text(
@@ -686,7 +734,7 @@ async def add_files_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     link_id = context.args[0]
-    link = db.get_link(link_id)
+    link = await adb.get_link(link_id)
     
     if not link:
         await update.message.reply_text(
@@ -705,10 +753,7 @@ async def add_files_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Initialize add mode
-    pending_add_files[user_id] = {
-        "link_id": link_id,
-        "files": []
-    }
+    await upload_sessions.start(ADD, user_id, link_id=link_id)
     
     await update.message.reply_text(
         f"➕ **Add Files Mode**\n\n"
@@ -739,7 +784,7 @@ async def qrcode_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # Check premium or admin
-    if user_id not in config.ADMIN_IDS and not db.is_user_premium(user_id):
+    if user_id not in config.ADMIN_IDS and not await adb.is_user_premium(user_id):
         await update.message.reply_text(
             "💎 **Premium Feature!**\n\n"
             "QR code generation is only available for premium users.\n\n"
@@ -771,7 +816,7 @@ async def qrcode_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def send_qr_code(update: Update, context: ContextTypes.DEFAULT_TYPE, link_id: str, fancy: bool = False):
     """Generate and send QR code with caching"""
-    link = db.get_link(link_id)
+    link = await adb.get_link(link_id)
     if not link:
         if update.callback_query:
             await update.callback_query.answer("❌ Link Not Found!")
@@ -812,10 +857,11 @@ async def send_qr_code(update: Update, context: ContextTypes.DEFAULT_TYPE, link_
 
         # Generate
         bot_link = generate_bot_link(link_id)
+        # PIL rendering is CPU-bound, keep it off the event loop
         if fancy:
-            qr_image = generate_fancy_qr_code(bot_link, link_id)
+            qr_image = await asyncio.to_thread(generate_fancy_qr_code, bot_link, link_id)
         else:
-            qr_image = generate_qr_code(bot_link, link_id)
+            qr_image = await asyncio.to_thread(generate_qr_code, bot_link, link_id)
             
         msg = await context.bot.send_photo(
             chat_id=target_chat_id,
@@ -827,7 +873,7 @@ async def send_qr_code(update: Update, context: ContextTypes.DEFAULT_TYPE, link_
         # Cache ID
         if msg.photo:
             file_id = msg.photo[-1].file_id
-            db.links.update_one({"link_id": link_id}, {"$set": {cache_key: file_id}})
+            await adb.update_link(link_id, {cache_key: file_id})
         
         if status_msg:
             await status_msg.delete()
@@ -872,7 +918,7 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    success = db.block_user(target_id)
+    success = await adb.block_user(target_id)
     
     if success:
         await update.message.reply_text(
@@ -909,7 +955,7 @@ async def unban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    success = db.unblock_user(target_id)
+    success = await adb.unblock_user(target_id)
     
     if success:
         await update.message.reply_text(
@@ -928,7 +974,7 @@ async def unban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def admin_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show admin statistics"""
     
-    stats = db.get_global_stats()
+    stats = await adb.get_global_stats()
     
     # Calculate uptime (you can implement this properly)
     uptime = "24/7"
@@ -962,12 +1008,50 @@ async def admin_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
+    # Refresh button edits the existing panel in place
+    if update.callback_query:
+        try:
+            await update.callback_query.edit_message_text(
+                message,
+                reply_markup=reply_markup,
+                parse_mode="Markdown"
+            )
+        except BadRequest:
+            pass  # Stats unchanged since last render
+        return
+    
     await update.message.reply_text(
         message,
         reply_markup=reply_markup,
         parse_mode="Markdown"
     )
 
+@admin_only
+async def channel_health_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show storage channel health"""
+    
+    snapshot = channel_health.snapshot()
+    state_icons = {"closed": "🟢", "half_open": "🟡", "open": "🔴"}
+    
+    lines = ["🩺 **Storage Channel Health**\n"]
+    for channel_id in [c for c in config.STORAGE_CHANNELS if c != 0]:
+        stats = snapshot.get(channel_id)
+        role = "Primary" if channel_id == config.PRIMARY_CHANNEL else "Backup"
+        
+        if not stats:
+            lines.append(f"⚪ `{channel_id}` ({role})\n   No traffic yet\n")
+            continue
+        
+        latency = f"{stats['latency'] * 1000:.0f} ms" if stats['latency'] is not None else "n/a"
+        lines.append(
+            f"{state_icons.get(stats['state'], '⚪')} `{channel_id}` ({role})\n"
+            f"   ✅ Success: {stats['success_rate'] * 100:.1f}%\n"
+            f"   ⏱️ Latency: {latency}\n"
+            f"   📨 Requests: {stats['total']} ({stats['failures']} failed)\n"
+        )
+    
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+
 @admin_only
 async def grant_premium_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Grant premium (Deprecated)"""
@@ -995,34 +1079,19 @@ async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     message = " ".join(context.args)
-    users = db.get_all_users(include_blocked=False)
-    
-    sent = 0
-    failed = 0
     
     status_msg = await update.message.reply_text(
-        f"📢 **Broadcasting...**\n\n"
-        f"👥 Total users: {len(users)}",
+        "📢 **Broadcasting...**\n\n"
+        "⏳ Progress updates will appear here.",
         parse_mode="Markdown"
     )
     
-    for user in users:
-        try:
-            await context.bot.send_message(
-                chat_id=user['user_id'],
-                text=f"📢 **Broadcast from {config.BOT_NAME}**\n\n{message}",
-                parse_mode="Markdown"
-            )
-            sent += 1
-        except:
-            failed += 1
-    
-    await status_msg.edit_text(
-        f"✅ **Broadcast Complete!**\n\n"
-        f"📤 **Sent:** {sent}\n"
-        f"❌ **Failed:** {failed}\n"
-        f"👥 **Total:** {len(users)}",
-        parse_mode="Markdown"
+    # Runs in the background and resumes after a restart
+    await broadcaster.submit(
+        admin_id=update.effective_user.id,
+        chat_id=status_msg.chat_id,
+        status_message_id=status_msg.message_id,
+        text=message
     )
 
 
@@ -1046,7 +1115,7 @@ async def setpassword_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     link_id = context.args[0]
     password = context.args[1]
     
-    link = db.get_link(link_id)
+    link = await adb.get_link(link_id)
     if not link:
         await update.message.reply_text("❌ **Link Not Found!**", parse_mode="Markdown")
         return
@@ -1059,10 +1128,10 @@ async def setpassword_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     # Set password
     if password.lower() == "off":
-        db.update_link(link_id, {"password": None})
+        await adb.update_link(link_id, {"password": None})
         msg = "🔓 **Password Removed!**\nLink is now public."
     else:
-        db.update_link(link_id, {"password": password})
+        await adb.update_link(link_id, {"password": password})
         msg = f"🔒 **Password Set!**\n\n🔑 Password: `{password}`"
         
     await update.message.reply_text(
@@ -1087,7 +1156,7 @@ async def setname_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     link_id = context.args[0]
     new_name = " ".join(context.args[1:])
     
-    link = db.get_link(link_id)
+    link = await adb.get_link(link_id)
     if not link:
         await update.message.reply_text("❌ **Link Not Found!**", parse_mode="Markdown")
         return
@@ -1098,7 +1167,7 @@ async def setname_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("🚫 **Access Denied!**", parse_mode="Markdown")
         return
         
-    db.update_link(link_id, {"link_name": new_name})
+    await adb.update_link(link_id, {"link_name": new_name})
     
     await update.message.reply_text(
         f"✅ **Name Updated!**\n\n"
@@ -1124,7 +1193,7 @@ async def protect_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     link_id = context.args[0]
     
-    link = db.get_link(link_id)
+    link = await adb.get_link(link_id)
     if not link:
         await update.message.reply_text("❌ **Link Not Found!**", parse_mode="Markdown")
         return
@@ -1141,7 +1210,7 @@ async def protect_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Toggle current state
         state = not link.get('protect_content', False)
         
-    db.update_link(link_id, {"protect_content": state})
+    await adb.update_link(link_id, {"protect_content": state})
     
     status = "ON 🛡️" if state else "OFF 🔓"
     desc = "Files cannot be forwarded/saved." if state else "Files can be forwarded."
@@ -1169,49 +1238,9 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
         
-    query = " ".join(context.args)
-    user_id = update.effective_user.id
-    
-    # Search in DB
-    # We need a db method for regex search or filter in python
-    # db.get_user_links supports filter?
-    # db.get_user_links(user_id, category=... skip=...)
-    # I should add search method to db or fetch all and filter (inefficient but ok for now)
-    
-    # Let's assume fetching all (limit 1000) is okay for now
-    all_links = db.get_user_links(user_id, limit=1000)
-    
-    results = []
-    for link in all_links:
-        if query.lower() in link.get('link_name', '').lower() or query.lower() in link.get('category', '').lower() or query in link['link_id']:
-            results.append(link)
-            
-    if not results:
-        if update.callback_query:
-            await update.callback_query.answer("❌ No links found!")
-        else:
-            await update.effective_message.reply_text(
-                "❌ **No Links Found!**\n\n"
-                "You haven't created any links yet.\n"
-                "Use /upload to start sharing files!",
-                parse_mode="Markdown"
-            )
-        return
-        
-    # Show results (Top 10)
-    message = f"🔍 **Search Results for:** `{query}`\n\n"
-    
-    for idx, link in enumerate(results[:10], 1):
-        bot_link = generate_bot_link(link['link_id'])
-        emoji = "💎" if link.get('is_premium_link') else "🔗"
-        message += f"{emoji} **{idx}. {truncate_text(link.get('link_name', 'Untitled'), 30)}**\n"
-        message += f"   🆔 `{link['link_id']}`\n"
-        message += f"   🔗 {bot_link}\n\n"
-        
-    if len(results) > 10:
-        message += f"...and {len(results) - 10} more results.\n"
-        
-    await update.message.reply_text(message, parse_mode="Markdown")
+    # Kept for the page buttons (callback data is too short for the query)
+    context.user_data['search_query'] = " ".join(context.args)
+    await show_search_page(update, context, 1)
 
 # ==================== PLAN MANAGEMENT ====================
 
@@ -1241,7 +1270,7 @@ async def set_plan_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     plan_details = config.PLANS[plan_name]
     
-    if db.set_user_plan(target_id, plan_name):
+    if await adb.set_user_plan(target_id, plan_name):
         notify_text = "✅ **Plan Updated!** (User notification failed)"
         try:
             # Try to notify user
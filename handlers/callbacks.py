@@ -7,14 +7,15 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from datetime import datetime
 import config
-from database import db
+from database import adb
 from handlers.user import (
     start_command, help_command, stats_command, 
     settings_command, referral_command, upgrade_command
 )
 from handlers.admin import (
-    upload_command, mylinks_command
+    upload_command, mylinks_command, show_links_page
 )
+from utils.helpers import parse_link_page_callback
 
 # ==================== CALLBACK HANDLERS ====================
 
@@ -55,10 +56,8 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
     
     elif data.startswith("menu_edit_select") or data.startswith("edit_sel_page_"):
          from handlers.edit_panel import show_edit_selection_menu
-         page = 1
-         if "edit_sel_page_" in data:
-             page = int(data.split("_")[-1])
-         await show_edit_selection_menu(update, context, page)
+         cursor = parse_link_page_callback(data, "edit_sel_page_")
+         await show_edit_selection_menu(update, context, cursor["page"], cursor["after"], cursor["before"])
          
     # Settings Handler
     elif data.startswith("imp_"):
@@ -98,7 +97,7 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
     # Advanced Link Info
     elif data.startswith("linfo_"):
         link_id = data.replace("linfo_", "")
-        link = db.get_link(link_id)
+        link = await adb.get_link(link_id)
         
         if not link:
             await query.answer("❌ Link not found!")
@@ -204,7 +203,7 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
     # Delete Confirmation
     elif data.startswith("confirm_del_"):
         link_id = data.replace("confirm_del_", "")
-        link = db.get_link(link_id)
+        link = await adb.get_link(link_id)
         from utils.helpers import format_file_size
         
         if not link:
@@ -240,7 +239,7 @@ Are you sure you want to delete this link?
     elif data.startswith("del_"):
         link_id = data.replace("del_", "")
         
-        if db.delete_link(link_id):
+        if await adb.delete_link(link_id):
             await query.answer("✅ Link deleted successfully!")
             await query.message.reply_text(
                 "🗑️ **Link Deleted!**\n\nThe link and its files have been removed.",
@@ -260,16 +259,32 @@ Are you sure you want to delete this link?
     # Pagination
     elif data.startswith("links_page_"):
         # Handle mylinks pagination
-        parts = data.split("_")
-        page = int(parts[2])
-        category = parts[3] if len(parts) > 3 and parts[3] != "all" else None
+        cursor = parse_link_page_callback(data, "links_page_")
+        
+        if cursor["extra"]:
+            category = context.user_data.get('links_categories', {}).get(cursor["extra"])
+            if category is None:
+                # Category no longer known: the cursor belongs to a list we cannot rebuild
+                await show_links_page(update, context)
+                return
+        else:
+            category = None
         
-        context.args = []
-        if category:
-            context.args.extend(["category", category])
-        context.args.append(str(page))
+        await show_links_page(
+            update, context, category=category,
+            page=cursor["page"], after=cursor["after"], before=cursor["before"]
+        )
         
-        await mylinks_command(update, context)
+    # Search results pagination
+    elif data.startswith("search_page_"):
+        from handlers.premium import show_search_page
+        await show_search_page(update, context, int(data.split("_")[-1]))
+        
+    # Admin stats refresh
+    elif data == "admin_refresh_stats":
+        if update.effective_user.id in config.ADMIN_IDS:
+            from handlers.admin import admin_stats_command
+            await admin_stats_command(update, context)
         
     # Copy Link ID
     elif data.startswith("copy_"):
@@ -283,13 +298,10 @@ Are you sure you want to delete this link?
     # Add Files to Link
     elif data.startswith("add_files_"):
         link_id = data.replace("add_files_", "")
-        from handlers.admin import pending_add_files
+        from utils.sessions import upload_sessions, ADD
         
         # Init add mode
-        pending_add_files[update.effective_user.id] = {
-            "link_id": link_id,
-            "files": []
-        }
+        await upload_sessions.start(ADD, update.effective_user.id, link_id=link_id)
         
         await query.message.reply_text(
             f"➕ **Add Files Mode Activated!**\n\n"
@@ -312,9 +324,10 @@ async def generate_link_category_callback(update: Update, context: ContextTypes.
     user_id = query.from_user.id
     
     # Check if user has pending files
-    from handlers.admin import pending_files
+    from utils.sessions import upload_sessions, UPLOAD
+    session = await upload_sessions.get(UPLOAD, user_id)
     
-    if user_id not in pending_files:
+    if not session:
         await query.message.reply_text(
             "❌ **No pending files!**\n\n"
             "Please start upload again with /upload",
@@ -322,7 +335,7 @@ async def generate_link_category_callback(update: Update, context: ContextTypes.
         )
         return
     
-    files = pending_files[user_id]
+    files = session["files"]
     
     # Get selected category
     category = query.data.replace("gen_cat_", "")
@@ -335,7 +348,7 @@ async def generate_link_category_callback(update: Update, context: ContextTypes.
     if not link_name:
         link_name = f"Link {datetime.now().strftime('%d %b %H:%M')}"
         
-    link_id = db.create_link(
+    link_id = await adb.create_link(
         admin_id=user_id,
         files_data=files,
         link_name=link_name,
@@ -348,7 +361,7 @@ async def generate_link_category_callback(update: Update, context: ContextTypes.
         bot_link = generate_bot_link(link_id)
         total_size = calculate_total_size(files)
         
-        link = db.get_link(link_id)
+        link = await adb.get_link(link_id)
         
         message = config.LINK_GENERATED_SUCCESS.format(
             link=bot_link,
@@ -372,7 +385,7 @@ async def generate_link_category_callback(update: Update, context: ContextTypes.
         ]
         
         # Add Premium Actions
-        if db.is_user_premium(user_id) or user_id in config.ADMIN_IDS:
+        if await adb.is_user_premium(user_id) or user_id in config.ADMIN_IDS:
              # Insert Premium options before Main Menu
              premium_row = [
                  InlineKeyboardButton("✏️ Rename", callback_data=f"p_rename_{link_id}"),
@@ -389,10 +402,10 @@ async def generate_link_category_callback(update: Update, context: ContextTypes.
             parse_mode="Markdown"
         )
         
-        db.log_event("link_created", user_id=user_id, link_id=link_id, metadata={"files": len(files), "category": category})
+        await adb.log_event("link_created", user_id=user_id, link_id=link_id, metadata={"files": len(files), "category": category})
         
         # Clean up
-        del pending_files[user_id]
+        await upload_sessions.delete(UPLOAD, user_id)
         if 'link_name' in context.user_data: del context.user_data['link_name']
     else:
         await query.message.reply_text(
@@ -408,23 +421,17 @@ async def handle_settings_callback(update: Update, context: ContextTypes.DEFAULT
     data = query.data
     user_id = update.effective_user.id
     
-    user = db.get_user(user_id)
+    user = await adb.get_user(user_id)
     settings = user.get("settings", {})
     
     if data == "set_toggle_notif":
         new_val = not settings.get("notifications", True)
-        db.users.update_one(
-            {"user_id": user_id},
-            {"$set": {"settings.notifications": new_val}}
-        )
+        await adb.update_user_settings(user_id, {"notifications": new_val})
         await query.answer(f"Notifications {'Enabled' if new_val else 'Disabled'}!")
         
     elif data == "set_toggle_autodel":
         new_val = not settings.get("auto_delete_files", True)
-        db.users.update_one(
-            {"user_id": user_id},
-            {"$set": {"settings.auto_delete_files": new_val}}
-        )
+        await adb.update_user_settings(user_id, {"auto_delete_files": new_val})
         await query.answer(f"Auto-Delete {'Enabled' if new_val else 'Disabled'}!")
         
     # Refresh
@@ -7,8 +7,8 @@ Advanced link editing features
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 import config
-from database import db
-from utils.helpers import user_check, truncate_text, format_file_size
+from database import adb
+from utils.helpers import user_check, truncate_text, format_file_size, link_page_callback
 
 @user_check
 async def edit_panel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -24,7 +24,7 @@ async def edit_panel_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def show_edit_panel(update: Update, context: ContextTypes.DEFAULT_TYPE, link_id: str):
     """Render the edit panel"""
-    link = db.get_link(link_id)
+    link = await adb.get_link(link_id)
     if not link:
         if update.callback_query:
             await update.callback_query.answer("❌ Link Not Found!")
@@ -121,10 +121,10 @@ async def edit_panel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         link_id = data.replace("edit_add_", "")
         # Logic to enter Add Mode (Similar to /add)
         # We can simulate /add command or set state
-        from handlers.admin import pending_add_files
+        from utils.sessions import upload_sessions, ADD
         user_id = update.effective_user.id
         
-        pending_add_files[user_id] = {"link_id": link_id, "files": []}
+        await upload_sessions.start(ADD, user_id, link_id=link_id)
         
         await query.message.reply_text(
             f"📤 **Add Files to:** `{link_id}`\n\n"
@@ -149,7 +149,7 @@ async def edit_panel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         file_idx = int(parts[1])
         page = int(parts[2])
         
-        if db.remove_file_from_link(link_id, file_idx):
+        if await adb.remove_file_from_link(link_id, file_idx):
              await query.answer("File deleted!")
              await show_file_delete_menu(update, context, link_id, page)
         else:
@@ -157,23 +157,23 @@ async def edit_panel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     elif data.startswith("p_protect_toggle_"):
         link_id = data.replace("p_protect_toggle_", "")
-        link = db.get_link(link_id)
+        link = await adb.get_link(link_id)
         if link:
             new_state = not link.get("protect_content", False)
-            db.update_link(link_id, {"protect_content": new_state})
+            await adb.update_link(link_id, {"protect_content": new_state})
             await query.answer(f"Protection {'Enabled' if new_state else 'Disabled'}")
             await show_edit_panel(update, context, link_id)
             
     elif data.startswith("p_pass_remove_"):
         link_id = data.replace("p_pass_remove_", "")
-        db.links.update_one({"link_id": link_id}, {"$unset": {"password": ""}})
+        await adb.unset_link_fields(link_id, ["password"])
         await query.answer("Password Removed!")
         await show_edit_panel(update, context, link_id)
             
     elif data.startswith("edit_view_"):
          # Show file list text
          link_id = data.replace("edit_view_", "")
-         link = db.get_link(link_id)
+         link = await adb.get_link(link_id)
          user_id = update.effective_user.id
          
          if not link: return
@@ -196,7 +196,7 @@ async def edit_panel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 
 async def show_file_delete_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, link_id: str, page: int):
-    link = db.get_link(link_id)
+    link = await adb.get_link(link_id)
     if not link: return
     
     files = link.get('files', [])
@@ -233,29 +233,35 @@ async def show_file_delete_menu(update: Update, context: ContextTypes.DEFAULT_TY
     except:
         pass
 
-async def show_edit_selection_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 1):
+async def show_edit_selection_menu(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 1, after: tuple = None, before: tuple = None
+):
     """Show list of links to select for editing"""
     user_id = update.effective_user.id
     
-    # Get user links
-    all_links = sorted(db.get_user_links(user_id, limit=100), key=lambda x: x['created_at'], reverse=True)
+    total_items = await adb.count_user_links(user_id)
     
-    if not all_links:
+    if not total_items:
          if update.callback_query:
             await update.callback_query.answer("❌ No links found!")
          return
          
-    # Pagination
+    # Pagination: only the links on this page are fetched
     ITEMS_PER_PAGE = 5
-    total_items = len(all_links)
     total_pages = (total_items + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE
     
     if page < 1: page = 1
     if page > total_pages: page = total_pages
     
-    start = (page - 1) * ITEMS_PER_PAGE
-    end = start + ITEMS_PER_PAGE
-    current_items = all_links[start:end]
+    if after or before:
+        current_items = await adb.list_user_links(user_id, limit=ITEMS_PER_PAGE, after=after, before=before)
+    else:
+        current_items = await adb.list_user_links(user_id, limit=ITEMS_PER_PAGE, skip=(page - 1) * ITEMS_PER_PAGE)
+    
+    # Links deleted since the count was cached: start over
+    if not current_items and page > 1:
+        page = 1
+        current_items = await adb.list_user_links(user_id, limit=ITEMS_PER_PAGE)
     
     text = f"🛠️ **Select Link to Edit** (Page {page}/{total_pages})\nChoose a link below:"
     
@@ -266,10 +272,10 @@ async def show_edit_selection_menu(update: Update, context: ContextTypes.DEFAULT
         
     # Navigation
     nav = []
-    if page > 1:
-        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"edit_sel_page_{page-1}"))
-    if page < total_pages:
-        nav.append(InlineKeyboardButton("Next ➡️", callback_data=f"edit_sel_page_{page+1}"))
+    if page > 1 and current_items:
+        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=link_page_callback("edit_sel_page_", page - 1, "p", current_items[0])))
+    if page < total_pages and current_items:
+        nav.append(InlineKeyboardButton("Next ➡️", callback_data=link_page_callback("edit_sel_page_", page + 1, "n", current_items[-1])))
         
     if nav: keyboard.append(nav)
     keyboard.append([InlineKeyboardButton("⬅️ Back to Links", callback_data="menu_mylinks")])
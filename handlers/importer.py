@@ -1,11 +1,11 @@
-import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Message
 from telegram.ext import ContextTypes
 from telegram.error import TelegramError
 from telegram.helpers import escape_markdown
 import config
-from database import db
+from database import adb, IMPORT_RUNNING, IMPORT_COMPLETED, IMPORT_FAILED
 from utils.helpers import user_check, format_file_size
+from utils.import_jobs import import_jobs, import_progress
 
 # Constants
 FILTER_OPTS = {
@@ -222,16 +222,29 @@ async def start_import_process(update: Update, context: ContextTypes.DEFAULT_TYP
         msg = await context.bot.send_message(chat_id, msg_text, parse_mode="Markdown")
         message_id = msg.message_id
     
-    # Run in background
-    asyncio.create_task(run_import_task(
-        context, 
-        user_id, 
-        chat_id, 
-        message_id, 
-        source_id, 
-        filters, 
-        limit
-    ))
+    # Determine scan start point
+    start_id = context.user_data.get('import_start_msg_id')
+    
+    if not start_id:
+        # Default: Latest message
+        try:
+            dummy = await context.bot.send_message(source_id, ".")
+            start_id = dummy.message_id
+            await dummy.delete()
+        except:
+            start_id = 100000 # Fallback
+    
+    # Run in background as a resumable job
+    await import_jobs.submit(
+        user_id=user_id,
+        chat_id=chat_id,
+        status_message_id=message_id,
+        source_id=source_id,
+        source_title=context.user_data.get('import_source_title'),
+        filters=filters,
+        start_id=start_id,
+        limit=limit
+    )
 
 async def handle_import_limit_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle custom limit number"""
@@ -246,191 +259,32 @@ async def handle_import_limit_input(update: Update, context: ContextTypes.DEFAUL
     
     await start_import_process(update, context, limit)
     
-# ... run_import_task is below ...
-
-async def run_import_task(context, user_id, chat_id, message_id, source_id, filters, limit):
-    """Background task logic"""
-    try:
-        imported_files = []
-        scanned = 0
-        found = 0
-        
-        # Determine scan start point
-        start_id = context.user_data.get('import_start_msg_id')
-        
-        if not start_id:
-            # Default: Latest message
-            try:
-                dummy = await context.bot.send_message(source_id, ".")
-                start_id = dummy.message_id
-                await dummy.delete()
-            except:
-                start_id = 100000 # Fallback
-                
-        # Limit arithmetic
-        limit_val = int(limit) if limit != 'all' else 5000
-        
-        target = start_id - limit_val
-        if target < 1: target = 1
-        
-        # Progress Loop
-        current_id = start_id
-        while current_id > target and (limit == 'all' or scanned < limit_val):
-            # Scan Strategy: Downwards
-            process_id = current_id 
-            
-            # Rate limiting & UI Update
-            # Update every 5% or at least every 5 messages
-            update_step = max(5, int(limit_val / 20))
-            
-            if scanned > 0 and (scanned % update_step == 0 or scanned == limit_val):
-                try:
-                    percent = 0
-                    if limit != 'all':
-                        percent = int((scanned / limit_val) * 100)
-                    
-                    # Bar: [██████░░░░]
-                    filled = int(percent / 10)
-                    bar = "▓" * filled + "░" * (10 - filled)
-                    
-                    status_text = (
-                        f"📥 **Importing Files...**\n"
-                        f"`[{bar}] {percent}%`\n\n"
-                        f"📂 **Scanned:** {scanned}/{limit_val}\n"
-                        f"✅ **Found:** {found}\n"
-                        f"📉 **Current ID:** `{process_id}`"
-                    )
-                    
-                    await context.bot.edit_message_text(
-                        chat_id=chat_id,
-                        message_id=message_id,
-                        text=status_text,
-                        parse_mode="Markdown"
-                    )
-                    # Small yield to prevent blocking event loop, but not slow down opacity
-                    await asyncio.sleep(0.1)
-                except Exception as e:
-                    # Ignore "Message not modified" or Rate Limits
-                    await asyncio.sleep(1) # Backoff slightly on error
-                    pass
-
-            try:
-                # 1. Forward first to inspect content (returns full Message object)
-                # We use forward because copy_message returns MessageId object (no data)
-                temp_msg = await context.bot.forward_message(
-                    chat_id=config.PRIMARY_CHANNEL,
-                    from_chat_id=source_id,
-                    message_id=process_id
-                )
-                
-                # Inspect content
-                file_type = None
-                if temp_msg.document: file_type = 'document'
-                elif temp_msg.video: file_type = 'video'
-                elif temp_msg.audio: file_type = 'audio'
-                elif temp_msg.photo: file_type = 'photo'
-                
-                is_valid = False
-                if 'all' in filters:
-                    is_valid = bool(file_type)
-                elif file_type and file_type in filters:
-                    is_valid = True
-                
-                if is_valid:
-                    # 2. Valid! Create CLEAN COPY (no forward tag)
-                    clean_msg_id = await context.bot.copy_message(
-                        chat_id=config.PRIMARY_CHANNEL,
-                        from_chat_id=source_id,
-                        message_id=process_id
-                    )
-                    # copy_message returns MessageId object
-                    final_mid = clean_msg_id.message_id
-                    
-                    # Extract info from temp_msg (it has the data)
-                    f_id, f_name, f_size = None, "Imported", 0
-                    
-                    if temp_msg.document:
-                        f_id = temp_msg.document.file_id
-                        f_name = temp_msg.document.file_name or "Document"
-                        f_size = temp_msg.document.file_size
-                    elif temp_msg.video:
-                        f_id = temp_msg.video.file_id
-                        f_name = temp_msg.video.file_name or "Video"
-                        f_size = temp_msg.video.file_size
-                    elif temp_msg.audio:
-                        f_id = temp_msg.audio.file_id
-                        f_name = temp_msg.audio.file_name or "Audio"
-                        f_size = temp_msg.audio.file_size
-                    elif temp_msg.photo:
-                        f_id = temp_msg.photo[-1].file_id
-                        f_name = "Photo.jpg"
-                        f_size = temp_msg.photo[-1].file_size
-                    
-                    imported_files.append({
-                        "message_id": final_mid, # stored info
-                        "file_id": f_id,
-                        "file_name": f_name,
-                        "file_size": f_size,
-                        "file_type": file_type
-                    })
-                    found += 1
-                
-                # 3. Cleanup temp forward
-                await temp_msg.delete()
-                    
-            except Exception as e:
-                # print(f"Skip: {e}")
-                pass
-            
-            # Decrement loop - MUST BE OUTSIDE TRY/EXCEPT
-            current_id -= 1
-            scanned += 1
-                 
-                
-        # Finish
-        if not imported_files:
-            await context.bot.edit_message_text(
-                chat_id=chat_id,
-                message_id=message_id,
-                text="❌ **Import Failed**\nNo matching files found in the scanned range.",
-                parse_mode="Markdown"
-            )
-            return
-
-        # Hand over to Manual Flow (Standard Generation)
-        from handlers.admin import pending_files
-        pending_files[user_id] = imported_files
-        
-        # Set state for naming
-        context.user_data['awaiting_link_name'] = True
-        
-        # We can suggest a name based on channel title
-        suggested_name = context.user_data.get('import_source_title', 'Imported Files')
-        context.user_data['default_link_name'] = f"Imported: {suggested_name}"
-        
-        from telegram.helpers import escape_markdown
-        safe_name = escape_markdown(suggested_name, version=1)
-        
-        success_text = (
-            f"✅ **Import Complete!**\n\n"
-            f"📦 **{found} Files Ready.**\n\n"
-            f"✏️ **Name your Link:**\n"
-            f"Enter a name for this collection.\n\n"
-            f"Type /skip to use default:\n`Imported: {safe_name}`"
-        )
-        
-        await context.bot.edit_message_text(
-            chat_id=chat_id,
-            message_id=message_id,
-            text=success_text,
-            parse_mode="Markdown"
+@user_check
+async def import_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show running and recent import jobs (admins see every running job)"""
+    user_id = update.effective_user.id
+    
+    jobs = await adb.get_import_jobs(user_id=user_id)
+    if user_id in config.ADMIN_IDS:
+        seen = {job["_id"] for job in jobs}
+        jobs += [job for job in await adb.get_import_jobs(status=IMPORT_RUNNING, limit=20) if job["_id"] not in seen]
+    
+    if not jobs:
+        await update.message.reply_text("📭 **No import jobs yet.**\n\nUse /import to start one.", parse_mode="Markdown")
+        return
+    
+    icons = {IMPORT_RUNNING: "🔄", IMPORT_COMPLETED: "✅", IMPORT_FAILED: "❌"}
+    lines = ["📥 **Import Jobs**\n"]
+    for job in jobs:
+        title = escape_markdown(job.get("source_title") or str(job["source_id"]), version=1)
+        total = job["start_id"] - job["target"]
+        lines.append(f"{icons.get(job['status'], '•')} `{job['_id']}` — {title}")
+        lines.append(
+            f"   📂 {job['scanned']}/{total} scanned ({import_progress(job)}%) · "
+            f"✅ {job['found']} files · {job['status']}"
         )
-        
-    except Exception as e:
-        print(f"Import Error: {e}")
-        try:
-            await context.bot.send_message(chat_id, f"⚠️ Import Error: {e}")
-        except: pass
+    
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
 
 async def handle_import_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Callback dispatcher for import"""
@@ -1,8 +1,8 @@
 
-from telegram import Update
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 import config
-from database import db
+from database import adb
 from utils.helpers import user_check, premium_only, generate_bot_link, truncate_text
 
 # ==================== ADVANCED PREMIUM COMMANDS ====================
@@ -25,7 +25,7 @@ async def setpassword_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     link_id = context.args[0]
     password = context.args[1]
     
-    link = db.get_link(link_id)
+    link = await adb.get_link(link_id)
     if not link:
         await update.message.reply_text("❌ **Link Not Found!**", parse_mode="Markdown")
         return
@@ -38,10 +38,10 @@ async def setpassword_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     # Set password
     if password.lower() == "off":
-        db.update_link(link_id, {"password": None})
+        await adb.update_link(link_id, {"password": None})
         msg = "🔓 **Password Removed!**\nLink is now public."
     else:
-        db.update_link(link_id, {"password": password})
+        await adb.update_link(link_id, {"password": password})
         msg = f"🔒 **Password Set!**\n\n🔑 Password: `{password}`"
         
     await update.message.reply_text(
@@ -66,7 +66,7 @@ async def setname_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     link_id = context.args[0]
     new_name = " ".join(context.args[1:])
     
-    link = db.get_link(link_id)
+    link = await adb.get_link(link_id)
     if not link:
         await update.message.reply_text("❌ **Link Not Found!**", parse_mode="Markdown")
         return
@@ -77,7 +77,7 @@ async def setname_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("🚫 **Access Denied!**", parse_mode="Markdown")
         return
         
-    db.update_link(link_id, {"link_name": new_name})
+    await adb.update_link(link_id, {"link_name": new_name})
     
     await update.message.reply_text(
         f"✅ **Name Updated!**\n\n"
@@ -103,7 +103,7 @@ async def protect_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     link_id = context.args[0]
     
-    link = db.get_link(link_id)
+    link = await adb.get_link(link_id)
     if not link:
         await update.message.reply_text("❌ **Link Not Found!**", parse_mode="Markdown")
         return
@@ -120,7 +120,7 @@ async def protect_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Toggle current state
         state = not link.get('protect_content', False)
         
-    db.update_link(link_id, {"protect_content": state})
+    await adb.update_link(link_id, {"protect_content": state})
     
     status = "ON 🛡️" if state else "OFF 🔓"
     desc = "Files cannot be forwarded/saved." if state else "Files can be forwarded."
@@ -135,6 +135,8 @@ async def protect_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ==================== SEARCH COMMAND ====================
 
+SEARCH_PAGE_SIZE = 10
+
 @user_check
 async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Search user links"""
@@ -148,25 +150,26 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
         
-    query = " ".join(context.args)
+    # Kept for the page buttons (callback data is too short for the query)
+    context.user_data['search_query'] = " ".join(context.args)
+    await show_search_page(update, context, 1)
+
+async def show_search_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
+    """Render one page of ranked search results"""
+    query = context.user_data.get('search_query')
     user_id = update.effective_user.id
     
-    # Search in DB
-    # We need a db method for regex search or filter in python
-    # db.get_user_links supports filter?
-    # db.get_user_links(user_id, category=... skip=...)
-    # I should add search method to db or fetch all and filter (inefficient but ok for now)
-    
-    # Let's assume fetching all (limit 1000) is okay for now
-    all_links = db.get_user_links(user_id, limit=1000)
+    if not query:
+        await update.effective_message.reply_text("❌ Search expired. Use `/search QUERY` again.", parse_mode="Markdown")
+        return
     
-    results = []
-    for link in all_links:
-        if query.lower() in link.get('link_name', '').lower() or query.lower() in link.get('category', '').lower() or query in link['link_id']:
-            results.append(link)
+    # Ranked server-side search over the indexed name/category/ID prefixes
+    page = max(page, 1)
+    found = await adb.search_links(user_id, query, limit=SEARCH_PAGE_SIZE, skip=(page - 1) * SEARCH_PAGE_SIZE)
+    results = found["results"]
             
     if not results:
-        await update.message.reply_text(
+        await update.effective_message.reply_text(
             f"🔍 **No Results Found!**\n\n"
             f"Query: `{query}`\n"
             f"Try different keywords.",
@@ -174,18 +177,29 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
         
-    # Show results (Top 10)
-    message = f"🔍 **Search Results for:** `{query}`\n\n"
+    total_pages = (found["total"] + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+    message = f"🔍 **Search Results for:** `{query}`\n"
+    message += f"📊 **Found:** {found['total']} | 📄 **Page:** {page}/{total_pages}\n\n"
     
-    for idx, link in enumerate(results[:10], 1):
+    for idx, link in enumerate(results, (page - 1) * SEARCH_PAGE_SIZE + 1):
         bot_link = generate_bot_link(link['link_id'])
         emoji = "💎" if link.get('is_premium_link') else "🔗"
         message += f"{emoji} **{idx}. {truncate_text(link.get('link_name', 'Untitled'), 30)}**\n"
         message += f"   🆔 `{link['link_id']}`\n"
         message += f"   🔗 {bot_link}\n\n"
-        
-    if len(results) > 10:
-        message += f"...and {len(results) - 10} more results.\n"
-        
-    await update.message.reply_text(message, parse_mode="Markdown")
+    
+    nav = []
+    if page > 1:
+        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"search_page_{page - 1}"))
+    if page < total_pages:
+        nav.append(InlineKeyboardButton("Next ➡️", callback_data=f"search_page_{page + 1}"))
+    reply_markup = InlineKeyboardMarkup([nav]) if nav else None
+    
+    if update.callback_query:
+        try:
+            await update.callback_query.edit_message_text(message, reply_markup=reply_markup, parse_mode="Markdown")
+            return
+        except Exception:
+            pass
+    await update.effective_message.reply_text(message, reply_markup=reply_markup, parse_mode="Markdown")
 
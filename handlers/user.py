@@ -9,15 +9,37 @@ from telegram.ext import ContextTypes
 from datetime import datetime, timedelta
 import asyncio
 import io
+import time
 import qrcode
 import config
-from database import db
+from database import adb
 import asyncio
 from utils.helpers import (
     user_check, format_file_size, format_datetime, format_expiry_date,
     extract_link_id_from_text, generate_bot_link, get_file_emoji,
-    format_time_remaining, format_user_stats, update_user_menu
+    format_user_stats, update_user_menu
 )
+from utils.auto_delete import deletion_scheduler
+from utils.delivery import deliver_files
+from utils.rate_limiter import flood_control
+
+# ==================== PASSWORD ACCESS ====================
+
+def _grant_is_fresh(verified_at, now: float) -> bool:
+    # Older sessions stored True instead of a timestamp; treat those as expired
+    return type(verified_at) in (int, float) and now - verified_at < config.PASSWORD_VERIFIED_TTL_SECONDS
+
+def has_password_access(user_data: dict, link_id: str) -> bool:
+    """Whether the user entered this link's password within PASSWORD_VERIFIED_TTL_SECONDS"""
+    return _grant_is_fresh(user_data.get(f'password_verified_{link_id}'), time.time())
+
+def grant_password_access(user_data: dict, link_id: str):
+    """Remember a correct password, dropping grants that have expired"""
+    now = time.time()
+    for key in [k for k in user_data if k.startswith('password_verified_')]:
+        if not _grant_is_fresh(user_data[key], now):
+            del user_data[key]
+    user_data[f'password_verified_{link_id}'] = now
 
 # ==================== START & HELP COMMANDS ====================
 
@@ -29,7 +51,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = user.id
     
     # Log event
-    db.log_event("start_command", user_id=user_id)
+    await adb.log_event("start_command", user_id=user_id)
     
     # Update command menu based on plan
     await update_user_menu(context.bot, user_id)
@@ -41,11 +63,11 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Check for referral
         if arg.startswith("ref_"):
             ref_code = arg.replace("ref_", "")
-            if db.apply_referral(user_id, ref_code):
+            if await adb.apply_referral(user_id, ref_code):
                 # Check rewards for referrer
-                referrer_user = db.users.find_one({"referral_code": ref_code})
+                referrer_user = await adb.get_user_by_referral_code(ref_code)
                 if referrer_user:
-                    granted, plan_name, days = db.check_referral_milestones(referrer_user["user_id"])
+                    granted, plan_name, days = await adb.check_referral_milestones(referrer_user["user_id"])
                     if granted:
                         try:
                             await context.bot.send_message(
@@ -119,8 +141,8 @@ async def handle_file_request(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     user_id = update.effective_user.id
     
-    # Get link from database (ASYNC)
-    link = await asyncio.to_thread(db.get_link, link_id)
+    # Get link from database
+    link = await adb.get_link(link_id)
     
     if not link:
         await update.message.reply_text(
@@ -135,13 +157,13 @@ async def handle_file_request(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     
     # Increment views
-    db.increment_link_views(link_id)
-    db.log_event("link_viewed", user_id=user_id, link_id=link_id)
+    await adb.increment_link_views(link_id, admin_id=link["admin_id"])
+    await adb.log_event("link_viewed", user_id=user_id, link_id=link_id)
     
     # Check password protection
     if link.get("password"):
         # Check if password already verified
-        if context.user_data.get(f'password_verified_{link_id}'):
+        if has_password_access(context.user_data, link_id):
             # Password already verified, proceed to download
             pass
         else:
@@ -205,93 +227,44 @@ async def handle_file_request(update: Update, context: ContextTypes.DEFAULT_TYPE
         link
     ))
 
-async def schedule_file_deletion(context: ContextTypes.DEFAULT_TYPE, chat_id: int, message_ids: list):
-    """Schedule auto-deletion of files - SILENT deletion"""
-    
-    # Wait for configured time
-    await asyncio.sleep(config.FILE_AUTO_DELETE_SECONDS)
-    
-    # Delete messages silently
-    for msg_id in message_ids:
-        try:
-            await context.bot.delete_message(chat_id=chat_id, message_id=msg_id)
-        except Exception as e:
-            print(f"Failed to delete message {msg_id}: {e}")
-
 async def send_files_async(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, link_id: str, files: list, link: dict):
     """Background task to send files"""
-    sent_messages = []
+    result = await deliver_files(
+        context.bot,
+        chat_id,
+        files,
+        link,
+        should_stop=lambda: context.user_data.get('stop_sending', False)
+    )
+    sent_messages = result["sent"]
     
-    for idx, file_data in enumerate(files, 1):
-        # Stop check
-        if context.user_data.get('stop_sending'):
-            await context.bot.send_message(chat_id=chat_id, text="🛑 **Stopped by user!**", parse_mode="Markdown")
-            if 'stop_sending' in context.user_data: del context.user_data['stop_sending']
-            return
-            
-        try:
-            # Progress
-            progress_msg = await context.bot.send_message(
-                chat_id=chat_id,
-                text=f"📤 Sending file {idx}/{len(files)}...",
-                parse_mode="Markdown"
-            )
-            
-            # Send file (Redundant Channel Strategy)
-            sent = False
-            last_error = None
-            
-            # Prepare sources: Primary + Backups
-            sources = [{"channel_id": config.PRIMARY_CHANNEL, "message_id": file_data["message_id"]}]
-            if "backup_messages" in file_data:
-                sources.extend([b for b in file_data["backup_messages"] if b["channel_id"] != config.PRIMARY_CHANNEL])
-            
-            file_message = None
-            
-            for source in sources:
-                try:
-                    file_message = await context.bot.copy_message(
-                        chat_id=chat_id,
-                        from_chat_id=source["channel_id"],
-                        message_id=source["message_id"],
-                        caption=config.FILE_SENT_MESSAGE.format(
-                            brand=config.BRAND_NAME,
-                            filename=escape_markdown(file_data['file_name'], version=1),
-                            filesize=format_file_size(file_data['file_size']),
-                            category=link.get('category', 'Others'),
-                            time_left=format_time_remaining(config.FILE_AUTO_DELETE_SECONDS)
-                        ),
-                        parse_mode="Markdown",
-                        protect_content=link.get('protect_content', False)
-                    )
-                    sent = True
-                    break # Success!
-                except Exception as e:
-                    last_error = e
-                    continue # Try next source
-            
-            if not sent:
-                raise last_error or Exception("All channels failed")
-            
-            sent_messages.append(file_message.message_id)
-            await progress_msg.delete()
-            
-        except Exception as e:
-            print(f"Error sending file: {e}")
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=f"❌ **Error sending file {idx}**\n\n⚠️ Error: Content unavailable.\n💡 Contact owner.",
-                parse_mode="Markdown"
-            )
+    if sent_messages:
+        await deletion_scheduler.schedule(chat_id, sent_messages)
+    
+    # Stop check
+    if result["stopped"]:
+        if 'stop_sending' in context.user_data: del context.user_data['stop_sending']
+        await flood_control.call(chat_id, lambda: context.bot.send_message(
+            chat_id=chat_id, text="🛑 **Stopped by user!**", parse_mode="Markdown"
+        ))
+        return
+    
+    if result["failed"]:
+        failed = ", ".join(str(idx) for idx in result["failed"])
+        await flood_control.call(chat_id, lambda: context.bot.send_message(
+            chat_id=chat_id,
+            text=f"❌ **Error sending file(s) {failed}**\n\n⚠️ Error: Content unavailable.\n💡 Contact owner.",
+            parse_mode="Markdown"
+        ))
 
     # Success
-    db.increment_link_downloads(link_id)
-    db.log_event("files_downloaded", user_id=user_id, link_id=link_id, metadata={"file_count": len(files)})
+    await adb.increment_link_downloads(link_id, admin_id=link["admin_id"])
+    await adb.log_event("files_downloaded", user_id=user_id, link_id=link_id, metadata={"file_count": len(files)})
     
-    await context.bot.send_message(
+    await flood_control.call(chat_id, lambda: context.bot.send_message(
         chat_id=chat_id,
         text=f"✅ **Download Complete!**\n\n"
-             f"📥 **{len(files)} files sent successfully!**\n\n"
+             f"📥 **{len(sent_messages)} files sent successfully!**\n\n"
              f"⚠️ **AUTO-DELETE WARNING:**\n"
              f"Files will be deleted in **{config.FILE_AUTO_DELETE_MINUTES} minutes**!\n"
              f"💾 Please save them immediately!\n\n"
@@ -299,10 +272,7 @@ async def send_files_async(context: ContextTypes.DEFAULT_TYPE, chat_id: int, use
              f"Powered by Share Box\n"
              f"Create your own links using this bot",
         parse_mode="Markdown"
-    )
-    
-    if sent_messages:
-        asyncio.create_task(schedule_file_deletion(context, chat_id, sent_messages))
+    ))
 
 # ==================== LINK DETECTION ====================
 
@@ -350,13 +320,13 @@ async def detect_and_handle_link(update: Update, context: ContextTypes.DEFAULT_T
     # 2. Check if user is waiting to send password
     if 'password_pending_link' in context.user_data:
         link_id = context.user_data['password_pending_link']
-        link = await asyncio.to_thread(db.get_link, link_id)
+        link = await adb.get_link(link_id)
         
         if link and link.get('password'):
             # Verify password
             if text.strip() == link['password']:
                 # Password correct
-                context.user_data[f'password_verified_{link_id}'] = True
+                grant_password_access(context.user_data, link_id)
                 del context.user_data['password_pending_link']
                 
                 await update.message.reply_text(
@@ -413,7 +383,7 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # Get formatted stats
-    stats_message = format_user_stats(user_id)
+    stats_message = await format_user_stats(user_id)
     
     keyboard = [
         [
@@ -446,7 +416,7 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show and manage user settings"""
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await adb.get_user(user_id)
     settings = user.get('settings', {})
     
     # Defaults
@@ -510,10 +480,10 @@ async def referral_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show referral info"""
     
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await adb.get_user(user_id)
     
     referral_code = user.get('referral_code', 'N/A')
-    referral_stats = db.get_referral_stats(user_id)
+    referral_stats = await adb.get_referral_stats(user_id)
     
     bot_username = config.BOT_USERNAME.replace('@', '')
     referral_link = f"https://t.me/{bot_username}?start=ref_{referral_code}"
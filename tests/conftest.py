@@ -0,0 +1,12 @@
+"""
+Share-box by Univora - Test Setup
+Makes the bot's top-level modules importable from the tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.py connects at import time; nothing here needs a live server
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
@@ -0,0 +1,46 @@
+"""
+Share-box by Univora - Auto-Delete Scheduler Tests
+"""
+
+from telegram.error import BadRequest, NetworkError
+import asyncio
+import utils.auto_delete as auto_delete
+from utils.auto_delete import DeletionScheduler
+
+class FakeDeletions:
+    """Stands in for adb: due entries, and what became of them"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.removed = []
+        self.retried = {}
+
+    async def get_due_deletions(self, limit):
+        entries, self.entries = self.entries, []
+        return entries
+
+    async def remove_deletions(self, ids):
+        self.removed.extend(ids)
+
+    async def retry_deletion(self, entry_id, message_ids, attempt, delay_seconds):
+        self.retried[entry_id] = (message_ids, attempt)
+
+class FlakyBot:
+    """Chat 1 is unreachable for now, chat 2's messages are already gone"""
+
+    async def delete_messages(self, chat_id, message_ids):
+        if chat_id == 1:
+            raise NetworkError("Connection reset")
+        raise BadRequest("Message to delete not found")
+
+def test_transient_failures_are_retried_and_permanent_ones_dropped(monkeypatch):
+    deletions = FakeDeletions([
+        {"_id": "a", "chat_id": 1, "message_ids": [10, 11]},
+        {"_id": "b", "chat_id": 2, "message_ids": [20]}
+    ])
+    monkeypatch.setattr(auto_delete, "adb", deletions)
+
+    asyncio.run(DeletionScheduler().process_due(FlakyBot()))
+
+    assert deletions.removed == ["b"]
+    assert deletions.retried == {"a": ([10, 11], 1)}
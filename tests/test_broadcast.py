@@ -0,0 +1,73 @@
+"""
+Share-box by Univora - Broadcast Engine Tests
+"""
+
+import asyncio
+import pytest
+import config
+import utils.broadcast as broadcast_module
+from utils.broadcast import Broadcaster
+
+class FakeBroadcasts:
+    """Stands in for adb: two pages of recipients and a lease that can be lost"""
+
+    def __init__(self, lease_held: bool):
+        self.lease_held = lease_held
+        self.pages = {0: [1, 2], 2: [3, 4]}
+        self.finished = False
+
+    async def get_broadcast_recipients(self, after_user_id, limit):
+        return self.pages.get(after_user_id, [])
+
+    async def mark_users_bot_blocked(self, user_ids):
+        pass
+
+    async def checkpoint_broadcast(self, broadcast, last_user_id, counts, lease_seconds):
+        return self.lease_held
+
+    async def renew_broadcast_lease(self, broadcast, lease_seconds):
+        return self.lease_held
+
+    async def finish_broadcast(self, broadcast_id):
+        self.finished = True
+
+class RecordingBot:
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.sent_to = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.delay)
+        self.sent_to.append(chat_id)
+
+    async def edit_message_text(self, **kwargs):
+        pass
+
+def _run(monkeypatch, lease_held: bool, lease_seconds: float = 300, delay: float = 0):
+    broadcasts = FakeBroadcasts(lease_held)
+    monkeypatch.setattr(broadcast_module, "adb", broadcasts)
+    monkeypatch.setattr(config, "BROADCAST_LEASE_SECONDS", lease_seconds)
+    bot = RecordingBot(delay)
+    broadcaster = Broadcaster()
+    broadcaster._bot = bot
+
+    async def run():
+        await broadcaster._run({"_id": "b1", "lease_owner": "me", "last_user_id": 0, "chat_id": 1, "status_message_id": 1, "text": "hi"})
+    asyncio.run(run())
+    return bot, broadcasts
+
+def test_broadcast_runs_to_the_end_while_the_lease_is_held(monkeypatch):
+    bot, broadcasts = _run(monkeypatch, lease_held=True)
+    assert bot.sent_to == [1, 2, 3, 4]
+    assert broadcasts.finished
+
+def test_broadcast_stops_once_its_lease_is_taken_over(monkeypatch):
+    bot, broadcasts = _run(monkeypatch, lease_held=False)
+    # The new owner resends from the last checkpoint; we must not go on as well
+    assert bot.sent_to == [1, 2]
+    assert not broadcasts.finished
+
+def test_slow_page_is_cancelled_when_the_lease_is_lost(monkeypatch):
+    # The lease is renewed on a timer, not only between pages
+    with pytest.raises(asyncio.CancelledError):
+        _run(monkeypatch, lease_held=False, lease_seconds=0.03, delay=0.5)
@@ -0,0 +1,66 @@
+"""
+Share-box by Univora - Write-Behind Counter Tests
+"""
+
+from pymongo.errors import BulkWriteError
+import asyncio
+import pytest
+from database import AsyncDatabase, CounterBuffer
+
+class FakeCollection:
+    """Records applied bulk writes; fails the first `failures` calls"""
+
+    def __init__(self, failures: int = 0, failed_index: int = None):
+        self.failures = failures
+        self.failed_index = failed_index
+        self.applied = []
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            if self.failed_index is None:
+                raise ConnectionError("Connection reset")
+            # ordered=False: every op but the failed one still lands
+            self.applied.extend(op for i, op in enumerate(ops) if i != self.failed_index)
+            raise BulkWriteError({"writeErrors": [{"index": self.failed_index, "errmsg": "write failed"}]})
+        self.applied.extend(ops)
+
+def _inc(ops, key):
+    return [op._doc["$inc"] for op in ops if key in op._filter.values()]
+
+@pytest.fixture
+def database(monkeypatch):
+    adb = AsyncDatabase()
+    monkeypatch.setattr(adb, "_counters", CounterBuffer())
+    monkeypatch.setattr(adb, "_flush_lock", asyncio.Lock())
+    monkeypatch.setattr(adb, "_tasks", [])
+    monkeypatch.setattr(adb, "stats", FakeCollection())
+    return adb
+
+def test_owner_totals_survive_a_failed_users_write(monkeypatch, database):
+    monkeypatch.setattr(database, "links", FakeCollection())
+    monkeypatch.setattr(database, "users", FakeCollection(failures=2))
+    database._counters.add("abc", 7, "views")
+
+    asyncio.run(database.flush_counters())
+    assert database._counters
+    asyncio.run(database.flush_counters())
+    asyncio.run(database.stop())
+
+    # Links were written once; the owner's totals land at shutdown
+    assert _inc(database.links.applied, "abc") == [{"views": 1, "downloads": 0}]
+    assert _inc(database.users.applied, 7) == [{"total_views": 1, "total_downloads": 0}]
+    assert not database._counters
+
+def test_partially_applied_link_writes_are_not_counted_twice(monkeypatch, database):
+    monkeypatch.setattr(database, "links", FakeCollection(failures=1, failed_index=1))
+    monkeypatch.setattr(database, "users", FakeCollection())
+    database._counters.add("abc", 7, "views")
+    database._counters.add("def", 7, "views")
+
+    asyncio.run(database.flush_counters())
+    asyncio.run(database.flush_counters())
+
+    assert _inc(database.links.applied, "abc") == [{"views": 1, "downloads": 0}]
+    assert _inc(database.links.applied, "def") == [{"views": 1, "downloads": 0}]
+    assert _inc(database.users.applied, 7) == [{"total_views": 2, "total_downloads": 0}]
@@ -0,0 +1,170 @@
+"""
+Share-box by Univora - Delivery Engine Tests
+"""
+
+import asyncio
+import itertools
+from telegram.error import Forbidden, TimedOut
+import config
+from utils.channel_health import channel_health
+from utils.delivery import deliver_files
+
+class _Sent:
+    def __init__(self, message_id: int):
+        self.message_id = message_id
+
+    async def edit_text(self, text):
+        return self
+
+    async def delete(self):
+        return True
+
+class FakeBot:
+    """Records the Bot API calls deliver_files makes"""
+
+    def __init__(self):
+        self.calls = []
+        self._ids = itertools.count(1)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return _Sent(next(self._ids))
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        self.calls.append(("send_media_group", [m.caption for m in media]))
+        return [_Sent(next(self._ids)) for _ in media]
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, caption=None, **kwargs):
+        self.calls.append(("copy_message", [caption]))
+        return _Sent(next(self._ids))
+
+    async def copy_messages(self, chat_id, from_chat_id, message_ids, remove_caption=None, **kwargs):
+        # Kept captions would be the uploader's, not ours
+        self.calls.append(("copy_messages", [None if remove_caption else "original"] * len(message_ids)))
+        return [_Sent(next(self._ids)) for _ in message_ids]
+
+def _files(count: int):
+    return [
+        {
+            "message_id": 100 + i,
+            "file_id": f"file-{i}",
+            "file_name": f"report-{i}.pdf",
+            "file_size": 1024,
+            "file_type": "document"
+        }
+        for i in range(count)
+    ]
+
+def _delivered_captions(mode: str = None):
+    bot = FakeBot()
+    result = asyncio.run(deliver_files(bot, 42, _files(3), {"category": "📄 Documents"}, mode=mode))
+    assert result["failed"] == []
+    assert len(result["sent"]) == 3
+    return bot, [caption for _, captions in bot.calls for caption in captions]
+
+def test_three_file_link_gets_a_caption_per_file():
+    bot, captions = _delivered_captions()
+    assert len(captions) == 3
+    for i, caption in enumerate(captions):
+        assert caption and f"report-{i}" in caption
+
+def test_copy_mode_keeps_captions():
+    bot, captions = _delivered_captions(mode="copy")
+    assert "copy_messages" not in [name for name, _ in bot.calls]
+    assert all(captions)
+
+def test_copy_mode_without_captions_uses_copy_messages(monkeypatch):
+    monkeypatch.setattr(config, "FILE_SENT_MESSAGE", "")
+    bot, captions = _delivered_captions(mode="copy")
+    assert [name for name, _ in bot.calls] == ["copy_messages"]
+    assert captions == [None, None, None]
+
+class BlockedBot(FakeBot):
+    """The recipient blocked the bot"""
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, caption=None, **kwargs):
+        self.calls.append(("copy_message", [from_chat_id]))
+        raise Forbidden("Forbidden: bot was blocked by the user")
+
+def test_blocked_recipient_is_not_a_channel_failure(monkeypatch):
+    monkeypatch.setattr(channel_health, "_channels", {})
+    bot = BlockedBot()
+    files = _files(1)
+    files[0]["backup_messages"] = [
+        {"channel_id": config.PRIMARY_CHANNEL, "message_id": files[0]["message_id"]},
+        {"channel_id": -1002, "message_id": 7}
+    ]
+
+    result = asyncio.run(deliver_files(bot, 42, files, {}, mode="single"))
+
+    assert result["failed"] == [1]
+    # No other storage channel is tried, and none is charged
+    assert len(bot.calls) == 1
+    assert all(stats["failures"] == 0 for stats in channel_health.snapshot().values())
+
+def test_file_without_a_primary_copy_is_sent_from_its_backups(monkeypatch):
+    monkeypatch.setattr(channel_health, "_channels", {})
+    bot = FakeBot()
+    files = _files(1)
+    # Stored only in a backup channel: no message_id to pair with PRIMARY_CHANNEL
+    del files[0]["message_id"]
+    files[0]["backup_messages"] = [{"channel_id": -1002, "message_id": 7}]
+
+    sources = []
+    copy_message = bot.copy_message
+    async def recording_copy(chat_id, from_chat_id, message_id, **kwargs):
+        sources.append((from_chat_id, message_id))
+        return await copy_message(chat_id, from_chat_id, message_id, **kwargs)
+    bot.copy_message = recording_copy
+
+    result = asyncio.run(deliver_files(bot, 42, files, {}, mode="single"))
+
+    assert result["failed"] == []
+    assert sources == [(-1002, 7)]
+
+class SlowPrimaryBot(FakeBot):
+    """The primary storage channel times out"""
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, caption=None, **kwargs):
+        self.calls.append(("copy_message", [from_chat_id]))
+        if from_chat_id == config.PRIMARY_CHANNEL:
+            raise TimedOut("Timed out")
+        return _Sent(next(self._ids))
+
+def test_timed_out_primary_falls_back_to_a_backup(monkeypatch):
+    monkeypatch.setattr(channel_health, "_channels", {})
+    bot = SlowPrimaryBot()
+    files = _files(1)
+    files[0]["backup_messages"] = [
+        {"channel_id": config.PRIMARY_CHANNEL, "message_id": files[0]["message_id"]},
+        {"channel_id": -1002, "message_id": 7}
+    ]
+
+    result = asyncio.run(deliver_files(bot, 42, files, {}, mode="single"))
+
+    assert result["failed"] == []
+    assert [args for _, args in bot.calls] == [[config.PRIMARY_CHANNEL], [-1002]]
+    health = channel_health.snapshot()
+    assert health[config.PRIMARY_CHANNEL]["failures"] == 1
+    assert health[-1002]["failures"] == 0
+
+def test_a_due_probe_is_shared_by_every_file_of_a_delivery(monkeypatch):
+    monkeypatch.setattr(config, "FILE_SENT_MESSAGE", "")
+    monkeypatch.setattr(channel_health, "_channels", {})
+    # The primary tripped and its cooldown is over: the next ranking takes the probe
+    for _ in range(channel_health.failure_threshold):
+        channel_health.record_failure(config.PRIMARY_CHANNEL)
+    channel_health._stats(config.PRIMARY_CHANNEL).opened_at -= channel_health.cooldown_seconds
+
+    bot = FakeBot()
+    files = _files(3)
+    for i, file_data in enumerate(files):
+        file_data["backup_messages"] = [
+            {"channel_id": config.PRIMARY_CHANNEL, "message_id": file_data["message_id"]},
+            {"channel_id": -1002, "message_id": 200 + i}
+        ]
+
+    result = asyncio.run(deliver_files(bot, 42, files, {}, mode="copy"))
+
+    assert len(result["sent"]) == 3
+    # One run from one channel, not the first file split off onto the probe
+    assert [name for name, _ in bot.calls] == ["copy_messages"]
@@ -0,0 +1,57 @@
+"""
+Share-box by Univora - Import Job Tests
+"""
+
+import asyncio
+import config
+import utils.import_jobs as import_jobs
+from utils.import_jobs import ImportScheduler, _JobState
+
+class _App:
+    class bot:
+        @staticmethod
+        async def edit_message_text(**kwargs):
+            return True
+
+class FakeJobs:
+    """Stands in for adb, keeping the checkpoints it is sent"""
+
+    def __init__(self):
+        self.checkpoints = []
+
+    async def checkpoint_import_job(self, job_id, current_id, scanned, files, lease_seconds, skipped=None):
+        self.checkpoints.append({"current_id": current_id, "skipped": skipped})
+
+def _job():
+    return {
+        "_id": "job1", "chat_id": 1, "status_message_id": 2, "source_id": -100, "filters": ["all"],
+        "limit": "1000", "start_id": 1000, "target": 0, "current_id": 1000, "scanned": 0, "found": 0
+    }
+
+def test_failed_window_is_retried_then_skipped(monkeypatch):
+    async def broken_window(*args, **kwargs):
+        raise RuntimeError("channel unreachable")
+
+    jobs = FakeJobs()
+    monkeypatch.setattr(import_jobs, "adb", jobs)
+    monkeypatch.setattr(import_jobs, "scan_window", broken_window)
+    monkeypatch.setattr(config, "IMPORT_WINDOW_RETRIES", 2)
+    monkeypatch.setattr(config, "IMPORT_WINDOW_RETRY_BASE_SECONDS", 0)
+    monkeypatch.setattr(config, "IMPORT_BATCH_SIZE", 100)
+    monkeypatch.setattr(config, "IMPORT_CHECKPOINT_MESSAGES", 1)
+
+    scheduler = ImportScheduler()
+    scheduler._app = _App()
+    state = _JobState(_job())
+
+    async def run():
+        # Retries keep the job on the same window
+        for _ in range(config.IMPORT_WINDOW_RETRIES):
+            assert await scheduler._step(state) is False
+            assert state.current_id == 1000
+        # Out of retries, the window is skipped and recorded
+        assert await scheduler._step(state) is True
+
+    asyncio.run(run())
+    assert state.current_id == 900
+    assert jobs.checkpoints == [{"current_id": 900, "skipped": [[901, 1000]]}]
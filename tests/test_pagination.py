@@ -0,0 +1,36 @@
+"""
+Share-box by Univora - Link Page Callback Tests
+"""
+
+from datetime import datetime
+import pytz
+from utils.helpers import category_key, link_page_callback, parse_link_page_callback
+
+# Telegram rejects callback data longer than this many bytes
+CALLBACK_DATA_LIMIT = 64
+
+def _worst_case_link():
+    return {"link_id": "Zz-_Zz-_", "created_at": datetime(9999, 12, 31, 23, 59, 59, 999000, tzinfo=pytz.UTC)}
+
+def test_callback_data_fits_telegram_limit():
+    for prefix in ("links_page_", "edit_sel_page_"):
+        for direction in ("p", "n"):
+            data = link_page_callback(prefix, 999999, direction, _worst_case_link())
+            assert len(data.encode()) <= CALLBACK_DATA_LIMIT, data
+
+def test_callback_data_round_trips():
+    link = _worst_case_link()
+    cursor = parse_link_page_callback(link_page_callback("links_page_", 3, "n", link), "links_page_")
+    assert cursor["page"] == 3
+    assert cursor["before"] is None
+    assert cursor["after"] == (link["created_at"].replace(tzinfo=None), link["link_id"])
+
+def test_category_key_round_trips_within_the_limit():
+    key = category_key("🎬 Movies: Sci-Fi & Fantasy, the long director's cut")
+    data = link_page_callback("links_page_", 999999, "p", _worst_case_link(), key)
+    assert len(data.encode()) <= CALLBACK_DATA_LIMIT, data
+
+    cursor = parse_link_page_callback(data, "links_page_")
+    assert cursor["page"] == 999999
+    assert cursor["extra"] == key
+    assert cursor["before"][1] == "Zz-_Zz-_"
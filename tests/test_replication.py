@@ -0,0 +1,124 @@
+"""
+Share-box by Univora - Storage Replication Tests
+"""
+
+from telegram.error import BadRequest
+import asyncio
+import pytest
+import config
+import utils.replication as replication
+from utils.channel_health import channel_health
+from utils.replication import ReplicationQueue
+
+PRIMARY, BACKUP, THIRD = -1001, -1002, -1003
+
+class FakeJobs:
+    """Stands in for adb: a fixed under-replicated file and the jobs keyed on it"""
+
+    def __init__(self, copies):
+        self.copies = copies
+        self.jobs = {}
+        self.scanned_after = []
+
+    async def find_under_replicated_files(self, channels, after, limit):
+        self.scanned_after.append(after)
+        return [self.copies], "next-window"
+
+    async def enqueue_replication_jobs(self, source, targets, copies=None):
+        for target in targets:
+            key = (source["channel_id"], source["message_id"], target)
+            self.jobs.setdefault(key, copies)
+
+def test_rescans_keep_one_job_per_file_and_target(monkeypatch):
+    copies = [{"channel_id": BACKUP, "message_id": 7}, {"channel_id": PRIMARY, "message_id": 3}]
+    jobs = FakeJobs(copies)
+    monkeypatch.setattr(replication, "adb", jobs)
+    monkeypatch.setattr(config, "PRIMARY_CHANNEL", PRIMARY)
+    monkeypatch.setattr(config, "STORAGE_CHANNELS", [PRIMARY, BACKUP, THIRD])
+
+    queue = ReplicationQueue()
+    asyncio.run(queue.scan())
+    # Health ranking may now prefer the other copy; the job key must not move
+    jobs.copies = list(reversed(copies))
+    asyncio.run(queue.scan())
+
+    assert list(jobs.jobs) == [(PRIMARY, 3, THIRD)]
+    assert jobs.jobs[(PRIMARY, 3, THIRD)] == copies
+
+def test_scan_continues_from_the_last_window(monkeypatch):
+    jobs = FakeJobs([{"channel_id": PRIMARY, "message_id": 3}])
+    monkeypatch.setattr(replication, "adb", jobs)
+    monkeypatch.setattr(config, "STORAGE_CHANNELS", [PRIMARY, BACKUP])
+
+    queue = ReplicationQueue()
+    asyncio.run(queue.scan())
+    asyncio.run(queue.scan())
+
+    assert jobs.scanned_after == [None, "next-window"]
+
+class DeletedSourceBot:
+    """The stored message was deleted from its channel"""
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        raise BadRequest("Message to copy not found")
+
+def test_missing_source_message_is_charged_to_the_origin(monkeypatch):
+    monkeypatch.setattr(channel_health, "_channels", {})
+    monkeypatch.setattr(config, "STORAGE_CHANNELS", [PRIMARY, BACKUP])
+
+    queue = ReplicationQueue()
+    queue._bot = DeletedSourceBot()
+    job = {"source": {"channel_id": PRIMARY, "message_id": 3}, "target": BACKUP}
+    with pytest.raises(BadRequest):
+        asyncio.run(queue._replicate(job))
+
+    health = channel_health.snapshot()
+    assert health[PRIMARY]["failures"] == 1
+    assert BACKUP not in health
+
+class CopyingBot:
+    def __init__(self):
+        self.copies = 0
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        self.copies += 1
+        return type("Message", (), {"message_id": 100 + self.copies})()
+
+class FlakyRecording:
+    """Stands in for adb: recording the replica on links fails once"""
+
+    def __init__(self):
+        self.saved = {}
+        self.recorded = []
+
+    async def save_replication_copy(self, job_id, replica):
+        self.saved[job_id] = replica
+
+    async def add_file_replica(self, source_channel, source_message_id, replica):
+        if not self.recorded:
+            self.recorded.append(None)
+            raise ConnectionError("Connection reset")
+        self.recorded.append(replica)
+
+class NoSessions:
+    async def add_file_replica(self, source_channel, source_message_id, replica):
+        pass
+
+def test_failed_recording_is_retried_without_copying_again(monkeypatch):
+    monkeypatch.setattr(channel_health, "_channels", {})
+    monkeypatch.setattr(config, "STORAGE_CHANNELS", [PRIMARY, BACKUP])
+    jobs = FlakyRecording()
+    monkeypatch.setattr(replication, "adb", jobs)
+    monkeypatch.setattr(replication, "upload_sessions", NoSessions())
+
+    queue = ReplicationQueue()
+    queue._bot = CopyingBot()
+    job = {"_id": "j1", "source": {"channel_id": PRIMARY, "message_id": 3}, "target": BACKUP}
+    with pytest.raises(ConnectionError):
+        asyncio.run(queue._replicate(job))
+
+    # The retry claims the job as saved, with its replica
+    asyncio.run(queue._replicate({**job, "copied": jobs.saved["j1"]}))
+
+    assert queue._bot.copies == 1
+    assert jobs.recorded[-1] == {"channel_id": BACKUP, "message_id": 101}
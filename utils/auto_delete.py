@@ -0,0 +1,104 @@
+"""
+Share-box by Univora - Auto-Delete Scheduler
+Deletes delivered files once their time is up, backed by MongoDB
+"""
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden
+from typing import Dict, List
+import asyncio
+import config
+from database import adb
+from utils.rate_limiter import flood_control
+
+# Bot API limit for delete_messages
+DELETE_MESSAGES_LIMIT = 100
+
+class DeletionScheduler:
+    """Wakes once per tick and bulk-deletes every due message"""
+
+    def __init__(self):
+        self._task = None
+
+    def start(self, bot: Bot):
+        """Start the tick loop (call once the event loop runs)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(bot))
+
+    async def stop(self):
+        """Stop the tick loop; pending deletions stay in MongoDB"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def schedule(self, chat_id: int, message_ids: List[int], delay_seconds: int = None):
+        """Delete message_ids from chat_id after delay_seconds"""
+        delay = config.FILE_AUTO_DELETE_SECONDS if delay_seconds is None else delay_seconds
+        await adb.schedule_deletion(chat_id, message_ids, delay)
+
+    async def _run(self, bot: Bot):
+        while True:
+            try:
+                await self.process_due(bot)
+            except Exception as e:
+                print(f"⚠️  Auto-delete tick failed: {e}")
+            await asyncio.sleep(config.AUTO_DELETE_TICK_SECONDS)
+
+    async def process_due(self, bot: Bot):
+        """Delete everything that is due, a batch of entries at a time"""
+        while True:
+            entries = await adb.get_due_deletions(config.AUTO_DELETE_BATCH_SIZE)
+            if not entries:
+                return
+
+            # Merge entries per chat so each chat costs as few calls as possible
+            per_chat: Dict[int, List[int]] = {}
+            for entry in entries:
+                per_chat.setdefault(entry["chat_id"], []).extend(entry["message_ids"])
+
+            missed = await asyncio.gather(*(
+                self._delete_chat(bot, chat_id, message_ids)
+                for chat_id, message_ids in per_chat.items()
+            ))
+            retry = {chat_id: set(ids) for chat_id, ids in zip(per_chat, missed) if ids}
+
+            done = []
+            for entry in entries:
+                left = [m for m in entry["message_ids"] if m in retry.get(entry["chat_id"], ())]
+                if not left or not await self._retry_later(entry, left):
+                    done.append(entry["_id"])
+            await adb.remove_deletions(done)
+
+            if len(entries) < config.AUTO_DELETE_BATCH_SIZE:
+                return
+
+    async def _delete_chat(self, bot: Bot, chat_id: int, message_ids: List[int]) -> List[int]:
+        """Delete messages from a chat; returns those to try again later"""
+        missed = []
+        for i in range(0, len(message_ids), DELETE_MESSAGES_LIMIT):
+            chunk = message_ids[i:i + DELETE_MESSAGES_LIMIT]
+            try:
+                await flood_control.call(chat_id, lambda: bot.delete_messages(chat_id=chat_id, message_ids=chunk))
+            except (BadRequest, Forbidden) as e:
+                # Messages already gone or the user blocked the bot: nothing to retry
+                print(f"Failed to delete messages in {chat_id}: {e}")
+            except Exception as e:
+                # Network errors and flood waits beyond our retries
+                print(f"Will retry deleting messages in {chat_id}: {e}")
+                missed.extend(chunk)
+        return missed
+
+    async def _retry_later(self, entry: Dict, message_ids: List[int]) -> bool:
+        """Back off exponentially; False once the entry has used up its attempts"""
+        attempt = entry.get("attempt", 0) + 1
+        if attempt >= config.AUTO_DELETE_MAX_ATTEMPTS:
+            print(f"⚠️  Giving up deleting {len(message_ids)} messages in {entry['chat_id']}")
+            return False
+
+        delay = config.AUTO_DELETE_RETRY_BASE_SECONDS * (2 ** (attempt - 1))
+        await adb.retry_deletion(entry["_id"], message_ids, attempt, delay)
+        return True
+
+# Shared scheduler
+deletion_scheduler = DeletionScheduler()
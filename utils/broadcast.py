@@ -0,0 +1,191 @@
+"""
+Share-box by Univora - Broadcast Engine
+Sends a message to every user at a controlled rate, resuming after a restart
+"""
+
+from telegram import Bot
+from telegram.error import Forbidden, RetryAfter
+from typing import Dict, List
+import asyncio
+import time
+import config
+from database import adb
+from utils.rate_limiter import TokenBucket, flood_control, retry_after_seconds
+
+# Outcomes of a single send
+SENT = "sent"
+FAILED = "failed"
+BLOCKED = "blocked"
+
+class Broadcaster:
+    """Runs broadcasts page by page from MongoDB, checkpointing after every page"""
+
+    def __init__(self):
+        self._bot = None
+        self._runs: Dict[str, asyncio.Task] = {}
+        self._resume_task = None
+        self._budget = TokenBucket(config.BROADCAST_RATE, max(config.BROADCAST_RATE, 1.0))
+
+    def start(self, bot: Bot, resume: bool = True):
+        """Start resuming interrupted broadcasts (call once the event loop runs)"""
+        self._bot = bot
+        if resume and self._resume_task is None:
+            self._resume_task = asyncio.create_task(self._resume_loop())
+
+    async def stop(self):
+        """Stop all broadcasts; they continue from their last page on the next start"""
+        broadcast_ids = list(self._runs)
+        tasks = list(self._runs.values())
+        if self._resume_task:
+            tasks.append(self._resume_task)
+            self._resume_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            await adb.release_broadcasts(broadcast_ids)
+        except Exception as e:
+            print(f"⚠️  Could not release broadcasts: {e}")
+        self._runs.clear()
+
+    async def submit(self, admin_id: int, chat_id: int, status_message_id: int, text: str) -> Dict:
+        """Register a broadcast of text (Markdown) to every reachable user and start it"""
+        broadcast = await adb.create_broadcast({
+            "admin_id": admin_id,
+            "chat_id": chat_id,
+            "status_message_id": status_message_id,
+            "text": text
+        }, config.BROADCAST_LEASE_SECONDS)
+        self._launch(broadcast)
+        return broadcast
+
+    def _launch(self, broadcast: Dict):
+        broadcast_id = broadcast["_id"]
+        task = asyncio.create_task(self._run(broadcast))
+        self._runs[broadcast_id] = task
+        task.add_done_callback(lambda _: self._runs.pop(broadcast_id, None))
+
+    async def _resume_loop(self):
+        while True:
+            try:
+                while True:
+                    broadcast = await adb.claim_broadcast(config.BROADCAST_LEASE_SECONDS)
+                    if broadcast is None:
+                        break
+                    if broadcast["_id"] in self._runs:
+                        continue
+                    print(f"🔁 Resuming broadcast {broadcast['_id']} after user {broadcast['last_user_id']}")
+                    self._launch(broadcast)
+            except Exception as e:
+                print(f"⚠️  Could not resume broadcasts: {e}")
+            await asyncio.sleep(config.BROADCAST_RESUME_POLL_SECONDS)
+
+    # ==================== SENDING ====================
+
+    async def _send(self, user_id: int, text: str) -> str:
+        while True:
+            await self._budget.acquire()
+            try:
+                await flood_control.call(user_id, lambda: self._bot.send_message(
+                    chat_id=user_id,
+                    text=text,
+                    parse_mode="Markdown"
+                ))
+                return SENT
+            except RetryAfter as e:
+                # Still flood limited after retries: wait it out and try again
+                await asyncio.sleep(retry_after_seconds(e))
+            except Forbidden:
+                # Blocked the bot or deleted their account
+                return BLOCKED
+            except Exception:
+                return FAILED
+
+    async def _send_page(self, user_ids: List[int], text: str) -> Dict[str, int]:
+        slots = asyncio.Semaphore(config.BROADCAST_CONCURRENCY)
+
+        async def send(user_id: int) -> str:
+            async with slots:
+                return await self._send(user_id, text)
+
+        outcomes = await asyncio.gather(*(send(user_id) for user_id in user_ids))
+
+        blocked = [user_id for user_id, outcome in zip(user_ids, outcomes) if outcome == BLOCKED]
+        await adb.mark_users_bot_blocked(blocked)
+        return {outcome: outcomes.count(outcome) for outcome in (SENT, FAILED, BLOCKED)}
+
+    async def _run(self, broadcast: Dict):
+        text = f"📢 **Broadcast from {config.BOT_NAME}**\n\n{broadcast['text']}"
+        last_user_id = broadcast["last_user_id"]
+        totals = {outcome: broadcast.get(outcome, 0) for outcome in (SENT, FAILED, BLOCKED)}
+        last_progress = 0.0
+        lease = asyncio.create_task(self._hold_lease(broadcast, asyncio.current_task()))
+
+        try:
+            while True:
+                user_ids = await adb.get_broadcast_recipients(last_user_id, config.BROADCAST_PAGE_SIZE)
+                if not user_ids:
+                    break
+
+                counts = await self._send_page(user_ids, text)
+                last_user_id = user_ids[-1]
+                if not await adb.checkpoint_broadcast(broadcast, last_user_id, counts, config.BROADCAST_LEASE_SECONDS):
+                    print(f"⚠️  Broadcast {broadcast['_id']} was taken over, stopping")
+                    return
+                for outcome, count in counts.items():
+                    totals[outcome] += count
+
+                if time.monotonic() - last_progress >= config.BROADCAST_PROGRESS_INTERVAL_SECONDS:
+                    last_progress = time.monotonic()
+                    await self._edit_status(broadcast, "📢 **Broadcasting...**", totals)
+
+            await adb.finish_broadcast(broadcast["_id"])
+            await self._edit_status(broadcast, "✅ **Broadcast Complete!**", totals)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The lease runs out and the broadcast is resumed from its last page
+            print(f"⚠️  Broadcast {broadcast['_id']} interrupted: {e}")
+        finally:
+            lease.cancel()
+
+    async def _hold_lease(self, broadcast: Dict, run: asyncio.Task):
+        """
+        Renew the lease on a timer, however long a page takes, and cancel the run
+        once another process has claimed the broadcast so users are not sent it twice
+        """
+        while True:
+            await asyncio.sleep(config.BROADCAST_LEASE_SECONDS / 3)
+            try:
+                held = await adb.renew_broadcast_lease(broadcast, config.BROADCAST_LEASE_SECONDS)
+            except Exception as e:
+                # Retried next time; the lease still has two thirds to run
+                print(f"⚠️  Could not renew broadcast lease: {e}")
+                continue
+            if not held:
+                print(f"⚠️  Broadcast {broadcast['_id']} was taken over, stopping")
+                run.cancel()
+                return
+
+    async def _edit_status(self, broadcast: Dict, title: str, totals: Dict[str, int]):
+        try:
+            await self._bot.edit_message_text(
+                chat_id=broadcast["chat_id"],
+                message_id=broadcast["status_message_id"],
+                text=(
+                    f"{title}\n\n"
+                    f"📤 **Sent:** {totals[SENT]}\n"
+                    f"❌ **Failed:** {totals[FAILED]}\n"
+                    f"🚫 **Blocked:** {totals[BLOCKED]}\n"
+                    f"👥 **Total:** {sum(totals.values())}"
+                ),
+                parse_mode="Markdown"
+            )
+        except Exception:
+            # Ignore "Message not modified" or Rate Limits
+            pass
+
+# Shared broadcaster
+broadcaster = Broadcaster()
@@ -0,0 +1,183 @@
+"""
+Share-box by Univora - Storage Channel Health
+Success-rate and latency tracking with a circuit breaker per storage channel
+"""
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, NetworkError
+from typing import Awaitable, Callable, Dict, List, Optional
+import time
+import config
+from utils.rate_limiter import flood_control
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class _ChannelStats:
+    """Running health figures for one channel"""
+
+    def __init__(self):
+        self.success_rate = 1.0
+        self.latency = None
+        self.consecutive_failures = 0
+        self.total = 0
+        self.failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probe_started = None
+
+class ChannelHealth:
+    """Ranks storage channels and keeps failing ones out of rotation"""
+
+    def __init__(self, alpha: float, failure_threshold: int, cooldown_seconds: float):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._channels: Dict[int, _ChannelStats] = {}
+
+    def _stats(self, channel_id: int) -> _ChannelStats:
+        stats = self._channels.get(channel_id)
+        if stats is None:
+            stats = self._channels[channel_id] = _ChannelStats()
+        return stats
+
+    def _observe(self, stats: _ChannelStats, ok: bool, latency: float):
+        stats.total += 1
+        stats.success_rate += self.alpha * ((1.0 if ok else 0.0) - stats.success_rate)
+        if latency is not None:
+            if stats.latency is None:
+                stats.latency = latency
+            else:
+                stats.latency += self.alpha * (latency - stats.latency)
+
+    def record_success(self, channel_id: int, latency: float = None):
+        stats = self._stats(channel_id)
+        self._observe(stats, True, latency)
+        stats.consecutive_failures = 0
+        stats.state = CLOSED
+        stats.probe_started = None
+
+    def record_failure(self, channel_id: int, latency: float = None):
+        stats = self._stats(channel_id)
+        self._observe(stats, False, latency)
+        stats.failures += 1
+        stats.consecutive_failures += 1
+
+        # A failed probe re-opens the breaker for another cooldown
+        if stats.state == HALF_OPEN or stats.consecutive_failures >= self.failure_threshold:
+            stats.state = OPEN
+            stats.opened_at = time.monotonic()
+        stats.probe_started = None
+
+    def _take_probe(self, channel_id: int) -> bool:
+        """Let one request through to a tripped channel once its cooldown is over"""
+        stats = self._stats(channel_id)
+        now = time.monotonic()
+
+        if stats.state == OPEN and now - stats.opened_at >= self.cooldown_seconds:
+            stats.state = HALF_OPEN
+
+        # A probe that never reported back frees its slot after another cooldown
+        if stats.state == HALF_OPEN and (stats.probe_started is None or now - stats.probe_started >= self.cooldown_seconds):
+            stats.probe_started = now
+            return True
+        return False
+
+    def _score(self, channel_id: int) -> tuple:
+        stats = self._stats(channel_id)
+        latency = stats.latency if stats.latency is not None else 0.0
+        return (-round(stats.success_rate, 2), latency)
+
+    def rank(self, sources: List[Dict]) -> List[Dict]:
+        """
+        Order {"channel_id", "message_id"} sources healthiest first, leaving out
+        tripped channels (except one due probe) unless nothing else is left.
+        """
+        ordered = sorted(sources, key=lambda s: self._score(s["channel_id"]))
+        healthy = [s for s in ordered if self._stats(s["channel_id"]).state == CLOSED]
+
+        # A due probe goes first so a recovered channel rejoins quickly
+        for source in ordered:
+            if self._stats(source["channel_id"]).state != CLOSED and self._take_probe(source["channel_id"]):
+                return [source] + healthy
+
+        return healthy or ordered
+
+    def snapshot(self) -> Dict[int, Dict]:
+        """Health figures for the admin dashboard"""
+        return {
+            channel_id: {
+                "state": stats.state,
+                "success_rate": stats.success_rate,
+                "latency": stats.latency,
+                "total": stats.total,
+                "failures": stats.failures,
+                "consecutive_failures": stats.consecutive_failures
+            }
+            for channel_id, stats in self._channels.items()
+        }
+
+# ==================== ERROR BLAME ====================
+
+# Which side of a copy an error is about
+SOURCE = "source"
+TARGET = "target"
+
+# copy_message errors that can only be about the stored message
+_SOURCE_ERRORS = ("message to copy not found", "message can't be copied", "message_id_invalid")
+# Chat errors Telegram reports without saying which chat they are about
+_CHAT_ERRORS = ("chat not found", "channel_private")
+
+class CallTimer:
+    """Wraps a Bot API request to time only the call, not the wait for flood-control tokens"""
+
+    def __init__(self, request: Callable[[], Awaitable]):
+        self._request = request
+        self.elapsed = None
+
+    async def __call__(self):
+        started = time.monotonic()
+        try:
+            return await self._request()
+        finally:
+            self.elapsed = time.monotonic() - started
+
+async def blame_copy_error(bot: Bot, error: Exception, from_chat_id: int) -> Optional[str]:
+    """
+    SOURCE if a copy failed because of the chat it copied from, TARGET if because
+    of the chat it copied into, None for errors about neither (flood waits, bad
+    captions). Timeouts and network errors count as SOURCE: a degraded channel
+    shows up as slow or dropped copies. Ambiguous chat errors are settled by
+    checking whether from_chat_id is reachable.
+    """
+    text = str(error).lower()
+    if isinstance(error, BadRequest):
+        if any(marker in text for marker in _SOURCE_ERRORS):
+            return SOURCE
+        if not any(marker in text for marker in _CHAT_ERRORS):
+            return TARGET if "rights" in text else None
+    elif isinstance(error, Forbidden):
+        # Blocked or deactivated recipients: only users show up as "user"
+        if "user" in text:
+            return TARGET
+    elif isinstance(error, NetworkError):
+        return SOURCE
+    else:
+        return None
+
+    try:
+        await flood_control.call(from_chat_id, lambda: bot.get_chat(from_chat_id))
+    except (BadRequest, Forbidden):
+        return SOURCE
+    except Exception:
+        return None
+    return TARGET
+
+# Shared tracker for every delivery in this process
+channel_health = ChannelHealth(
+    alpha=config.CHANNEL_HEALTH_ALPHA,
+    failure_threshold=config.CHANNEL_FAILURE_THRESHOLD,
+    cooldown_seconds=config.CHANNEL_COOLDOWN_SECONDS
+)
@@ -0,0 +1,185 @@
+"""
+Share-box by Univora - Channel Import Scanner
+Inspects source channel posts a window of message IDs at a time
+"""
+
+from telegram import Bot, Message
+from telegram.error import RetryAfter
+from typing import Callable, Dict, List, Optional
+import asyncio
+import config
+from database import adb, primary_copy
+from utils.rate_limiter import TokenBucket, flood_control
+
+# Bot API limit for copy_messages / delete_messages
+BULK_LIMIT = 100
+
+# Share of the bot's API budget all imports in this process may use together,
+# so imports never crowd out deliveries to users
+import_budget = TokenBucket(config.IMPORT_GLOBAL_RATE, max(config.IMPORT_GLOBAL_RATE, 1.0))
+
+def share_import_budget(processes: int):
+    """Split the import budget when several processes share one bot token"""
+    global import_budget
+    rate = config.IMPORT_GLOBAL_RATE / max(processes, 1)
+    import_budget = TokenBucket(rate, max(rate, 1.0))
+
+async def _request(request: Callable, on_flood_wait: Callable[[float], None] = None):
+    """Bot API request against the primary channel, within the import budget"""
+    await import_budget.acquire()
+    return await flood_control.call(config.PRIMARY_CHANNEL, request, on_flood_wait=on_flood_wait)
+
+def file_info(message: Message) -> Optional[Dict]:
+    """File fields of a post, or None for posts without a supported file"""
+    if message.document:
+        media, file_type, default_name = message.document, 'document', "Document"
+    elif message.video:
+        media, file_type, default_name = message.video, 'video', "Video"
+    elif message.audio:
+        media, file_type, default_name = message.audio, 'audio', "Audio"
+    elif message.photo:
+        media, file_type, default_name = message.photo[-1], 'photo', "Photo.jpg"
+    else:
+        return None
+
+    return {
+        "file_id": media.file_id,
+        "file_unique_id": media.file_unique_id,
+        "file_name": getattr(media, "file_name", None) or default_name,
+        "file_size": media.file_size,
+        "file_type": file_type
+    }
+
+def matches_filters(info: Optional[Dict], filters: List[str]) -> bool:
+    if info is None:
+        return False
+    return 'all' in filters or info["file_type"] in filters
+
+async def _inspect(bot: Bot, source_id: int, message_id: int, on_flood_wait=None) -> Optional[Message]:
+    """Forward one post into the primary channel to read it; None if it is gone"""
+    try:
+        return await _request(lambda: bot.forward_message(
+            chat_id=config.PRIMARY_CHANNEL,
+            from_chat_id=source_id,
+            message_id=message_id
+        ), on_flood_wait)
+    except RetryAfter:
+        raise
+    except Exception:
+        # Deleted posts and service messages cannot be forwarded
+        return None
+
+async def _copy_clean(bot: Bot, source_id: int, message_ids: List[int], on_flood_wait=None) -> Dict[int, int]:
+    """
+    Copy posts without the forward tag or caption (stored copies are shared by
+    every link holding the file); returns {source message ID: stored message ID}
+    """
+    stored = {}
+    for i in range(0, len(message_ids), BULK_LIMIT):
+        chunk = message_ids[i:i + BULK_LIMIT]
+        copied = await _request(lambda: bot.copy_messages(
+            chat_id=config.PRIMARY_CHANNEL,
+            from_chat_id=source_id,
+            message_ids=chunk,
+            remove_caption=True
+        ), on_flood_wait)
+        if len(copied) == len(chunk):
+            stored.update(zip(chunk, (c.message_id for c in copied)))
+            continue
+
+        # Skipped posts are not reported: drop the partial copies and go one by one
+        await _delete(bot, [c.message_id for c in copied], on_flood_wait)
+        for message_id in chunk:
+            try:
+                single = await _request(lambda: bot.copy_message(
+                    chat_id=config.PRIMARY_CHANNEL,
+                    from_chat_id=source_id,
+                    message_id=message_id,
+                    caption=""
+                ), on_flood_wait)
+                stored[message_id] = single.message_id
+            except RetryAfter:
+                raise
+            except Exception:
+                pass
+    return stored
+
+async def _delete(bot: Bot, message_ids: List[int], on_flood_wait=None):
+    for i in range(0, len(message_ids), BULK_LIMIT):
+        chunk = message_ids[i:i + BULK_LIMIT]
+        try:
+            await _request(lambda: bot.delete_messages(
+                chat_id=config.PRIMARY_CHANNEL,
+                message_ids=chunk
+            ), on_flood_wait)
+        except Exception as e:
+            print(f"⚠️  Could not remove temporary import forwards: {e}")
+
+async def scan_window(
+    bot: Bot,
+    source_id: int,
+    message_ids: List[int],
+    filters: List[str],
+    concurrency: int = BULK_LIMIT,
+    on_flood_wait: Callable[[float], None] = None
+) -> List[Dict]:
+    """
+    Import the matching posts among message_ids. Up to `concurrency` posts
+    are inspected at once, matches not in the file index are copied with
+    copy_messages and the temporary forwards are removed with delete_messages.
+    Files come back newest first; on_flood_wait hears about every flood wait.
+    """
+    slots = asyncio.Semaphore(max(concurrency, 1))
+
+    async def inspect(message_id: int):
+        async with slots:
+            return await _inspect(bot, source_id, message_id, on_flood_wait)
+
+    results = await asyncio.gather(*(inspect(mid) for mid in message_ids), return_exceptions=True)
+    forwards = [r if isinstance(r, Message) else None for r in results]
+
+    try:
+        # Still flood-limited after retries: clean up and let the caller back off
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+        matches = {}
+        for message_id, forward in zip(message_ids, forwards):
+            info = file_info(forward) if forward else None
+            if matches_filters(info, filters):
+                matches[message_id] = info
+
+        # Files we already hold are reused rather than copied again
+        known = {
+            uid: sorted(entry["copies"], key=lambda c: c["channel_id"] != config.PRIMARY_CHANNEL)
+            for uid, entry in (await adb.find_stored_files([i["file_unique_id"] for i in matches.values()])).items()
+        }
+        to_copy = [mid for mid, info in matches.items() if info["file_unique_id"] not in known]
+
+        # copy_messages needs strictly increasing IDs
+        stored = await _copy_clean(bot, source_id, sorted(to_copy), on_flood_wait) if to_copy else {}
+    finally:
+        await _delete(bot, [f.message_id for f in forwards if f], on_flood_wait)
+
+    copied = {
+        message_id: {**matches[message_id], "backup_messages": [{"channel_id": config.PRIMARY_CHANNEL, "message_id": stored_id}]}
+        for message_id, stored_id in stored.items()
+    }
+    try:
+        await adb.index_stored_files(list(copied.values()))
+    except Exception as e:
+        print(f"⚠️  Could not index imported files: {e}")
+
+    files = []
+    for message_id in sorted(matches, reverse=True):
+        if message_id in copied:
+            file_data = copied[message_id]
+        elif matches[message_id]["file_unique_id"] in known:
+            file_data = {**matches[message_id], "backup_messages": known[matches[message_id]["file_unique_id"]]}
+        else:
+            continue  # Copy failed
+        # No primary copy: leave message_id out and let delivery read backup_messages
+        primary = primary_copy(file_data["backup_messages"])
+        files.append({"message_id": primary["message_id"], **file_data} if primary else file_data)
+    return files
@@ -0,0 +1,285 @@
+"""
+Share-box by Univora - File Delivery Engine
+Copies a link's files into a chat as fast as the flood limits allow
+"""
+
+from telegram import Bot, InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo
+from telegram.helpers import escape_markdown
+from typing import Callable, Dict, List, Optional, Tuple
+import time
+import config
+from utils.helpers import format_file_size, format_time_remaining
+from utils.channel_health import SOURCE, CallTimer, blame_copy_error, channel_health
+from utils.rate_limiter import flood_control
+
+# ==================== HELPERS ====================
+
+async def _request(chat_id: int, request: Callable):
+    """Rate-limited Bot API request"""
+    return await flood_control.call(chat_id, request)
+
+def _stored_copies(file_data: Dict) -> List[Dict]:
+    """Every stored copy of a file"""
+    # backup_messages lists every copy, the primary one included when it exists;
+    # files saved before backups were tracked live only in the primary channel
+    return file_data.get("backup_messages") or [{"channel_id": config.PRIMARY_CHANNEL, "message_id": file_data["message_id"]}]
+
+def _channel_order(files: List[Dict]) -> List[int]:
+    """
+    Storage channels holding the files, healthiest first, ranked once per
+    delivery so a due probe goes to one channel and every file agrees on it
+    """
+    # First-seen order, so ties keep the order copies were stored in
+    channels = dict.fromkeys(stored["channel_id"] for file_data in files for stored in _stored_copies(file_data))
+    return [source["channel_id"] for source in channel_health.rank([{"channel_id": c} for c in channels])]
+
+def _file_sources(file_data: Dict, order: List[int]) -> List[Dict]:
+    """Stored copies of a file in the delivery's channel order"""
+    copies = _stored_copies(file_data)
+    ranked = sorted((c for c in copies if c["channel_id"] in order), key=lambda c: order.index(c["channel_id"]))
+    # Every copy sits in a tripped channel: try them anyway
+    return ranked or copies
+
+class _SourceFailed(Exception):
+    """A copy failed because of the storage channel it read from"""
+
+async def _from_channel(bot: Bot, chat_id: int, channel_id: int, request: Callable):
+    """
+    Run a request that copies from a storage channel into chat_id and record how it went.
+    Only errors about the channel itself count against it; they raise _SourceFailed.
+    """
+    timed = CallTimer(request)
+    try:
+        result = await _request(chat_id, timed)
+    except Exception as e:
+        if await blame_copy_error(bot, e, channel_id) == SOURCE:
+            channel_health.record_failure(channel_id, timed.elapsed)
+            raise _SourceFailed(str(e)) from e
+        raise
+    channel_health.record_success(channel_id, timed.elapsed)
+    return result
+
+def _file_caption(file_data: Dict, link: Dict) -> str:
+    return config.FILE_SENT_MESSAGE.format(
+        brand=config.BRAND_NAME,
+        filename=escape_markdown(file_data['file_name'], version=1),
+        filesize=format_file_size(file_data['file_size']),
+        category=link.get('category', 'Others'),
+        time_left=format_time_remaining(config.FILE_AUTO_DELETE_SECONDS)
+    )
+
+def _shows_captions() -> bool:
+    """Whether delivered files carry FILE_SENT_MESSAGE (name, size, category)"""
+    return bool(config.FILE_SENT_MESSAGE.strip())
+
+async def _copy_file(bot: Bot, chat_id: int, file_data: Dict, link: Dict, order: List[int]):
+    """
+    Copy one file, falling back through its backup channels when a channel fails.
+    Recipient-side errors would fail from every channel and raise at once.
+    """
+    caption = _file_caption(file_data, link)
+    last_error = None
+
+    for source in _file_sources(file_data, order):
+        try:
+            return await _from_channel(bot, chat_id, source["channel_id"], lambda: bot.copy_message(
+                chat_id=chat_id,
+                from_chat_id=source["channel_id"],
+                message_id=source["message_id"],
+                caption=caption,
+                parse_mode="Markdown",
+                protect_content=link.get('protect_content', False)
+            ))
+        except _SourceFailed as e:
+            last_error = e.__cause__
+            continue  # Try next source
+
+    raise last_error or Exception("All channels failed")
+
+# ==================== BULK SENDS ====================
+
+# Bot API limits per call
+COPY_MESSAGES_LIMIT = 100
+MEDIA_GROUP_LIMIT = 10
+
+# Albums may only mix photos with videos; documents and audio group alone
+_ALBUM_KIND = {"photo": "visual", "video": "visual", "document": "document", "audio": "audio"}
+_INPUT_MEDIA = {
+    "photo": InputMediaPhoto,
+    "video": InputMediaVideo,
+    "document": InputMediaDocument,
+    "audio": InputMediaAudio
+}
+
+def _plan_batches(files: List[Dict], mode: str, order: List[int]) -> List[Tuple[str, List[Tuple[int, Dict, int]], int]]:
+    """
+    Split files into ordered batches of ("copy" | "album" | "single", [(file_number, file_data, message_id), ...], channel_id).
+    copy batches are runs from the healthiest channel with strictly increasing
+    message IDs, as copy_messages requires; album batches are runs of
+    compatible media types.
+    """
+    batches = []
+    run = []
+    run_key = None
+    limit = COPY_MESSAGES_LIMIT if mode == "copy" else MEDIA_GROUP_LIMIT
+
+    def close_run():
+        if len(run) > 1:
+            batches.append((mode, list(run), run_key if mode == "copy" else None))
+        elif run:
+            batches.append(("single", list(run), None))
+        run.clear()
+
+    for idx, file_data in enumerate(files, 1):
+        message_id = None
+        if mode == "copy":
+            source = _file_sources(file_data, order)[0]
+            key, message_id = source["channel_id"], source["message_id"]
+            continues = (
+                run and key == run_key and len(run) < limit
+                and message_id > run[-1][2]
+            )
+        else:
+            key = _ALBUM_KIND.get(file_data.get("file_type")) if file_data.get("file_id") else None
+            continues = run and key is not None and key == run_key and len(run) < limit
+
+        if not continues:
+            close_run()
+            run_key = key
+        run.append((idx, file_data, message_id))
+
+    close_run()
+    return batches
+
+async def _copy_batch(bot: Bot, chat_id: int, batch: List[Tuple[int, Dict, int]], channel_id: int, link: Dict) -> Optional[List[int]]:
+    """
+    Copy a run of files with one copy_messages call. Returns the new message IDs,
+    or None when Telegram skipped some of them and the run must be resent per file.
+    """
+    try:
+        copied = await _from_channel(bot, chat_id, channel_id, lambda: bot.copy_messages(
+            chat_id=chat_id,
+            from_chat_id=channel_id,
+            message_ids=[message_id for _, _, message_id in batch],
+            # Copies stored before captions were stripped still carry the uploader's
+            remove_caption=True,
+            protect_content=link.get('protect_content', False)
+        ))
+    except Exception as e:
+        print(f"Bulk copy failed, falling back to single sends: {e}")
+        return None
+
+    message_ids = [m.message_id for m in copied]
+    if len(message_ids) == len(batch):
+        return message_ids
+
+    # Skipped IDs are not reported, so drop the partial copy to keep the order intact
+    if message_ids:
+        try:
+            await _request(chat_id, lambda: bot.delete_messages(chat_id=chat_id, message_ids=message_ids))
+        except Exception:
+            pass
+    return None
+
+async def _send_album(bot: Bot, chat_id: int, batch: List[Tuple[int, Dict, int]], link: Dict) -> Optional[List[int]]:
+    """Send a run of files as one media group using their stored file_ids"""
+    media = [
+        _INPUT_MEDIA[file_data["file_type"]](
+            media=file_data["file_id"],
+            caption=_file_caption(file_data, link),
+            parse_mode="Markdown"
+        )
+        for _, file_data, _ in batch
+    ]
+    try:
+        sent = await _request(chat_id, lambda: bot.send_media_group(
+            chat_id=chat_id,
+            media=media,
+            protect_content=link.get('protect_content', False)
+        ))
+    except Exception as e:
+        print(f"Album send failed, falling back to single sends: {e}")
+        return None
+    return [m.message_id for m in sent]
+
+# ==================== DELIVERY ====================
+
+async def deliver_files(
+    bot: Bot,
+    chat_id: int,
+    files: List[Dict],
+    link: Dict,
+    should_stop: Optional[Callable[[], bool]] = None,
+    mode: str = None
+) -> Dict:
+    """
+    Send files in order with one progress message that is edited in place.
+    mode is "copy" (copy_messages, only without captions), "album" (send_media_group) or "single";
+    bulk modes fall back to single sends, with backup channels, for any batch that fails.
+    Returns {"sent": [message_id, ...], "failed": [file_number, ...], "stopped": bool}
+    """
+    total = len(files)
+    mode = mode or config.DELIVERY_MODE
+    # copy_messages cannot caption files, so it would drop FILE_SENT_MESSAGE
+    if mode == "copy" and _shows_captions():
+        mode = "album"
+    if mode not in ("copy", "album") or total < config.BULK_DELIVERY_MIN_FILES:
+        mode = "single"
+    result = {"sent": [], "failed": [], "stopped": False}
+
+    progress = None
+    progress_text = f"📤 Sending {total} files..."
+    try:
+        progress = await _request(chat_id, lambda: bot.send_message(chat_id=chat_id, text=progress_text))
+    except Exception as e:
+        print(f"Could not send progress message: {e}")
+    last_edit = time.monotonic()
+
+    order = _channel_order(files)
+    if mode == "single":
+        batches = [("single", [(idx, file_data, None)], None) for idx, file_data in enumerate(files, 1)]
+    else:
+        batches = _plan_batches(files, mode, order)
+
+    for kind, batch, channel_id in batches:
+        if should_stop and should_stop():
+            result["stopped"] = True
+            break
+
+        message_ids = None
+        if kind == "copy":
+            message_ids = await _copy_batch(bot, chat_id, batch, channel_id, link)
+        elif kind == "album":
+            message_ids = await _send_album(bot, chat_id, batch, link)
+
+        if message_ids is not None:
+            result["sent"].extend(message_ids)
+        else:
+            for idx, file_data, _ in batch:
+                try:
+                    message = await _copy_file(bot, chat_id, file_data, link, order)
+                    result["sent"].append(message.message_id)
+                except Exception as e:
+                    print(f"Error sending file: {e}")
+                    result["failed"].append(idx)
+
+        idx = batch[-1][0]
+
+        # Edits share the chat's budget, so keep them rare
+        if progress and idx < total and time.monotonic() - last_edit >= config.DELIVERY_PROGRESS_INTERVAL_SECONDS:
+            text = f"📤 Sending files {idx}/{total}..."
+            if text != progress_text:
+                try:
+                    await _request(chat_id, lambda: progress.edit_text(text))
+                    progress_text = text
+                except Exception:
+                    pass
+            last_edit = time.monotonic()
+
+    if progress:
+        try:
+            await _request(chat_id, progress.delete)
+        except Exception:
+            pass
+
+    return result
@@ -8,12 +8,12 @@ from telegram import Update
 from telegram.helpers import escape_markdown
 from telegram.ext import ContextTypes
 from datetime import datetime, timedelta
+import hashlib
 import re
 from typing import Optional, List
 import pytz
 import config
-from database import db
-import asyncio
+from database import adb
 
 # ==================== DECORATORS ====================
 
@@ -44,8 +44,8 @@ def user_check(func):
         if not user:
             return await func(update, context, *args, **kwargs)
             
-        # Create/Update user in DB (Async)
-        user_data = await asyncio.to_thread(db.create_user, user.id, user.username, user.first_name)
+        # Create/Update user in DB
+        user_data = await adb.create_user(user.id, user.username, user.first_name)
         
         # Check if blocked
         if user_data and user_data.get("is_blocked", False):
@@ -70,7 +70,7 @@ def premium_only(func):
         if user_id in config.ADMIN_IDS:
             return await func(update, context, *args, **kwargs)
         
-        if not db.is_user_premium(user_id):
+        if not await adb.is_user_premium(user_id):
             await update.message.reply_text(
                 "💎 **Premium Feature!**\n\n"
                 "This feature is only available for premium users.\n\n"
@@ -91,7 +91,7 @@ from telegram import BotCommand, BotCommandScopeChat
 
 async def update_user_menu(bot, user_id):
     """Update command menu for specific user based on plan"""
-    is_premium = db.is_user_premium(user_id)
+    is_premium = await adb.is_user_premium(user_id)
     is_admin = user_id in config.ADMIN_IDS
     
     # Base commands
@@ -240,6 +240,7 @@ def get_file_info(message) -> dict:
     file_data = {
         "file_type": None,
         "file_id": None,
+        "file_unique_id": None,
         "file_name": None,
         "file_size": 0,
         "mime_type": None
@@ -249,6 +250,7 @@ def get_file_info(message) -> dict:
         file_data.update({
             "file_type": "document",
             "file_id": message.document.file_id,
+            "file_unique_id": message.document.file_unique_id,
             "file_name": message.document.file_name or "document",
             "file_size": message.document.file_size or 0,
             "mime_type": message.document.mime_type
@@ -257,6 +259,7 @@ def get_file_info(message) -> dict:
         file_data.update({
             "file_type": "video",
             "file_id": message.video.file_id,
+            "file_unique_id": message.video.file_unique_id,
             "file_name": message.video.file_name or f"video_{message.video.file_id[:8]}.mp4",
             "file_size": message.video.file_size or 0,
             "mime_type": message.video.mime_type
@@ -265,6 +268,7 @@ def get_file_info(message) -> dict:
         file_data.update({
             "file_type": "audio",
             "file_id": message.audio.file_id,
+            "file_unique_id": message.audio.file_unique_id,
             "file_name": message.audio.file_name or message.audio.title or "audio.mp3",
             "file_size": message.audio.file_size or 0,
             "mime_type": message.audio.mime_type
@@ -274,6 +278,7 @@ def get_file_info(message) -> dict:
         file_data.update({
             "file_type": "photo",
             "file_id": photo.file_id,
+            "file_unique_id": photo.file_unique_id,
             "file_name": f"photo_{photo.file_id[:8]}.jpg",
             "file_size": photo.file_size or 0,
             "mime_type": "image/jpeg"
@@ -282,6 +287,7 @@ def get_file_info(message) -> dict:
         file_data.update({
             "file_type": "voice",
             "file_id": message.voice.file_id,
+            "file_unique_id": message.voice.file_unique_id,
             "file_name": f"voice_{message.voice.file_id[:8]}.ogg",
             "file_size": message.voice.file_size or 0,
             "mime_type": message.voice.mime_type
@@ -373,16 +379,53 @@ def create_pagination_data(
         "end_idx": end_idx
     }
 
+# Keyset cursors in callback data: "<prefix><page>:<n|p>:<created_at ms>:<link_id>[:<extra>]"
+_EPOCH = datetime(1970, 1, 1)
+
+def category_key(category: str) -> str:
+    """Short, stable stand-in for a category name in callback data"""
+    return hashlib.sha1(category.encode()).hexdigest()[:8]
+
+def link_page_callback(prefix: str, page: int, direction: str, link: dict, extra: str = None) -> str:
+    """
+    Callback data for the page before ("p", cursor = first link shown) or
+    after ("n", cursor = last link shown) the current one. Stays within the
+    64 bytes Telegram allows as long as `extra` is short (e.g. a category_key).
+    """
+    created_at = link["created_at"]
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(pytz.UTC).replace(tzinfo=None)
+    millis = (created_at - _EPOCH) // timedelta(milliseconds=1)
+    
+    data = f"{prefix}{page}:{direction}:{millis}:{link['link_id']}"
+    return f"{data}:{extra}" if extra else data
+
+def parse_link_page_callback(data: str, prefix: str) -> dict:
+    """Page number, keyset cursor and extra field of link_page_callback data"""
+    fields = data[len(prefix):].split(":")
+    if len(fields) < 4:
+        # Buttons from before keyset paging: start over
+        return {"page": 1, "after": None, "before": None, "extra": None}
+    
+    page, direction, millis, link_id = fields[:4]
+    cursor = (_EPOCH + timedelta(milliseconds=int(millis)), link_id)
+    return {
+        "page": int(page),
+        "after": cursor if direction == "n" else None,
+        "before": cursor if direction == "p" else None,
+        "extra": fields[4] if len(fields) > 4 else None
+    }
+
 # ==================== TIER CHECK HELPERS ====================
 
-def check_upload_limit(user_id: int, file_count: int, file_size: int) -> dict:
+async def check_upload_limit(user_id: int, file_count: int, file_size: int) -> dict:
     """Check if user can upload files based on their plan"""
     
     # Admins have no limits
     if user_id in config.ADMIN_IDS:
         return {"allowed": True}
         
-    plan = db.get_plan_details(user_id)
+    plan = await adb.get_plan_details(user_id)
     
     max_files = plan.get("max_files_per_link", 20)
     max_file_size = plan.get("max_file_size_bytes", 2 * 1024 * 1024 * 1024)
@@ -403,7 +446,7 @@ def check_upload_limit(user_id: int, file_count: int, file_size: int) -> dict:
         }
         
     # Check total storage
-    current_storage = db.get_user_storage_used(user_id)
+    current_storage = await adb.get_user_storage_used(user_id)
     if storage_limit < 999999999999 and (current_storage + file_size) > storage_limit:
         return {
             "allowed": False,
@@ -412,17 +455,17 @@ def check_upload_limit(user_id: int, file_count: int, file_size: int) -> dict:
         
     return {"allowed": True}
 
-def check_link_creation_limit(user_id: int) -> dict:
+async def check_link_creation_limit(user_id: int) -> dict:
     """Check if user can create new links"""
     
     if user_id in config.ADMIN_IDS:
         return {"allowed": True}
         
     # Check monthly limit
-    allowed = db.check_monthly_limit(user_id)
+    allowed = await adb.check_monthly_limit(user_id)
     
     if not allowed:
-        plan = db.get_plan_details(user_id)
+        plan = await adb.get_plan_details(user_id)
         limit = plan.get("max_active_links", 10)
         return {
             "allowed": False,
@@ -433,14 +476,14 @@ def check_link_creation_limit(user_id: int) -> dict:
 
 # ==================== ANALYTICS HELPERS ====================
 
-def format_user_stats(user_id: int) -> str:
+async def format_user_stats(user_id: int) -> str:
     """Format user statistics message with detailed dashboard"""
-    user = db.get_user(user_id)
+    user = await adb.get_user(user_id)
     if not user:
         return "❌ User not found"
         
-    plan = db.get_plan_details(user_id)
-    stats = db.get_user_stats(user_id)
+    plan = await adb.get_plan_details(user_id)
+    stats = await adb.get_user_stats(user_id)
     
     plan_name = plan.get("name", "Free Tier").upper()
     expiry = user.get("premium_expiry")
@@ -0,0 +1,314 @@
+"""
+Share-box by Univora - Import Jobs
+Channel imports as checkpointed MongoDB jobs, scheduled fairly on a shared worker pool
+"""
+
+from telegram.error import RetryAfter
+from telegram.ext import Application
+from telegram.helpers import escape_markdown
+from collections import deque
+from typing import Dict, List
+import asyncio
+import config
+from database import adb, IMPORT_COMPLETED, IMPORT_FAILED
+from utils.channel_import import scan_window
+from utils.rate_limiter import retry_after_seconds
+from utils.sessions import upload_sessions, UPLOAD
+
+def import_progress(job: Dict) -> int:
+    """Percent of the job's ID range scanned (0 for open-ended 'all' imports)"""
+    if job["limit"] == 'all':
+        return 0
+    total = job["start_id"] - job["target"]
+    return min(100, int(job["scanned"] / total * 100)) if total > 0 else 100
+
+class _JobState:
+    """A job's in-memory position between checkpoints"""
+
+    def __init__(self, job: Dict):
+        self.job = job
+        self.current_id = job["current_id"]
+        self.scanned = job["scanned"]
+        self.found = job["found"]
+        self.unsaved_files: List[Dict] = []
+        self.unsaved_ids = 0
+        self.unsaved_skipped: List[List[int]] = []
+        self.window_failures = 0
+        self.concurrency = config.IMPORT_INITIAL_CONCURRENCY
+        self.flood_waits = 0
+
+    @property
+    def premium(self) -> bool:
+        return self.job.get("premium", False)
+
+    def progress(self) -> Dict:
+        return {**self.job, "current_id": self.current_id, "scanned": self.scanned, "found": self.found}
+
+class ImportScheduler:
+    """
+    Fixed pool of workers shared by every import in this process. Jobs take
+    turns one window at a time, premium jobs get IMPORT_PREMIUM_WEIGHT turns
+    for each regular one, and each job's inspection concurrency adapts to
+    the flood waits it runs into (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self):
+        self._app = None
+        self._shard = None
+        self._jobs: Dict[str, _JobState] = {}
+        self._ready = {True: deque(), False: deque()}
+        self._premium_turns = 0
+        self._wake = asyncio.Event()
+        self._tasks = []
+
+    def start(self, application: Application, shard: tuple = None):
+        """
+        Start the workers and the resume loop (call once the event loop runs).
+        With shard=(index, count) only jobs of users this worker owns are resumed.
+        """
+        if self._tasks:
+            return
+        self._app = application
+        self._shard = shard
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(config.IMPORT_WORKERS)]
+        self._tasks.append(asyncio.create_task(self._resume_loop()))
+
+    async def stop(self):
+        """Checkpoint and release all jobs; they resume on the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        try:
+            for state in self._jobs.values():
+                if state.unsaved_ids:
+                    await self._checkpoint(state)
+            await adb.release_import_jobs(list(self._jobs))
+        except Exception as e:
+            print(f"⚠️  Could not release import jobs: {e}")
+        self._jobs.clear()
+        for queue in self._ready.values():
+            queue.clear()
+
+    async def submit(
+        self, user_id: int, chat_id: int, status_message_id: int, source_id: int,
+        source_title: str, filters: List[str], start_id: int, limit
+    ) -> Dict:
+        """Register a new import and queue it for scanning downwards from start_id"""
+        limit_val = int(limit) if limit != 'all' else 5000
+        premium = user_id in config.ADMIN_IDS or await adb.is_user_premium(user_id)
+        job = await adb.create_import_job({
+            "user_id": user_id,
+            "chat_id": chat_id,
+            "status_message_id": status_message_id,
+            "source_id": source_id,
+            "source_title": source_title,
+            "filters": filters,
+            "limit": limit,
+            "premium": premium,
+            "start_id": start_id,
+            "target": max(start_id - limit_val, 1),
+            "current_id": start_id
+        }, config.IMPORT_LEASE_SECONDS)
+        self._add(job)
+        return job
+
+    def _add(self, job: Dict):
+        state = _JobState(job)
+        self._jobs[job["_id"]] = state
+        self._enqueue(state)
+
+    def _enqueue(self, state: _JobState):
+        # Jobs dropped by stop() in the meantime stay out
+        if state.job["_id"] in self._jobs:
+            self._ready[state.premium].append(state)
+            self._wake.set()
+
+    def _next(self) -> _JobState:
+        """Round-robin within each class, premium first IMPORT_PREMIUM_WEIGHT times in a row"""
+        premium, regular = self._ready[True], self._ready[False]
+        if premium and (not regular or self._premium_turns < config.IMPORT_PREMIUM_WEIGHT):
+            self._premium_turns += 1
+            return premium.popleft()
+        self._premium_turns = 0
+        return regular.popleft()
+
+    async def _resume_loop(self):
+        while True:
+            try:
+                while True:
+                    job = await adb.claim_import_job(config.IMPORT_LEASE_SECONDS, self._shard)
+                    if job is None:
+                        break
+                    # Our own job, just waiting for its turn
+                    if job["_id"] in self._jobs:
+                        continue
+                    print(f"🔁 Resuming import {job['_id']} at message {job['current_id']}")
+                    self._add(job)
+            except Exception as e:
+                print(f"⚠️  Could not resume import jobs: {e}")
+            await asyncio.sleep(config.IMPORT_RESUME_POLL_SECONDS)
+
+    # ==================== SCANNING ====================
+
+    async def _worker(self):
+        while True:
+            if not self._ready[True] and not self._ready[False]:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+
+            state = self._next()
+            try:
+                if await self._step(state):
+                    self._enqueue(state)
+            except asyncio.CancelledError:
+                # The job stays registered, so stop() still checkpoints it
+                raise
+            except Exception as e:
+                await self._fail(state, e)
+
+    async def _step(self, state: _JobState) -> bool:
+        """Scan the job's next window; False once the job is finished"""
+        job = state.job
+        if state.current_id <= job["target"]:
+            await self._finish(state)
+            return False
+
+        window_start = max(job["target"] + 1, state.current_id - config.IMPORT_BATCH_SIZE + 1)
+        window = list(range(window_start, state.current_id + 1))
+
+        def on_flood_wait(seconds: float):
+            state.flood_waits += 1
+
+        state.flood_waits = 0
+        try:
+            files = await scan_window(
+                self._app.bot, job["source_id"], window, job["filters"],
+                concurrency=state.concurrency, on_flood_wait=on_flood_wait
+            )
+        except RetryAfter as e:
+            # Flood limited even after retries: sit out, then rescan the window
+            state.concurrency = 1
+            asyncio.get_running_loop().call_later(retry_after_seconds(e), self._enqueue, state)
+            return False
+        except Exception as e:
+            state.window_failures += 1
+            print(f"Import window {window_start}-{state.current_id} failed ({state.window_failures}): {e}")
+            if state.window_failures <= config.IMPORT_WINDOW_RETRIES:
+                # Rescan the same window after a backoff
+                delay = config.IMPORT_WINDOW_RETRY_BASE_SECONDS * (2 ** (state.window_failures - 1))
+                asyncio.get_running_loop().call_later(delay, self._enqueue, state)
+                return False
+            # Out of retries: move on, the range is reported when the import completes
+            state.unsaved_skipped.append([window_start, state.current_id])
+            files = []
+        state.window_failures = 0
+
+        # AIMD: back off hard on flood waits, probe upwards while it stays clean
+        if state.flood_waits:
+            state.concurrency = max(1, state.concurrency // 2)
+        else:
+            state.concurrency = min(config.IMPORT_MAX_CONCURRENCY, state.concurrency + 1)
+
+        state.unsaved_files.extend(files)
+        state.unsaved_ids += len(window)
+        state.found += len(files)
+        state.scanned += len(window)
+        state.current_id = window_start - 1
+
+        if state.current_id <= job["target"]:
+            await self._finish(state)
+            return False
+
+        if state.unsaved_ids >= config.IMPORT_CHECKPOINT_MESSAGES:
+            await self._checkpoint(state)
+
+        await self._show_progress(state.progress())
+        return True
+
+    async def _checkpoint(self, state: _JobState):
+        await adb.checkpoint_import_job(
+            state.job["_id"], state.current_id, state.scanned, state.unsaved_files, config.IMPORT_LEASE_SECONDS,
+            state.unsaved_skipped
+        )
+        state.unsaved_files, state.unsaved_ids, state.unsaved_skipped = [], 0, []
+
+    async def _finish(self, state: _JobState):
+        job_id = state.job["_id"]
+        await self._checkpoint(state)
+        await self._hand_over(await adb.get_import_job(job_id))
+        await adb.finish_import_job(job_id, IMPORT_COMPLETED)
+        self._jobs.pop(job_id, None)
+
+    async def _fail(self, state: _JobState, error: Exception):
+        job = state.job
+        self._jobs.pop(job["_id"], None)
+        print(f"Import Error: {error}")
+        try:
+            await adb.finish_import_job(job["_id"], IMPORT_FAILED, str(error))
+            await self._app.bot.send_message(job["chat_id"], f"⚠️ Import Error: {error}")
+        except Exception:
+            pass
+
+    async def _edit_status(self, job: Dict, text: str):
+        try:
+            await self._app.bot.edit_message_text(
+                chat_id=job["chat_id"],
+                message_id=job["status_message_id"],
+                text=text,
+                parse_mode="Markdown"
+            )
+        except Exception:
+            # Ignore "Message not modified" or Rate Limits
+            pass
+
+    async def _show_progress(self, job: Dict):
+        percent = import_progress(job)
+        limit_val = job["start_id"] - job["target"]
+
+        # Bar: [██████░░░░]
+        filled = int(percent / 10)
+        bar = "▓" * filled + "░" * (10 - filled)
+
+        await self._edit_status(job, (
+            f"📥 **Importing Files...**\n"
+            f"`[{bar}] {percent}%`\n\n"
+            f"📂 **Scanned:** {job['scanned']}/{limit_val}\n"
+            f"✅ **Found:** {job['found']}\n"
+            f"📉 **Current ID:** `{job['current_id']}`"
+        ))
+
+    async def _hand_over(self, job: Dict):
+        """Continue with the normal link flow: the user names the imported files"""
+        skipped = ", ".join(f"{first}-{last}" for first, last in job.get("skipped", []))
+        skipped_note = f"\n\n⚠️ **Could not read message IDs:** {skipped}" if skipped else ""
+
+        if not job["files"]:
+            await self._edit_status(
+                job, f"❌ **Import Failed**\nNo matching files found in the scanned range.{skipped_note}"
+            )
+            return
+
+        user_id = job["user_id"]
+        await upload_sessions.start(UPLOAD, user_id, files=job["files"])
+
+        # Set state for naming (the job may have outlived the handler's context)
+        suggested_name = job.get("source_title") or 'Imported Files'
+        user_data = self._app.user_data[user_id]
+        user_data['awaiting_link_name'] = True
+        user_data['default_link_name'] = f"Imported: {suggested_name}"
+        self._app.mark_data_for_update_persistence(user_ids=user_id)
+
+        safe_name = escape_markdown(suggested_name, version=1)
+        await self._edit_status(job, (
+            f"✅ **Import Complete!**\n\n"
+            f"📦 **{job['found']} Files Ready.**{skipped_note}\n\n"
+            f"✏️ **Name your Link:**\n"
+            f"Enter a name for this collection.\n\n"
+            f"Type /skip to use default:\n`Imported: {safe_name}`"
+        ))
+
+# Shared scheduler
+import_jobs = ImportScheduler()
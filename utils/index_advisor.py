@@ -0,0 +1,168 @@
+"""
+Share-box by Univora - Index Advisor
+Explains the bot's hot query shapes and reports plans and indexes worth a look
+
+Usage:
+    python -m utils.index_advisor
+
+Also runs once at startup with INDEX_ADVISOR_ON_STARTUP=true.
+"""
+
+from datetime import datetime
+from typing import Dict, List
+import sys
+import pytz
+from database import (
+    db, active_link_query, link_page_pipeline, link_search_pipeline,
+    BROADCAST_RUNNING, IMPORT_RUNNING
+)
+
+# Plan stages that mean the query is not served by an index alone
+COLLSCAN = "COLLSCAN"
+IN_MEMORY_SORT = "SORT"
+INTERSECTION = ("AND_HASH", "AND_SORTED")
+
+# ==================== QUERY SHAPES ====================
+
+def _find(collection: str, filter: Dict, sort: Dict = None) -> Dict:
+    command = {"find": collection, "filter": filter}
+    if sort:
+        command["sort"] = sort
+    return command
+
+def _count(collection: str, query: Dict) -> Dict:
+    return {"count": collection, "query": query}
+
+def _aggregate(collection: str, pipeline: List[Dict]) -> Dict:
+    return {"aggregate": collection, "pipeline": pipeline, "cursor": {}}
+
+def query_shapes() -> Dict[str, Dict]:
+    """Hot queries as explain commands, with placeholder values of the right types"""
+    now = datetime.now(pytz.UTC)
+    cursor = (now, "AbC12XyZ")
+    stored = {"channel_id": -100, "message_id": 1}
+    return {
+        "get_link": _find("links", active_link_query("AbC12XyZ")),
+        "link list page": _aggregate("links", link_page_pipeline(1, None, 5)),
+        "link list next page": _aggregate("links", link_page_pipeline(1, None, 5, after=cursor)),
+        "link list by category": _aggregate("links", link_page_pipeline(1, "🎬 Movies", 5, before=cursor)),
+        "link count": _count("links", {"admin_id": 1, "is_active": True}),
+        "link search": _aggregate("links", link_search_pipeline(1, "holiday pics", 10)),
+        "dashboard links": _find(
+            "links", {"$or": [{"user_id": 1}, {"admin_id": 1}]}, sort={"created_at": -1}
+        ),
+        "expired links": _find("links", {"expires_at": {"$lte": now}, "is_active": True}),
+        "scheduled deactivations": _find("links", {"scheduled_deactivation": {"$lte": now}, "is_active": True}),
+        "scheduled activations": _find("links", {
+            "scheduled_activation": {"$lte": now},
+            "$or": [{"expires_at": None}, {"expires_at": {"$gt": now}}],
+            "is_active": False
+        }),
+        "links holding a stored copy": _find(
+            "links", {"files": {"$elemMatch": {"backup_messages": {"$elemMatch": stored}}}}
+        ),
+        "user": _find("users", {"user_id": 1}),
+        "user by referral code": _find("users", {"referral_code": "ABC123"}),
+        "broadcast recipients": _find(
+            "users", {"user_id": {"$gt": 0}, "is_blocked": False, "bot_blocked": {"$ne": True}},
+            sort={"user_id": 1}
+        ),
+        "completed referrals": _count("referrals", {"referrer_id": 1, "status": "completed"}),
+        "due deletions": _find("deletions", {"due_at": {"$lte": now}}, sort={"due_at": 1}),
+        "due replication job": _find(
+            "replication_jobs", {"next_attempt_at": {"$lte": now}}, sort={"next_attempt_at": 1}
+        ),
+        "stored file copies": _find("file_index", {"copies": stored}),
+        "resumable import job": _find(
+            "import_jobs", {"status": IMPORT_RUNNING, "lease_until": {"$lte": now}}, sort={"lease_until": 1}
+        ),
+        "user import jobs": _find("import_jobs", {"user_id": 1}, sort={"created_at": -1}),
+        "resumable broadcast": _find(
+            "broadcasts", {"status": BROADCAST_RUNNING, "lease_until": {"$lte": now}}, sort={"lease_until": 1}
+        ),
+    }
+
+# ==================== PLANS ====================
+
+def _plan_stages(node, stages: List[Dict]):
+    """Collect every stage of every winning plan in an explain document"""
+    if isinstance(node, dict):
+        if "stage" in node:
+            stages.append(node)
+        for key, value in node.items():
+            # Rejected plans were not run
+            if key != "rejectedPlans":
+                _plan_stages(value, stages)
+    elif isinstance(node, list):
+        for item in node:
+            _plan_stages(item, stages)
+
+def explain_shape(command: Dict) -> Dict:
+    """Winning plan summary of one query shape: indexes used and problems found"""
+    explained = db.db.command("explain", command, verbosity="queryPlanner")
+    stages = []
+    _plan_stages(explained, stages)
+
+    problems = []
+    names = {stage["stage"] for stage in stages}
+    if COLLSCAN in names:
+        problems.append("collection scan")
+    if IN_MEMORY_SORT in names:
+        problems.append("in-memory sort")
+    if names & set(INTERSECTION):
+        problems.append("index intersection")
+
+    indexes = sorted({stage["indexName"] for stage in stages if stage.get("indexName")})
+    return {"indexes": indexes, "problems": problems}
+
+# ==================== INDEX USAGE ====================
+
+def unused_indexes() -> Dict[str, List[str]]:
+    """Indexes with no recorded use since the server last started, per collection"""
+    unused = {}
+    for collection in sorted(db.db.list_collection_names()):
+        if collection.startswith("system."):
+            continue
+        for index in db.db[collection].aggregate([{"$indexStats": {}}]):
+            if index["name"] != "_id_" and index["accesses"]["ops"] == 0:
+                unused.setdefault(collection, []).append(index["name"])
+    return unused
+
+# ==================== REPORT ====================
+
+def run_advisor() -> int:
+    """Print the advisor report; returns the number of query shapes with problems"""
+    flagged = 0
+    print("🔎 Index advisor: query plans")
+    for name, command in query_shapes().items():
+        try:
+            result = explain_shape(command)
+        except Exception as e:
+            print(f"   ⚠️  {name}: explain failed: {e}")
+            flagged += 1
+            continue
+
+        indexes = ", ".join(result["indexes"]) or "no index"
+        if result["problems"]:
+            flagged += 1
+            print(f"   ❌ {name}: {', '.join(result['problems'])} ({indexes})")
+        else:
+            print(f"   ✅ {name}: {indexes}")
+
+    try:
+        unused = unused_indexes()
+    except Exception as e:
+        print(f"⚠️  Could not read index usage: {e}")
+        unused = {}
+
+    if unused:
+        # $indexStats counters reset on restart: judge them on a long-running server
+        print("🔎 Index advisor: unused indexes (since the server started)")
+        for collection, names in unused.items():
+            print(f"   💤 {collection}: {', '.join(names)}")
+
+    print(f"🔎 Index advisor: {flagged} query shape(s) need attention")
+    return flagged
+
+if __name__ == '__main__':
+    sys.exit(1 if run_advisor() else 0)
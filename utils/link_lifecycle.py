@@ -0,0 +1,63 @@
+"""
+Share-box by Univora - Link Lifecycle
+Deactivates expired links and applies scheduled activations in the background
+"""
+
+from datetime import datetime
+from typing import Awaitable, Callable, Dict
+import asyncio
+import pytz
+import config
+from database import adb
+
+class LinkLifecycle:
+    """Sweeps the links collection once per interval, a batch of links at a time"""
+
+    def __init__(self):
+        self._task = None
+
+    def start(self):
+        """Start the sweep loop (call once the event loop runs)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the sweep loop; whatever is left is picked up on the next start"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                counts = await self.sweep()
+                if any(counts.values()):
+                    print(
+                        f"🔗 Links: {counts['expired']} expired, "
+                        f"{counts['deactivated']} deactivated, {counts['activated']} activated"
+                    )
+            except Exception as e:
+                print(f"⚠️  Link sweep failed: {e}")
+            await asyncio.sleep(config.LINK_SWEEP_INTERVAL_SECONDS)
+
+    async def sweep(self) -> Dict[str, int]:
+        """Apply every expiry and schedule that is due"""
+        now = datetime.now(pytz.UTC)
+        return {
+            "expired": await self._drain(adb.expire_links, now),
+            "deactivated": await self._drain(adb.apply_scheduled_deactivations, now),
+            "activated": await self._drain(adb.apply_scheduled_activations, now)
+        }
+
+    async def _drain(self, switch: Callable[[datetime, int], Awaitable[int]], now: datetime) -> int:
+        # Batches until one comes back short
+        total = 0
+        while True:
+            count = await switch(now, config.LINK_SWEEP_BATCH_SIZE)
+            total += count
+            if count < config.LINK_SWEEP_BATCH_SIZE:
+                return total
+
+# Shared lifecycle sweeper
+link_lifecycle = LinkLifecycle()
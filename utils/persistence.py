@@ -0,0 +1,105 @@
+"""
+Share-box by Univora - Conversation State Persistence
+Keeps context.user_data in MongoDB so multi-step flows survive restarts
+"""
+
+from telegram.ext import BasePersistence, PersistenceInput
+from typing import Dict, Optional
+import asyncio
+import copy
+from database import adb
+
+class MongoPersistence(BasePersistence):
+    """
+    user_data backed by the user_state collection. PTB hands over changed
+    users once per update_interval; each such cycle becomes one bulk write.
+    """
+
+    def __init__(self, update_interval: float, shard: tuple = None):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        # (index, count): load only the users this webhook worker owns
+        self.shard = shard
+        self._pending: Dict[int, Optional[Dict]] = {}
+        self._write_task = None
+        self._write_lock = asyncio.Lock()
+
+    # ==================== LOADING ====================
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        return await adb.load_user_states(self.shard)
+
+    async def get_chat_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def get_bot_data(self) -> Dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    # ==================== WRITES ====================
+
+    def _queue(self, user_id: int, data: Optional[Dict]):
+        # Snapshot now: handlers keep mutating the live dict
+        self._pending[user_id] = copy.deepcopy(data) if data is not None else None
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_pending())
+
+    async def _write_pending(self):
+        # Yield once so the rest of this persistence cycle joins the batch
+        await asyncio.sleep(0)
+        async with self._write_lock:
+            while self._pending:
+                batch, self._pending = self._pending, {}
+                try:
+                    await adb.save_user_states(batch)
+                except Exception as e:
+                    print(f"⚠️  Could not save conversation state: {e}")
+                    # Retry with the next cycle, keeping snapshots taken meanwhile
+                    for user_id, data in batch.items():
+                        self._pending.setdefault(user_id, data)
+                    return
+
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        self._queue(user_id, data)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._queue(user_id, None)
+
+    async def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        pass
+
+    # Updates for a user are always handled by the same process, so the
+    # in-memory copy is authoritative and needs no refresh from MongoDB
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Write everything still pending (called by PTB on shutdown)"""
+        if self._write_task:
+            await asyncio.gather(self._write_task, return_exceptions=True)
+        await self._write_pending()
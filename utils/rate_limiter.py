@@ -0,0 +1,148 @@
+"""
+Share-box by Univora - Telegram Flood Control
+Token buckets for the Bot API's global and per-chat send limits
+"""
+
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, TypeVar
+from telegram.error import RetryAfter
+import asyncio
+import time
+import config
+
+T = TypeVar("T")
+
+# ==================== TOKEN BUCKET ====================
+
+class TokenBucket:
+    """Async token bucket; waiters are served in arrival order"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def block(self, seconds: float):
+        """Pause the bucket, e.g. after a RetryAfter from Telegram"""
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        self._tokens = 0
+        self._updated = max(self._updated, self._blocked_until)
+
+    async def acquire(self, tokens: float = 1.0):
+        """Wait until `tokens` are available and take them"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+# ==================== FLOOD CONTROL ====================
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """RetryAfter.retry_after is an int or a timedelta depending on PTB version"""
+    value = error.retry_after
+    if hasattr(value, "total_seconds"):
+        return value.total_seconds()
+    return float(value)
+
+class FloodControl:
+    """Shared global bucket plus one bucket per chat, with a cap on requests in flight"""
+
+    def __init__(
+        self,
+        global_rate: float,
+        chat_rate: float,
+        chat_burst: float,
+        max_inflight: int,
+        max_chats: int = 10000,
+        storage_chats: Iterable[int] = (),
+        storage_rate: float = None,
+        storage_burst: float = None
+    ):
+        self.global_bucket = TokenBucket(global_rate, max(global_rate, 1.0))
+        self._inflight = asyncio.Semaphore(max_inflight)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        # Our own storage channels are not bound by the per-user chat limit
+        self.storage_chats = set(storage_chats)
+        self.storage_rate = storage_rate or chat_rate
+        self.storage_burst = storage_burst or chat_burst
+        self.max_chats = max_chats
+        self._chats = OrderedDict()
+
+    def share_global_rate(self, processes: int):
+        """Split the global limit when several processes share one bot token"""
+        rate = self.global_bucket.rate / max(processes, 1)
+        self.global_bucket = TokenBucket(rate, max(rate, 1.0))
+
+    def chat_bucket(self, chat_id: int) -> TokenBucket:
+        """Bucket for a chat, evicting the least recently used one when full"""
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if chat_id in self.storage_chats:
+                bucket = TokenBucket(self.storage_rate, self.storage_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def call(
+        self,
+        chat_id: int,
+        request: Callable[[], Awaitable[T]],
+        retries: int = None,
+        on_flood_wait: Callable[[float], None] = None
+    ) -> T:
+        """
+        Run a Bot API request within both limits, retrying on RetryAfter.
+        on_flood_wait(seconds) is told about every flood wait Telegram imposes.
+        """
+        retries = config.TELEGRAM_MAX_RETRIES if retries is None else retries
+        bucket = self.chat_bucket(chat_id)
+
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                # Slots are only held while the request is on the wire
+                async with self._inflight:
+                    return await request()
+            except RetryAfter as e:
+                if on_flood_wait:
+                    on_flood_wait(retry_after_seconds(e))
+                attempt += 1
+                if attempt > retries:
+                    raise
+                bucket.block(retry_after_seconds(e))
+
+# Shared by every sender in this process
+flood_control = FloodControl(
+    global_rate=config.TELEGRAM_GLOBAL_RATE,
+    chat_rate=config.TELEGRAM_CHAT_RATE,
+    chat_burst=config.TELEGRAM_CHAT_BURST,
+    max_inflight=config.TELEGRAM_MAX_INFLIGHT,
+    storage_chats=[c for c in config.STORAGE_CHANNELS if c != 0],
+    storage_rate=config.TELEGRAM_STORAGE_RATE,
+    storage_burst=config.TELEGRAM_STORAGE_BURST
+)
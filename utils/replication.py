@@ -0,0 +1,187 @@
+"""
+Share-box by Univora - Storage Replication
+Keeps every stored file copied into all STORAGE_CHANNELS, backed by MongoDB
+"""
+
+from telegram import Bot
+from typing import Dict, List
+import asyncio
+import config
+from database import adb, replication_source
+from utils.channel_health import SOURCE, TARGET, CallTimer, blame_copy_error, channel_health
+from utils.rate_limiter import flood_control
+from utils.sessions import upload_sessions
+
+class ReplicationQueue:
+    """Durable replication jobs, worked off at a controlled rate, plus a scanner for missing copies"""
+
+    def __init__(self):
+        self._tasks = []
+        self._wake = asyncio.Event()
+        self._bot = None
+        # Link _id the next scan window starts after (None: from the start)
+        self._scan_after = None
+
+    def start(self, bot: Bot):
+        """Start the workers and the scanner (call once the event loop runs)"""
+        if self._tasks:
+            return
+        self._bot = bot
+        self._tasks = [
+            asyncio.create_task(self._worker())
+            for _ in range(config.REPLICATION_WORKERS)
+        ]
+        self._tasks.append(asyncio.create_task(self._scan_loop()))
+
+    async def stop(self):
+        """Stop the workers; unfinished jobs stay in MongoDB for the next run"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, copies: List[Dict], targets: List[int]):
+        """
+        Copy the file stored as `copies` ([{"channel_id", "message_id"}, ...]) into
+        each target channel. Replicas are recorded on open upload sessions and saved links.
+        """
+        if not targets:
+            return
+        await adb.enqueue_replication_jobs(replication_source(copies), targets, copies)
+        self._wake.set()
+
+    # ==================== WORKERS ====================
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await adb.claim_replication_job(config.REPLICATION_LEASE_SECONDS)
+            except Exception as e:
+                print(f"⚠️  Could not claim replication job: {e}")
+                job = None
+
+            if job is None:
+                # Idle until new work arrives or the poll interval passes
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), config.REPLICATION_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._replicate(job)
+                await adb.complete_replication_job(job["_id"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self._retry_later(job, e)
+
+    async def _replicate(self, job: Dict):
+        source = job["source"]
+        # A copy made by an earlier attempt whose recording failed is not made again
+        replica = job.get("copied") or await self._copy(job)
+
+        # Sessions first: a link created in between is then covered by the second write
+        await upload_sessions.add_file_replica(source["channel_id"], source["message_id"], replica)
+        await adb.add_file_replica(source["channel_id"], source["message_id"], replica)
+
+    async def _copy(self, job: Dict) -> Dict:
+        """Copy the job's file into its target channel and keep the replica on the job"""
+        source, target = job["source"], job["target"]
+
+        # The job is keyed on `source`; the copy is made from the healthiest
+        # storage channel that holds the file
+        copies = [c for c in job.get("copies") or [source] if c["channel_id"] != target] or [source]
+        candidates = [c for c in copies if c["channel_id"] in config.STORAGE_CHANNELS] or copies
+        origin = channel_health.rank(candidates)[0]
+
+        timed = CallTimer(lambda: self._bot.copy_message(
+            chat_id=target,
+            from_chat_id=origin["channel_id"],
+            message_id=origin["message_id"],
+            caption=""
+        ))
+        try:
+            copied = await flood_control.call(target, timed)
+        except Exception as e:
+            # Charge whichever channel the copy failed on
+            side = await blame_copy_error(self._bot, e, origin["channel_id"])
+            if side == SOURCE:
+                channel_health.record_failure(origin["channel_id"], timed.elapsed)
+            elif side == TARGET:
+                channel_health.record_failure(target, timed.elapsed)
+            raise
+        channel_health.record_success(origin["channel_id"], timed.elapsed)
+        channel_health.record_success(target, timed.elapsed)
+
+        replica = {"channel_id": target, "message_id": copied.message_id}
+        try:
+            await adb.save_replication_copy(job["_id"], replica)
+        except Exception as e:
+            # Still recorded by the caller; only a retry of this job would copy again
+            print(f"⚠️  Could not save replica on its job: {e}")
+        return replica
+
+    async def _retry_later(self, job: Dict, error: Exception):
+        """
+        Back off exponentially. After REPLICATION_MAX_ATTEMPTS the job is parked
+        for REPLICATION_PARK_SECONDS: it stays in place, so scans do not queue
+        the same copy again, and starts over once the park ends.
+        """
+        attempt = job.get("attempt", 0) + 1
+        try:
+            if attempt >= config.REPLICATION_MAX_ATTEMPTS:
+                print(f"⚠️  Giving up replicating to {job['target']} for now: {error}")
+                await adb.retry_replication_job(job["_id"], 0, config.REPLICATION_PARK_SECONDS, str(error))
+                return
+
+            delay = config.REPLICATION_RETRY_BASE_SECONDS * (2 ** (attempt - 1))
+            await adb.retry_replication_job(job["_id"], attempt, delay, str(error))
+        except Exception as e:
+            # The lease expires on its own and the job is picked up again
+            print(f"⚠️  Could not reschedule replication job: {e}")
+
+    # ==================== SCANNER ====================
+
+    async def scan(self) -> int:
+        """
+        Queue jobs for stored files missing from any configured storage channel,
+        in the next window of REPLICATION_SCAN_BATCH links
+        """
+        channels = [c for c in config.STORAGE_CHANNELS if c != 0]
+        if len(channels) < 2:
+            self._scan_after = None
+            return 0
+
+        found, self._scan_after = await adb.find_under_replicated_files(
+            channels, self._scan_after, config.REPLICATION_SCAN_BATCH
+        )
+
+        queued = 0
+        for copies in found:
+            present = {copy["channel_id"] for copy in copies}
+            missing = [c for c in channels if c not in present]
+            await self.enqueue(copies, missing)
+            queued += len(missing)
+
+        if queued:
+            self._wake.set()
+        return queued
+
+    async def _scan_loop(self):
+        while True:
+            try:
+                queued = await self.scan()
+                if queued:
+                    print(f"🔁 Queued {queued} storage replicas")
+            except Exception as e:
+                print(f"⚠️  Replication scan failed: {e}")
+            # Windows follow each other closely; a full pass rests for the interval
+            if self._scan_after is None:
+                await asyncio.sleep(config.REPLICATION_SCAN_INTERVAL_SECONDS)
+            else:
+                await asyncio.sleep(config.REPLICATION_SCAN_PAUSE_SECONDS)
+
+# Shared queue
+replication_queue = ReplicationQueue()
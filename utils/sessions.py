@@ -0,0 +1,130 @@
+"""
+Share-box by Univora - Upload Sessions
+Files collected between /upload (or /add) and /done, with pluggable storage
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import pytz
+from pymongo import ReturnDocument
+import config
+from database import adb, TTLCache
+
+# Session kinds
+UPLOAD = "upload"   # New link: /upload ... /done
+ADD = "add"         # Existing link: /add ... /done
+
+def _new_session(kind: str, user_id: int, link_id: str = None, files: List[Dict] = None) -> Dict:
+    files = list(files or [])
+    return {
+        "kind": kind,
+        "user_id": user_id,
+        "link_id": link_id,
+        "files": files,
+        "file_count": len(files),
+        "total_size": sum(f.get("file_size", 0) or 0 for f in files)
+    }
+
+# ==================== MEMORY BACKEND ====================
+
+class MemorySessionStore:
+    """Per-process LRU; abandoned sessions expire after SESSION_TTL_SECONDS"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._sessions = TTLCache(maxsize, ttl)
+
+    async def start(self, kind: str, user_id: int, link_id: str = None, files: List[Dict] = None) -> Dict:
+        session = _new_session(kind, user_id, link_id, files)
+        self._sessions.set((kind, user_id), session)
+        return session
+
+    async def get(self, kind: str, user_id: int) -> Optional[Dict]:
+        return self._sessions.get((kind, user_id))
+
+    async def exists(self, kind: str, user_id: int) -> bool:
+        return (kind, user_id) in self._sessions
+
+    async def append_file(self, kind: str, user_id: int, file_data: Dict) -> Optional[Dict]:
+        session = self._sessions.get((kind, user_id))
+        if session is None:
+            return None
+        session["files"].append(file_data)
+        session["file_count"] += 1
+        session["total_size"] += file_data.get("file_size", 0) or 0
+        # Activity extends the session's lifetime
+        self._sessions.set((kind, user_id), session)
+        return session
+
+    async def delete(self, kind: str, user_id: int) -> bool:
+        return self._sessions.pop((kind, user_id)) is not None
+
+    async def add_file_replica(self, source_channel: int, source_message_id: int, replica: Dict):
+        for session in self._sessions.values():
+            for file_data in session["files"]:
+                backups = file_data.get("backup_messages", [])
+                if any(
+                    b["channel_id"] == source_channel and b["message_id"] == source_message_id for b in backups
+                ) and replica not in backups:
+                    backups.append(replica)
+
+# ==================== MONGO BACKEND ====================
+
+class MongoSessionStore:
+    """Shared across bot processes; expired sessions are removed by a TTL index"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.sessions = adb.db.upload_sessions
+
+    def _expiry(self) -> datetime:
+        return datetime.now(pytz.UTC) + timedelta(seconds=self.ttl)
+
+    def _live(self, kind: str, user_id: int) -> Dict:
+        # The TTL monitor only runs once a minute, so filter on expiry too
+        return {"_id": f"{kind}:{user_id}", "expires_at": {"$gt": datetime.now(pytz.UTC)}}
+
+    async def start(self, kind: str, user_id: int, link_id: str = None, files: List[Dict] = None) -> Dict:
+        session = _new_session(kind, user_id, link_id, files)
+        await self.sessions.replace_one(
+            {"_id": f"{kind}:{user_id}"},
+            {**session, "expires_at": self._expiry()},
+            upsert=True
+        )
+        return session
+
+    async def get(self, kind: str, user_id: int) -> Optional[Dict]:
+        return await self.sessions.find_one(self._live(kind, user_id))
+
+    async def exists(self, kind: str, user_id: int) -> bool:
+        return await self.sessions.find_one(self._live(kind, user_id), {"_id": 1}) is not None
+
+    async def append_file(self, kind: str, user_id: int, file_data: Dict) -> Optional[Dict]:
+        """Atomic append; returns the session counters without the file list"""
+        return await self.sessions.find_one_and_update(
+            self._live(kind, user_id),
+            {
+                "$push": {"files": file_data},
+                "$inc": {"file_count": 1, "total_size": file_data.get("file_size", 0) or 0},
+                "$set": {"expires_at": self._expiry()}
+            },
+            projection={"files": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def delete(self, kind: str, user_id: int) -> bool:
+        result = await self.sessions.delete_one({"_id": f"{kind}:{user_id}"})
+        return result.deleted_count > 0
+
+    async def add_file_replica(self, source_channel: int, source_message_id: int, replica: Dict):
+        stored_as = {"$elemMatch": {"channel_id": source_channel, "message_id": source_message_id}}
+        await self.sessions.update_many(
+            {"files.backup_messages": stored_as},
+            {"$addToSet": {"files.$[f].backup_messages": replica}},
+            array_filters=[{"f.backup_messages": stored_as}]
+        )
+
+# Shared store, chosen by SESSION_BACKEND
+if config.SESSION_BACKEND == "memory":
+    upload_sessions = MemorySessionStore(config.SESSION_CACHE_SIZE, config.SESSION_TTL_SECONDS)
+else:
+    upload_sessions = MongoSessionStore(config.SESSION_TTL_SECONDS)
@@ -1,7 +1,7 @@
 import aiohttp
 from aiohttp import web
 import json
-from database import db
+from database import adb
 import config
 import os
 
@@ -18,8 +18,8 @@ async def api_get_links(request):
         # But user didn't ask for tough security, just a dashboard.
         # We'll fetch all links for this user.
         
-        links_cursor = db.links.find({"user_id": user_id}).sort("created_at", -1)
-        links = list(links_cursor)
+        links_cursor = adb.links.find({"user_id": user_id}).sort("created_at", -1)
+        links = await links_cursor.to_list(length=None)
         
         # Convert ObjectId to string and datetime to string
         for link in links:
@@ -47,20 +47,20 @@ async def api_get_stats(request):
         if not user_id: return web.json_response({"error": "Missing ID"}, status=400)
         user_id = int(user_id)
         
-        user = db.users.find_one({"user_id": user_id})
+        user = await adb.users.find_one({"user_id": user_id})
         if not user: return web.json_response({"error": "User not found"}, status=404)
         
         # Calculate stats
-        total_links = db.links.count_documents({"user_id": user_id})
+        total_links = await adb.links.count_documents({"user_id": user_id})
         total_views = 0
         pipeline = [
             {"$match": {"user_id": user_id}},
             {"$group": {"_id": None, "total_views": {"$sum": "$views"}}}
         ]
-        res = list(db.links.aggregate(pipeline))
+        res = await adb.links.aggregate(pipeline).to_list(length=None)
         if res: total_views = res[0]['total_views']
         
-        plan = db.get_plan_details(user_id)
+        plan = await adb.get_plan_details(user_id)
         
         stats = {
             "username": user.get('username', 'User'),